@@ -0,0 +1,89 @@
+"""
+asset_bytes.py
+Measures how many requests and bytes a browser needs for the dashboard and its CSS/images, on a first visit and on a
+repeat visit, with plain static files and with built (hashed, compressed, immutable) assets. On a repeat visit a file is
+only requested again (as a conditional request) when its Cache-Control header does not let the browser keep it.
+
+    python benchmarks/asset_bytes.py
+
+Last Modified: 10/19/2026
+"""
+import os
+import re
+import shutil
+import tempfile
+from common import make_app, make_history, login
+
+ACCEPT = {'Accept-Encoding': 'gzip, deflate, br'}
+
+
+def header_bytes(response):
+    """
+    Helper method that estimates the size of the response status line and headers
+
+    Args:
+        - response: the test response
+
+    Returns:
+        - Number of bytes
+    """
+    return len(response.status) + 11 + sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+
+
+def visit(client):
+    """
+    Loads the dashboard and every local asset it links to, then does a repeat visit
+
+    Args:
+        - client: logged in test client
+
+    Returns:
+        - Dictionary with requests and bytes for the first and the repeat visit
+    """
+    page = client.get('/dashboard', headers = ACCEPT)
+    urls = sorted(set(re.findall(r'(?:href|src)="(/static/[^"]+)"', page.get_data(as_text = True))))
+    first = {'requests': 1, 'bytes': len(page.data) + header_bytes(page)}
+    repeat = {'requests': 1, 'bytes': len(page.data) + header_bytes(page)}
+    for url in urls:
+        r = client.get(url, headers = ACCEPT)
+        first['requests'] += 1
+        first['bytes'] += len(r.data) + header_bytes(r)
+        cache = r.headers.get('Cache-Control', '')
+        if('immutable' in cache or re.search(r'max-age=[1-9]', cache)):
+            continue
+        headers = dict(ACCEPT)
+        if(r.headers.get('ETag')):
+            headers['If-None-Match'] = r.headers['ETag']
+        if(r.headers.get('Last-Modified')):
+            headers['If-Modified-Since'] = r.headers['Last-Modified']
+        again = client.get(url, headers = headers)
+        repeat['requests'] += 1
+        repeat['bytes'] += len(again.data) + header_bytes(again)
+    return {'assets': len(urls), 'first': first, 'repeat': repeat}
+
+
+def main():
+    app, db = make_app()
+    from flask_app import assets
+    with app.app_context():
+        make_history(30)
+    static = os.path.join(tempfile.mkdtemp(prefix = 'myhealth-static-'), 'static')
+    shutil.copytree(app.static_folder, static, ignore = shutil.ignore_patterns(assets.DIST))
+    app.static_folder = static
+    client = app.test_client()
+    login(client)
+
+    assets.load({})
+    plain = visit(client)
+    assets.build(static)
+    built = visit(client)
+
+    print("%-22s %8s %16s %12s %17s %13s" % ('', 'assets', 'first requests', 'first bytes', 'repeat requests', 'repeat bytes'))
+    for name, r in (('plain static files', plain), ('built assets', built)):
+        print("%-22s %8d %16d %12d %17d %13d" % (name, r['assets'], r['first']['requests'], r['first']['bytes'],
+                                                 r['repeat']['requests'], r['repeat']['bytes']))
+    print("brotli:", "on" if assets.brotli else "not installed (gzip only)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+availability_checks.py
+Compares ways of checking whether a username and email are taken, with many users in the table: the old two queries
+(one filter_by(...).first() per field), the combined query, and the combined query behind the Bloom filter. Reports
+the time per check and how many queries were sent, for names that are free (most checks) and names that are taken.
+
+    python benchmarks/availability_checks.py --users 50000 -n 2000
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import random
+import time
+from common import make_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--users', type = int, default = 50000, help = "users in the table")
+    parser.add_argument('-n', type = int, default = 2000, help = "checks per measurement")
+    args = parser.parse_args()
+
+    app, db = make_app()
+    from flask_app import accounts
+    from flask_app.models import User
+    from sqlalchemy import event
+    with app.app_context():
+        db.session.bulk_insert_mappings(User, [{'first_name': 'U', 'last_name': 'U', 'username': 'user%d' % i,
+                                                'email': 'user%d@example.com' % i, 'password': 'x', 'height': 70,
+                                                'weight': 150} for i in range(args.users)])
+        db.session.commit()
+
+        queries = [0]
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+        def two_queries(username, email):
+            found = set()
+            if(User.query.filter_by(username = username).first()):
+                found.add('username')
+            if(User.query.filter_by(email = email).first()):
+                found.add('email')
+            return found
+
+        def combined(username, email):
+            app.config['ACCOUNT_FILTER_ENABLED'] = False
+            return accounts.taken(username, email)
+
+        def filtered(username, email):
+            app.config['ACCOUNT_FILTER_ENABLED'] = True
+            return accounts.taken(username, email)
+
+        accounts.names.rebuild()
+        rng = random.Random(1)
+        free = [('new%d' % i, 'new%d@example.com' % i) for i in range(args.n)]
+        used = [('user%d' % i, 'user%d@example.com' % i) for i in (rng.randrange(args.users) for _ in range(args.n))]
+
+        print("%d users, filter of %d KiB with %d hashes" % (args.users, len(accounts.names.filter.bits) // 1024,
+                                                             accounts.names.filter.hashes))
+        print("%-22s %-6s %12s %16s" % ('', 'names', 'us/check', 'queries/check'))
+        for name, fn in (('two queries', two_queries), ('combined query', combined), ('bloom + combined', filtered)):
+            for label, names in (('free', free), ('taken', used)):
+                expected = set() if label == 'free' else {'username', 'email'}
+                queries[0] = 0
+                t = time.perf_counter()
+                for username, email in names:
+                    assert fn(username, email) == expected
+                elapsed = time.perf_counter() - t
+                print("%-22s %-6s %12.1f %16.3f" % (name, label, elapsed / len(names) * 1e6, queries[0] / len(names)))
+
+
+if __name__ == '__main__':
+    main()
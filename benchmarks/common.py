@@ -0,0 +1,252 @@
+"""
+common.py
+Helpers shared by the benchmark scripts. Points the app at a throwaway database (so site.db is never touched), fills it
+with a user that has a long history, and summarizes timings.
+
+Last Modified: 10/19/2026
+"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, datetime, timedelta, time as clock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMAIL = 'bench@example.com'
+PASSWORD = 'benchmark'
+
+
+def make_app(path = None):
+    """
+    Imports the app using a new SQLite database file, with CSRF checks and rate limiting turned off
+
+    Args:
+        - path: where to put the database (a temporary file when None)
+
+    Returns:
+        - (app, db)
+    """
+    if(path is None):
+        path = os.path.join(tempfile.mkdtemp(prefix = 'myhealth-bench-'), 'bench.db')
+    os.environ['MYHEALTH_DATABASE_URI'] = 'sqlite:///' + path
+    if(ROOT not in sys.path):
+        sys.path.insert(0, ROOT)
+    from flask_app import app, db
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['RATELIMIT_ENABLED'] = False
+    return app, db
+
+
+def make_history(days = 365, per_day = 3, username = 'bench', email = EMAIL):
+    """
+    Creates a user with data for every day of the last days days: runs, workouts, water, sleep and heart rate
+
+    Args:
+        - days: how many days of history
+        - per_day: how many water and heart rate entries per day
+        - username: username of the user
+        - email: email of the user
+
+    Returns:
+        - The id of the user
+    """
+    from flask_app import db, bcrypt, shards
+    from flask_app.models import User, Routine, Workout, Runs, Water, Sleep, HeartRate
+    user = User(first_name = 'Bench', last_name = 'Mark', username = username, email = email,
+                password = bcrypt.generate_password_hash(PASSWORD).decode('utf-8'), height = 70, weight = 160)
+    db.session.add(user)
+    db.session.commit()
+    with shards.use_user(user.id):
+        today = date.today()
+        db.session.add(Routine(user_id = user.id, routine = {'squats': [2, today - timedelta(days = days)],
+                                                            'push ups': [3, today - timedelta(days = days)]}))
+        rows = []
+        for d in range(days):
+            day = today - timedelta(days = d)
+            rows.append(Runs(date = day, time = clock(0, 25 + d % 20, d % 60), distance = 2 + (d % 7) * 0.5, user_id = user.id))
+            rows.append(Workout(exercise = ['squats', 'push ups', 'yoga'][d % 3], date = day, time = clock(0, 30, 0), user_id = user.id))
+            start = datetime.combine(day - timedelta(days = 1), clock(22, d % 60))
+            rows.append(Sleep(start_time = start, end_time = start + timedelta(hours = 7, minutes = d % 90), user_id = user.id))
+            for k in range(per_day):
+                rows.append(Water(num_cups = 2 + (d + k) % 3, date = day, user_id = user.id))
+                rows.append(HeartRate(date = day, heartrate = 55 + (d * 7 + k) % 40, user_id = user.id))
+        db.session.add_all(rows)
+        db.session.commit()
+    return user.id
+
+
+def login(client, email = EMAIL):
+    """
+    Logs the test client in as the benchmark user
+
+    Args:
+        - client: the Flask test client
+        - email: email of the user
+
+    Returns:
+        - None
+    """
+    r = client.post('/login', data = {'email': email, 'password': PASSWORD})
+    assert r.status_code == 302, "login failed"
+
+
+def timed(fn, n):
+    """
+    Runs a function n times
+
+    Args:
+        - fn: the function
+        - n: how many times
+
+    Returns:
+        - List of how long each call took, in seconds
+    """
+    out = []
+    for _ in range(n):
+        t = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t)
+    return out
+
+
+def summary(latencies):
+    """
+    Summarizes a list of timings
+
+    Args:
+        - latencies: list of seconds
+
+    Returns:
+        - Dictionary with the count and the mean, p50, p95, p99 and max in milliseconds
+    """
+    s = sorted(latencies)
+    if(not s):
+        return {'n': 0}
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))] * 1000
+    return {'n': len(s), 'mean': sum(s) / len(s) * 1000, 'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'max': s[-1] * 1000}
+
+
+def print_table(title, rows):
+    """
+    Prints a table of summaries
+
+    Args:
+        - title: heading of the table
+        - rows: list of (name, summary) pairs
+
+    Returns:
+        - None
+    """
+    print(title)
+    print("%-28s %6s %9s %9s %9s %9s" % ('', 'n', 'mean ms', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for name, s in rows:
+        print("%-28s %6d %9.2f %9.2f %9.2f %9.2f" % (name, s['n'], s['mean'], s['p50'], s['p95'], s['p99']))
+
+
+def free_port():
+    """
+    Helper method that finds a free TCP port
+
+    Args:
+        - None
+
+    Returns:
+        - The port number
+    """
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def http_login(base):
+    """
+    Logs in over HTTP and returns the session cookie
+
+    Args:
+        - base: base url of the server
+
+    Returns:
+        - The Cookie header value
+    """
+    data = urllib.parse.urlencode({'email': EMAIL, 'password': PASSWORD}).encode()
+    opener = urllib.request.build_opener(NoRedirect)
+    try:
+        opener.open(base + '/login', data)
+    except urllib.error.HTTPError as e:
+        if(e.code != 302):
+            raise
+        return '; '.join(c.split(';', 1)[0] for c in e.headers.get_all('Set-Cookie'))
+    raise RuntimeError("login failed")
+
+
+def wait_until_up(base, timeout = 30):
+    """
+    Helper method that waits for the server to answer
+
+    Args:
+        - base: base url of the server
+        - timeout: seconds to wait
+
+    Returns:
+        - None
+    """
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            urllib.request.urlopen(base + '/about', timeout = 1).read()
+            return
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def http_load(url, cookie, clients, n):
+    """
+    Sends n GET requests to a url from a number of clients at the same time
+
+    Args:
+        - url: the url
+        - cookie: session cookie
+        - clients: number of clients
+        - n: total number of requests
+
+    Returns:
+        - (requests per second, latency summary, errors)
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_client = max(1, n // clients)
+
+    def client():
+        mine = []
+        for _ in range(per_client):
+            request = urllib.request.Request(url, headers = {'Cookie': cookie})
+            t = time.perf_counter()
+            try:
+                urllib.request.urlopen(request, timeout = 60).read()
+                mine.append(time.perf_counter() - t)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target = client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, summary(latencies), errors[0]
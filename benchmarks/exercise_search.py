@@ -0,0 +1,71 @@
+"""
+exercise_search.py
+Workout search with the FTS5 indexes (flask_app/search.py) against the LIKE search it falls back to, for autocomplete
+suggestions and for history searches with totals. The database gets many users with many workouts each, so LIKE has
+to look through a lot of rows.
+
+    python benchmarks/exercise_search.py --users 50 --workouts 2000 -n 200
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import random
+from datetime import date, timedelta, time as clock
+from common import make_app, make_history, timed, summary, print_table
+
+MOVES = ['squat', 'deadlift', 'bench press', 'pull up', 'push up', 'plank', 'lunge', 'row', 'curl', 'dip', 'yoga',
+         'swim', 'bike', 'jump rope', 'burpee', 'kettlebell swing', 'overhead press', 'hip thrust', 'step up', 'crunch']
+STYLES = ['', 'back', 'front', 'goblet', 'sumo', 'single leg', 'incline', 'decline', 'weighted', 'banded', 'slow', 'hiit']
+
+
+def fill(users, workouts, seed = 1):
+    """
+    Adds users with workouts named from a mix of styles and moves
+
+    Args:
+        - users: number of users
+        - workouts: workouts per user
+        - seed: random seed
+
+    Returns:
+        - Id of the first user
+    """
+    from flask_app import shards
+    from flask_app.models import Workout
+    rng = random.Random(seed)
+    names = [(s + ' ' + m).strip() for s in STYLES for m in MOVES]
+    first = None
+    for u in range(users):
+        user_id = make_history(1, 1, 'user%d' % u, 'user%d@example.com' % u)
+        first = first or user_id
+        rows = [{'exercise': rng.choice(names), 'date': date.today() - timedelta(days = rng.randrange(1500)),
+                 'time': clock(0, rng.randrange(10, 90) % 60, 0), 'user_id': user_id} for _ in range(workouts)]
+        with shards.engine_for(user_id).begin() as conn:
+            conn.execute(Workout.__table__.insert(), rows)
+    return first
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--users', type = int, default = 50, help = "number of users")
+    parser.add_argument('--workouts', type = int, default = 2000, help = "workouts per user")
+    parser.add_argument('-n', type = int, default = 200, help = "searches per case")
+    args = parser.parse_args()
+
+    app, db = make_app()
+    from flask_app import search
+    with app.app_context():
+        user_id = fill(args.users, args.workouts)
+        cases = [('suggest "sq"', lambda: search.suggest(user_id, 'sq')),
+                 ('suggest "goblet sq"', lambda: search.suggest(user_id, 'goblet sq')),
+                 ('history "squat"', lambda: search.history(user_id, 'squat')),
+                 ('history "press" last 90 days', lambda: search.history(user_id, 'press', date.today() - timedelta(days = 90)))]
+        for fts in (True, False):
+            app.config['SEARCH_FTS_ENABLED'] = fts
+            rows = [(name, summary(timed(fn, args.n))) for name, fn in cases]
+            print_table("%s, %d users x %d workouts" % ('FTS5' if fts else 'LIKE', args.users, args.workouts), rows)
+            print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+lake_export.py
+Parquet export (flask_app/lake.py) of a user with years of history: time and peak memory of the first export with
+different batch sizes, then of an incremental export after a few more days of data, then reading the lake back with
+pyarrow and checking it against the database. Last it deletes the newest water rows, adds new ones and exports again, and
+fails if any row in the database is missing from the lake (which happens if the new rows got ids already exported).
+
+    python benchmarks/lake_export.py --days 1095 --per-day 10 --batch 5000 --batch 50000
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from common import make_app, make_history
+
+
+def measure(fn):
+    """
+    Runs fn once, timing it and tracking the most memory it had allocated at once
+
+    Args:
+        - fn: function to call
+
+    Returns:
+        - (result of fn, seconds, peak MB)
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--days', type = int, default = 1095, help = "days of history")
+    parser.add_argument('--per-day', type = int, default = 10, help = "water and heart rate entries per day")
+    parser.add_argument('--batch', type = int, action = 'append', help = "rows per batch (can be given more than once)")
+    parser.add_argument('--new-days', type = int, default = 7, help = "days of data added before the incremental export")
+    args = parser.parse_args()
+
+    app, db = make_app()
+    from flask_app import lake, shards
+    from flask_app.models import Water, HeartRate
+    import pyarrow.compute
+    import pyarrow.dataset
+    with app.app_context():
+        user_id = make_history(args.days, args.per_day)
+        total = sum(db.session.query(model).count() for model, column in lake.TABLES.values())
+        print("%d rows in the exported tables" % total)
+        print("%-28s %10s %10s %10s" % ('export', 'rows', 'seconds', 'peak MB'))
+        directory = None
+        for batch in args.batch or [5000, 50000]:
+            if(directory):
+                shutil.rmtree(directory, ignore_errors = True)
+            directory = tempfile.mkdtemp(prefix = 'myhealth-lake-')
+            exported, elapsed, peak = measure(lambda: lake.export(directory, batch))
+            print("%-28s %10d %10.2f %10.1f" % ('full, batch %d' % batch, sum(exported.values()), elapsed, peak))
+
+        with shards.use_user(user_id):
+            for day in range(args.new_days):
+                for i in range(args.per_day):
+                    db.session.add(Water(num_cups = 1, date = date.today() + timedelta(days = day + 1), user_id = user_id))
+                    db.session.add(HeartRate(heartrate = 60 + i, date = date.today() + timedelta(days = day + 1), user_id = user_id))
+            db.session.commit()
+        exported, elapsed, peak = measure(lambda: lake.export(directory, batch))
+        print("%-28s %10d %10.2f %10.1f" % ('incremental, %d new days' % args.new_days, sum(exported.values()), elapsed, peak))
+
+        water = pyarrow.dataset.dataset(directory + '/water', partitioning = 'hive').to_table()
+        cups = db.session.query(db.func.sum(Water.num_cups)).scalar()
+        print()
+        print("water: %d rows in the lake, %d in the database; %d cups in the lake, %d in the database"
+              % (water.num_rows, db.session.query(Water).count(), pyarrow.compute.sum(water['num_cups']).as_py(), cups))
+
+        with shards.use_user(user_id):
+            newest = [w.id for w in Water.query.order_by(Water.id.desc()).limit(args.per_day)]
+            Water.query.filter(Water.id.in_(newest)).delete(synchronize_session = False)
+            db.session.add_all([Water(num_cups = 2, date = date.today(), user_id = user_id) for i in range(args.per_day)])
+            db.session.commit()
+            rows = set(db.session.query(Water.id, Water.num_cups, Water.date))
+            db.session.remove()
+        lake.export(directory, batch)
+        table = pyarrow.dataset.dataset(directory + '/water', partitioning = 'hive').to_table(columns = ['id', 'num_cups', 'date'])
+        missing = rows - set(zip(*[table[c].to_pylist() for c in ('id', 'num_cups', 'date')]))
+        print("after deleting the newest %d water rows and adding %d: %d rows missing from the lake" % (len(newest), args.per_day, len(missing)))
+    shutil.rmtree(directory, ignore_errors = True)
+    if(missing):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+profiler_overhead.py
+Cost of the sampling profiler (flask_app/profiler.py) on the pages of a large account: with profiling off, on but not
+asked for, and profiling every request. Then writes the collapsed stacks, flame graph and summary of the profiled
+requests and prints the top functions.
+
+    python benchmarks/profiler_overhead.py --days 1095 --per-day 10 -n 20
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import tempfile
+from common import make_app, make_history, login, timed, summary, print_table
+
+PAGES = ['/personal_stats', '/dashboard/water']
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--days', type = int, default = 1095, help = "days of history")
+    parser.add_argument('--per-day', type = int, default = 10, help = "water and heart rate entries per day")
+    parser.add_argument('-n', type = int, default = 20, help = "requests per page and case")
+    parser.add_argument('--out', help = "folder for the profile files (a temporary one when not given)")
+    args = parser.parse_args()
+
+    app, db = make_app()
+    app.config['PROFILING_TOKEN'] = 'bench'
+    from flask_app import profiler
+    with app.app_context():
+        make_history(args.days, args.per_day)
+    client = app.test_client()
+    login(client)
+    cases = [("profiling off", False, {}), ("profiling on, not asked for", True, {}), ("profiled", True, {'X-Profile': 'bench'})]
+    for name, enabled, headers in cases:
+        app.config['PROFILING_ENABLED'] = enabled
+        rows = []
+        for page in PAGES:
+            client.get(page)
+            rows.append((page, summary(timed(lambda: client.get(page, headers = headers), args.n))))
+        print_table(name, rows)
+        print()
+
+    paths = profiler.export(args.out or tempfile.mkdtemp(prefix = 'myhealth-profile-'))
+    print('\n'.join(paths))
+    print()
+    print(profiler.sampler.summary(15))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+ratelimit_overhead.py
+Measures what rate limiting costs each request: one token bucket take, the full check a limited view does (an IP
+bucket and an account bucket), and a whole POST to a write endpoint with limiting on and off. Exits with status 1 if the
+check takes longer than the budget.
+
+    python benchmarks/ratelimit_overhead.py --budget-us 25
+    python benchmarks/ratelimit_overhead.py --redis redis://localhost:6379/0
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import sys
+import time
+from datetime import date
+from common import make_app, make_history, login, timed, summary
+
+
+def per_call_us(fn, n):
+    """
+    Helper method that gives the average time of a function in microseconds
+
+    Args:
+        - fn: the function
+        - n: how many calls
+
+    Returns:
+        - Microseconds per call
+    """
+    t = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('-n', type = int, default = 100000, help = "calls per measurement")
+    parser.add_argument('--keys', type = int, default = 10000, help = "number of different IPs")
+    parser.add_argument('--requests', type = int, default = 500, help = "requests per whole request measurement")
+    parser.add_argument('--budget-us', type = float, default = 25, help = "most the check may take, in microseconds")
+    parser.add_argument('--redis', help = "measure a Redis store at this url instead of the in-memory one")
+    args = parser.parse_args()
+
+    app, db = make_app()
+    if(args.redis):
+        app.config['RATELIMIT_REDIS_URL'] = args.redis
+    from flask_app import ratelimit
+    ratelimit.store = ratelimit.make_store(app.config)
+    app.config['RATE_LIMITS'] = dict(app.config['RATE_LIMITS'], write_ip = (10 ** 9, 1), write_account = (10 ** 9, 1))
+    store = ratelimit.store
+    with app.app_context():
+        make_history(7)
+
+    ips = ['10.0.%d.%d' % (i // 256, i % 256) for i in range(args.keys)]
+    counter = [0]
+
+    def take():
+        counter[0] += 1
+        store.take('write:ip:' + ips[counter[0] % len(ips)], 10 ** 9, 1)
+    take_us = per_call_us(take, args.n)
+
+    with app.test_request_context('/dashboard/water/add_water', method = 'POST', environ_base = {'REMOTE_ADDR': '10.1.2.3'}):
+        check_us = per_call_us(lambda: ratelimit.check('write', 1), args.n)
+
+    client = app.test_client()
+    login(client)
+    post = lambda: client.post('/dashboard/water/add_water', data = {'num_cups': 1, 'date': date.today().isoformat()})
+    results = {}
+    for enabled in (False, True, False, True):
+        app.config['RATELIMIT_ENABLED'] = enabled
+        results.setdefault(enabled, []).extend(timed(post, args.requests // 2))
+    off, on = summary(results[False]), summary(results[True])
+
+    print("store: %s, %d keys" % (type(store).__name__, len(ips)))
+    print("%-34s %10.2f us" % ('one bucket take', take_us))
+    print("%-34s %10.2f us" % ('check (IP + account buckets)', check_us))
+    print("%-34s %10.2f us" % ('POST add_water, limiting off', off['p50'] * 1000))
+    print("%-34s %10.2f us" % ('POST add_water, limiting on', on['p50'] * 1000))
+    ok = check_us <= args.budget_us
+    print("check is %s the %.0f us budget" % ("within" if ok else "OVER", args.budget_us))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+render_templates.py
+Measures how long each page takes for a user with a long history, split into the whole request and the time spent
+rendering the template. Run it on two versions of the app to compare them:
+
+    python benchmarks/render_templates.py --days 1000 -n 50
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import time
+from common import make_app, make_history, login, summary, print_table
+
+PAGES = ['/dashboard', '/dashboard/exercises', '/dashboard/water', '/dashboard/sleep', '/dashboard/heart_rate',
+         '/dashboard/routines', '/personal_stats', '/dashboard/exercises/all_runs', '/dashboard/exercises/all_exercises']
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--days', type = int, default = 1000, help = "days of history for the user")
+    parser.add_argument('-n', type = int, default = 50, help = "requests per page")
+    args = parser.parse_args()
+
+    app, db = make_app()
+    with app.app_context():
+        make_history(args.days)
+
+    import jinja2
+    spent = []
+    depth = [0]
+    render = jinja2.Template.render
+
+    def timed_render(self, *a, **kw):
+        # only the outermost template is timed, includes and fragments are part of it
+        depth[0] += 1
+        t = time.perf_counter()
+        try:
+            return render(self, *a, **kw)
+        finally:
+            depth[0] -= 1
+            if(depth[0] == 0):
+                spent.append(time.perf_counter() - t)
+    jinja2.Template.render = timed_render
+
+    client = app.test_client()
+    login(client)
+    requests = []
+    templates = []
+    for page in PAGES:
+        client.get(page)
+        del spent[:]
+        times = []
+        for _ in range(args.n):
+            t = time.perf_counter()
+            r = client.get(page)
+            times.append(time.perf_counter() - t)
+            assert r.status_code == 200, (page, r.status_code)
+        requests.append((page, summary(times)))
+        templates.append((page, summary(spent)))
+    print_table("Whole request (%d days of history)" % args.days, requests)
+    print()
+    print_table("Template rendering only", templates)
+
+
+if __name__ == '__main__':
+    main()
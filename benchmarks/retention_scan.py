@@ -0,0 +1,65 @@
+"""
+retention_scan.py
+Database size and page times for a user with years of history, before and after applying the retention policies
+(flask_app/retention.py) and compacting the database.
+
+    python benchmarks/retention_scan.py --days 1095 --per-day 10 --keep 365
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import os
+from common import make_app, make_history, login, timed, summary, print_table
+
+PAGES = ['/personal_stats', '/dashboard/heart_rate', '/dashboard/water', '/dashboard/sleep']
+
+
+def measure(client, n):
+    """
+    Times every page
+
+    Args:
+        - client: logged in test client
+        - n: requests per page
+
+    Returns:
+        - List of (page, summary) pairs
+    """
+    rows = []
+    for page in PAGES:
+        client.get(page)
+        rows.append((page, summary(timed(lambda: client.get(page), n))))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--days', type = int, default = 1095, help = "days of history")
+    parser.add_argument('--per-day', type = int, default = 10, help = "water and heart rate entries per day")
+    parser.add_argument('--keep', type = int, default = 365, help = "days of raw water, sleep and heart rate rows to keep")
+    parser.add_argument('-n', type = int, default = 20, help = "requests per page")
+    args = parser.parse_args()
+
+    app, db = make_app()
+    from flask_app import retention, shards
+    app.config['RETENTION_POLICIES'] = {'heart_rate': args.keep, 'water': args.keep, 'sleep': args.keep}
+    with app.app_context():
+        make_history(args.days, args.per_day)
+        sizes = lambda: sum(os.path.getsize(e.url.database) for e in shards.engines())
+        before = sizes()
+    client = app.test_client()
+    login(client)
+    print_table("Before: %.1f MB" % (before / 1e6), measure(client, args.n))
+
+    with app.app_context():
+        archived = retention.run()
+        for engine in shards.engines():
+            retention.compact(engine)
+        after = sizes()
+    archive = sum(os.path.getsize(os.path.join(folder, f)) for folder, _, files in os.walk(retention.archive_dir()) for f in files)
+    print()
+    print_table("After archiving %s: %.1f MB, archive %.1f MB" % (archived, after / 1e6, archive / 1e6), measure(client, args.n))
+
+
+if __name__ == '__main__':
+    main()
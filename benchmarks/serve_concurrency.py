@@ -0,0 +1,81 @@
+"""
+serve_concurrency.py
+Compares the WSGI development server that run.py starts (app.run with debug on, without the reloader) with the ASGI
+mode (flask_app.asgi under uvicorn) for the dashboard summary endpoint, at several numbers of clients sending requests
+at the same time. Prints throughput and latency percentiles for each.
+
+    python benchmarks/serve_concurrency.py --days 365 --clients 1 8 32 64 -n 400
+
+Needs uvicorn for the ASGI half (pip install uvicorn).
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from common import make_app, make_history, free_port, wait_until_up, http_login, http_load
+
+PATH = '/dashboard/summary'
+
+
+def serve(mode, path, port):
+    """
+    Runs the server (this is what the child process does)
+
+    Args:
+        - mode: 'wsgi' or 'asgi'
+        - path: the database file
+        - port: port to listen on
+
+    Returns:
+        - None
+    """
+    app, db = make_app(path)
+    if(mode == 'wsgi'):
+        import logging
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        app.run(debug = True, use_reloader = False, port = port)
+    else:
+        import uvicorn
+        from flask_app.asgi import application
+        uvicorn.run(application, host = '127.0.0.1', port = port, log_level = 'warning')
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--days', type = int, default = 365, help = "days of history for the user")
+    parser.add_argument('--clients', type = int, nargs = '+', default = [1, 8, 32, 64], help = "clients at the same time")
+    parser.add_argument('-n', type = int, default = 400, help = "requests per run")
+    parser.add_argument('--serve', choices = ['wsgi', 'asgi'], help = argparse.SUPPRESS)
+    parser.add_argument('--db', help = argparse.SUPPRESS)
+    parser.add_argument('--port', type = int, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    if(args.serve):
+        return serve(args.serve, args.db, args.port)
+
+    path = os.path.join(tempfile.mkdtemp(prefix = 'myhealth-bench-'), 'bench.db')
+    app, db = make_app(path)
+    with app.app_context():
+        make_history(args.days)
+
+    print("%-6s %8s %10s %9s %9s %9s %9s %7s" % ('mode', 'clients', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms', 'errors'))
+    for mode in ('wsgi', 'asgi'):
+        port = free_port()
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, '--db', path, '--port', str(port)])
+        try:
+            base = 'http://127.0.0.1:%d' % port
+            wait_until_up(base)
+            cookie = http_login(base)
+            http_load(base + PATH, cookie, 4, 40)
+            for clients in args.clients:
+                rate, s, errors = http_load(base + PATH, cookie, clients, args.n)
+                print("%-6s %8d %10.1f %9.2f %9.2f %9.2f %9.2f %7d" % (mode, clients, rate, s['p50'], s['p95'], s['p99'], s['max'], errors))
+        finally:
+            child.terminate()
+            child.wait()
+
+
+if __name__ == '__main__':
+    main()
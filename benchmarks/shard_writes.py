@@ -0,0 +1,98 @@
+"""
+shard_writes.py
+Write throughput with 1, 2, 4, ... shards (flask_app/shards.py): several writer processes, each for its own user, add
+water entries one commit at a time for a few seconds. With one SQLite file every commit waits for the same write lock;
+with more shards, users on different shards commit at the same time, so the total should grow with the number of shards
+up to about the number of cores (or disks).
+
+    python benchmarks/shard_writes.py --shards 1 2 4 8 --writers 8 --seconds 5
+
+Each shard count runs in its own process with a new database, since MYHEALTH_SHARDS is read when the app is imported.
+Writers are forked, so this needs Unix.
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from common import make_app, make_history
+
+
+def write(job):
+    """
+    Adds water entries for a user as fast as it can (this is what each writer process does)
+
+    Args:
+        - job: (user id, seconds to run for)
+
+    Returns:
+        - Number of commits
+    """
+    user_id, seconds = job
+    from flask_app import db, shards
+    from flask_app.models import Water
+    for engine in shards.engines():
+        engine.dispose()
+    commits = 0
+    end = time.perf_counter() + seconds
+    with shards.use_user(user_id):
+        while(time.perf_counter() < end):
+            db.session.add(Water(num_cups = 1, date = date.today(), user_id = user_id))
+            db.session.commit()
+            commits += 1
+    db.session.remove()
+    return commits
+
+
+def run(count, writers, seconds):
+    """
+    Measures one shard count (this is what the child process does)
+
+    Args:
+        - count: number of shards (0 for sharding off)
+        - writers: number of writer processes
+        - seconds: how long they write for
+
+    Returns:
+        - None
+    """
+    os.environ['MYHEALTH_SHARDS'] = str(count)
+    app, db = make_app(os.path.join(tempfile.mkdtemp(prefix = 'myhealth-bench-'), 'bench.db'))
+    from flask_app import shards
+    with app.app_context():
+        users = [make_history(1, 1, 'writer%d' % i, 'writer%d@example.com' % i) for i in range(writers)]
+        used = len(set(shards.shard_of(u) for u in users)) if count else 1
+        db.session.remove()
+        for engine in shards.engines():
+            engine.dispose()
+        with multiprocessing.get_context('fork').Pool(writers) as pool:
+            commits = pool.map(write, [(u, seconds) for u in users])
+    total = sum(commits)
+    print("%8d %8d %10d %10.1f %12.1f" % (count, used, total, total / seconds, min(commits) / seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--shards', type = int, nargs = '+', default = [0, 1, 2, 4, 8],
+                        help = "shard counts to try (0 is sharding off)")
+    parser.add_argument('--writers', type = int, default = 8, help = "writer processes, one user each")
+    parser.add_argument('--seconds', type = float, default = 5, help = "how long each run writes for")
+    parser.add_argument('--run', type = int, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    if(args.run is not None):
+        return run(args.run, args.writers, args.seconds)
+
+    print("%d CPUs, %d writers, %.0f seconds each" % (multiprocessing.cpu_count(), args.writers, args.seconds))
+    print("%8s %8s %10s %10s %12s" % ('shards', 'in use', 'commits', 'commits/s', 'slowest/s'))
+    for count in args.shards:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--run', str(count), '--writers', str(args.writers),
+                        '--seconds', str(args.seconds)], check = True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+snapshot_reads.py
+Analytics pages with and without the read snapshot (flask_app/snapshot.py) while other users are writing: a few writer
+processes add water entries one commit at a time, and the personal stats page is requested over and over for a user
+with a long history. Prints the page latency and how many commits the writers got through in each mode.
+
+    python benchmarks/snapshot_reads.py --days 365 --writers 4 -n 100
+
+Each mode runs in its own process with a new database, since MYHEALTH_SNAPSHOT is read when the app is imported.
+Writers are forked, so this needs Unix.
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from common import make_app, make_history, login, timed, summary, print_table
+
+
+def write(user_id, stop, commits):
+    """
+    Adds water entries until told to stop (this is what each writer process does)
+
+    Args:
+        - user_id: id of the user writing
+        - stop: event that ends the loop
+        - commits: shared counter of commits
+
+    Returns:
+        - None
+    """
+    from flask_app import db, shards
+    from flask_app.models import Water
+    for engine in shards.engines():
+        engine.dispose()
+    with shards.use_user(user_id):
+        while(not stop.is_set()):
+            db.session.add(Water(num_cups = 1, date = date.today(), user_id = user_id))
+            db.session.commit()
+            with commits.get_lock():
+                commits.value += 1
+    db.session.remove()
+
+
+def run(mode, days, writers, n, page):
+    """
+    Measures one mode (this is what the child process does)
+
+    Args:
+        - mode: 'primary' or 'snapshot'
+        - days: days of history for the reading user
+        - writers: number of writer processes
+        - n: number of page requests
+        - page: page to request
+
+    Returns:
+        - None
+    """
+    os.environ['MYHEALTH_SNAPSHOT'] = '1' if mode == 'snapshot' else '0'
+    app, db = make_app(os.path.join(tempfile.mkdtemp(prefix = 'myhealth-bench-'), 'bench.db'))
+    from flask_app import shards, snapshot
+    with app.app_context():
+        make_history(days, 10)
+        users = [make_history(1, 1, 'writer%d' % i, 'writer%d@example.com' % i) for i in range(writers)]
+        if(mode == 'snapshot'):
+            snapshot.snapshot.refresh()
+        db.session.remove()
+        for engine in shards.engines():
+            engine.dispose()
+    client = app.test_client()
+    login(client)
+    client.get(page)
+    context = multiprocessing.get_context('fork')
+    stop = context.Event()
+    commits = context.Value('i', 0)
+    procs = [context.Process(target = write, args = (u, stop, commits)) for u in users]
+    for p in procs:
+        p.start()
+    try:
+        start = time.perf_counter()
+        latencies = timed(lambda: client.get(page), n)
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        for p in procs:
+            p.join()
+    print_table("%s reads, %d writers: %.1f commits/s" % (mode, writers, commits.value / elapsed), [(page, summary(latencies))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--days', type = int, default = 365, help = "days of history for the user reading the page")
+    parser.add_argument('--writers', type = int, default = 4, help = "writer processes")
+    parser.add_argument('-n', type = int, default = 100, help = "page requests per mode")
+    parser.add_argument('--page', default = '/personal_stats', help = "page to request")
+    parser.add_argument('--run', choices = ['primary', 'snapshot'], help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    if(args.run):
+        return run(args.run, args.days, args.writers, args.n, args.page)
+
+    for mode in ('primary', 'snapshot'):
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--run', mode, '--days', str(args.days),
+                        '--writers', str(args.writers), '-n', str(args.n), '--page', args.page], check = True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,450 @@
+"""
+stats_check.py
+Checks the statistics against randomized user histories, then gates on page latency. For every user it generates
+(random counts, dates, ties, runs with and without a GPS track, dense heart rate samples, users with no data at all), it
+works out the expected numbers from the generated rows alone, with plain loops over the documented formulas (not with
+stats.py, which is what is being checked), and compares every faster way the app has of getting them:
+
+    - the personal statistics as the page loads them from the database (stats.load)
+    - the same, read from the read snapshot (snapshot.py)
+    - the same, after retention has archived old rows into daily roll ups (retention.py)
+    - the dashboard cards from summaries.collect, collect_concurrently and gather
+
+Each check runs with one database and again with two shards, each in its own process. Then the key pages are timed for
+a user with a long history, and the run fails when a page's median is more than --tolerance above its median in
+benchmarks/baselines.json (recorded with --record, on the machine the gate runs on). The baselines are for a timed user
+with the same --days and --per-day (the defaults match the committed ones); with other values the pages are not timed
+and the gate is skipped, saying so. A configuration or page with no baseline fails the gate until --record is run.
+
+    python benchmarks/stats_check.py                  check and compare with the baselines
+    python benchmarks/stats_check.py --record         check and record new baselines
+
+Exits with 1 when a number differs, a page is slower than its baseline allows or has no baseline to compare with.
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+from types import SimpleNamespace
+from datetime import date, datetime, timedelta, time as clock
+from common import make_app, make_history, login, timed, summary, PASSWORD
+
+CONFIGS = {'plain': {}, 'shards': {'MYHEALTH_SHARDS': '2'}}
+ROUTES = ['/personal_stats', '/dashboard', '/dashboard/summary', '/dashboard/water', '/dashboard/heart_rate',
+          '/dashboard/exercises/all_runs', '/dashboard/exercises/all_exercises']
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+KEEP = 30
+WEEK = 7
+
+
+def generate(rng, today):
+    """
+    Makes a random history. Sizes go from nothing to a few hundred rows per kind, dates from only today to a few years
+    back, and water cups and run distances have few distinct values so records often tie.
+
+    Args:
+        - rng: random.Random to draw from
+        - today: the current date
+
+    Returns:
+        - SimpleNamespace with lists of runs, workouts, waters, heart_rates, sleeps and samples (dense heart rate)
+    """
+    span = rng.choice([0, 1, 6, 45, 400, 1200])
+    size = lambda: rng.choice([0, 1, 2, 10, 60, 300])
+    day = lambda: today - timedelta(days = rng.randint(0, span))
+    runs = []
+    for _ in range(size()):
+        track = None
+        if(rng.random() < 0.3):
+            track = SimpleNamespace(best_mile = round(rng.uniform(300, 700), 1), best_5k = rng.choice([None, round(rng.uniform(1100, 2400), 1)]))
+        runs.append(SimpleNamespace(date = day(), time = clock(rng.randint(0, 2), rng.randint(0, 59), rng.randint(0, 59)),
+                                    distance = rng.choice([1.0, 2.5, 3.1, 5.0, round(rng.uniform(1, 13.1), 2)]), track = track))
+    workouts = [SimpleNamespace(exercise = rng.choice(['squats', 'yoga', 'push ups']), date = day(),
+                                time = clock(rng.randint(0, 1), rng.randint(0, 59), rng.randint(0, 59))) for _ in range(size())]
+    waters = [SimpleNamespace(date = day(), num_cups = rng.randint(1, 4)) for _ in range(size())]
+    heart_rates = [SimpleNamespace(date = day(), heartrate = rng.randint(45, 180)) for _ in range(size())]
+    ends = set()
+    for _ in range(size()):
+        ends.add(datetime.combine(day(), clock(rng.randint(5, 11), rng.randint(0, 59), rng.randint(0, 59))))
+    sleeps = [SimpleNamespace(start_time = end - timedelta(minutes = rng.randint(60, 600)), end_time = end) for end in sorted(ends)]
+    samples = {}
+    for _ in range(rng.choice([0, 0, 50, 2000])):
+        when = datetime.combine(today - timedelta(days = rng.randint(0, 10)), clock(rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59)))
+        samples[when] = rng.randint(40, 190)
+    return SimpleNamespace(runs = runs, workouts = workouts, waters = waters, heart_rates = heart_rates, sleeps = sleeps,
+                           samples = sorted(samples.items()))
+
+
+def store(history, n, password):
+    """
+    Saves a generated history as a new user, rows in the order they were generated
+
+    Args:
+        - history: what generate returned
+        - n: number of the user (for the username and email)
+        - password: hashed password for the user
+
+    Returns:
+        - The id of the user
+    """
+    from flask_app import db, shards, heart_series
+    from flask_app.models import User, Routine, Workout, Runs, RunTrack, Water, Sleep, HeartRate
+    user = User(first_name = 'Check', last_name = 'User', username = 'check%d' % n, email = 'check%d@example.com' % n,
+                password = password, height = 70, weight = 160)
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    with shards.use_user(user_id):
+        db.session.add(Routine(user_id = user_id, routine = {'squats': [2, date.today()]}))
+        runs = [Runs(date = r.date, time = r.time, distance = r.distance, user_id = user_id) for r in history.runs]
+        db.session.add_all(runs)
+        db.session.flush()
+        for run, r in zip(runs, history.runs):
+            if(r.track):
+                db.session.add(RunTrack(points = 0, lats = b'', lons = b'', eles = b'', secs = b'', best_mile = r.track.best_mile,
+                                        best_5k = r.track.best_5k, run_id = run.id))
+        db.session.add_all([Workout(exercise = w.exercise, date = w.date, time = w.time, user_id = user_id) for w in history.workouts])
+        db.session.add_all([Water(date = w.date, num_cups = w.num_cups, user_id = user_id) for w in history.waters])
+        db.session.add_all([HeartRate(date = h.date, heartrate = h.heartrate, user_id = user_id) for h in history.heart_rates])
+        db.session.add_all([Sleep(start_time = s.start_time, end_time = s.end_time, user_id = user_id) for s in history.sleeps])
+        db.session.commit()
+        if(history.samples):
+            heart_series.append(user_id, history.samples)
+        db.session.remove()
+    return user_id
+
+
+def pace_text(seconds):
+    """
+    Formats seconds the way the statistics page shows paces: whole minutes, then seconds rounded to two digits (M'SS")
+
+    Args:
+        - seconds: number of seconds
+
+    Returns:
+        - The text
+    """
+    return '%d\'%02d"' % (seconds // 60, round(seconds % 60, 0))
+
+
+def expected_stats(history, today):
+    """
+    The personal statistics worked out from the generated rows. Ties go to the earliest day. A day's active time is a
+    time of day, so it wraps around after 24 hours, as it always has on the page.
+
+    Args:
+        - history: what generate returned
+        - today: the current date
+
+    Returns:
+        - Dictionary like stats.personal_stats
+    """
+    longest_run = [0, today]
+    fastest_run = [100000, "format", today]
+    fastest_5k = None
+    distances = []
+    paces = []
+    active = {}
+    for r in history.runs:
+        seconds = r.time.hour * 3600 + r.time.minute * 60 + r.time.second
+        pace = round(seconds / r.distance, 2)
+        best = round(r.track.best_mile, 2) if (r.track and r.track.best_mile) else pace
+        distances.append(r.distance)
+        paces.append(pace)
+        if((r.distance, -r.date.toordinal()) > (longest_run[0], -longest_run[1].toordinal())):
+            longest_run = [r.distance, r.date]
+        if((best, r.date) < (fastest_run[0], fastest_run[2])):
+            fastest_run = [best, pace_text(best), r.date]
+        if(r.track and r.track.best_5k and (fastest_5k is None or (r.track.best_5k, r.date) < (fastest_5k[0], fastest_5k[2]))):
+            fastest_5k = [r.track.best_5k, pace_text(r.track.best_5k), r.date]
+        active[r.date] = (active.get(r.date, 0) + seconds) % 86400
+    for w in history.workouts:
+        active[w.date] = (active.get(w.date, 0) + w.time.hour * 3600 + w.time.minute * 60 + w.time.second) % 86400
+
+    cups = {}
+    for w in history.waters:
+        cups[w.date] = cups.get(w.date, 0) + w.num_cups
+    most_water, water_date, avg_water = 0, today, 0
+    if(cups):
+        most_water = max(cups.values())
+        water_date = min(day for day in cups if cups[day] == most_water)
+        avg_water = round(sum(cups.values()) / ((today - min(min(cups), today)).days + 1), 2)
+
+    most_activity = []
+    avg_activity = 0
+    if(active):
+        most = max(active.values())
+        for day in sorted(active):
+            if(active[day] == most):
+                most_activity += [clock(most // 3600, most // 60 % 60, most % 60), day]
+        avg_activity = sum(active.values()) / ((today - min(min(active), today)).days + 1)
+
+    rates = [h.heartrate for h in history.heart_rates]
+    return {'longest_run': longest_run, 'fastest_run': fastest_run, 'most_water': most_water, 'water_date': water_date,
+            'most_activity': most_activity, 'avg_distance': sum(distances) / len(distances) if distances else 0,
+            'avg_pace': pace_text(sum(paces) / len(paces) if paces else 0), 'avg_water': avg_water,
+            'avg_time': clock(int(avg_activity // 3600), int(avg_activity // 60 % 60), int(avg_activity % 60)),
+            'avg_heartrate': sum(rates) / len(rates) if rates else 0, 'fastest_5k': fastest_5k}
+
+
+def expected_cards(history, day):
+    """
+    The dashboard cards worked out from the generated rows
+
+    Args:
+        - history: what generate returned
+        - day: the last day of the week
+
+    Returns:
+        - Dictionary of domain -> summary, like summaries.collect
+    """
+    week = lambda d: day - timedelta(days = WEEK) < d <= day
+    runs = [r for r in history.runs if week(r.date)]
+    workouts = [w for w in history.workouts if week(w.date)]
+    waters = [w for w in history.waters if week(w.date)]
+    end = datetime.combine(day + timedelta(days = 1), datetime.min.time())
+    sleeps = sorted([s for s in history.sleeps if end - timedelta(days = WEEK) < s.end_time < end], key = lambda s: s.end_time)
+    hours = [(s.end_time - s.start_time).total_seconds() / 3600 for s in sleeps]
+    rates = [h.heartrate for h in history.heart_rates if week(h.date)] + [rate for when, rate in history.samples if week(when.date())]
+    return {
+        'runs': {'count': len(runs), 'miles': round(sum(r.distance for r in runs), 2)},
+        'workouts': {'count': len(workouts), 'today': len([w for w in workouts if w.date == day])},
+        'water': {'today': sum(w.num_cups for w in waters if w.date == day), 'daily_average': round(sum(w.num_cups for w in waters) / WEEK, 1)},
+        'sleep': {'last_night': round(hours[-1], 1) if (sleeps and sleeps[-1].end_time.date() == day) else None,
+                  'average': round(sum(hours) / len(hours), 1) if hours else None},
+        'heart_rate': {'latest': history.heart_rates[-1].heartrate if history.heart_rates else None,
+                       'average': round(sum(rates) / len(rates)) if rates else None},
+    }
+
+
+class Checks:
+    """
+    Counts the comparisons of each path and keeps the first few differences
+    """
+    def __init__(self):
+        self.counts = {}
+        self.failures = []
+
+    def compare(self, path, user_id, expected, got):
+        """
+        Compares what a path gave with the expected value
+
+        Args:
+            - path: name of the path
+            - user_id: id of the user
+            - expected: the expected value
+            - got: what the path gave
+
+        Returns:
+            - None
+        """
+        done, bad = self.counts.get(path, (0, 0))
+        if(expected != got):
+            bad += 1
+            keys = [k for k in expected if expected[k] != got.get(k)] if isinstance(expected, dict) and isinstance(got, dict) else None
+            if(keys):
+                expected, got = {k: expected[k] for k in keys}, {k: got.get(k) for k in keys}
+            self.failures.append("%s, user %d:\n    expected %r\n    got      %r" % (path, user_id, expected, got))
+        self.counts[path] = (done + 1, bad)
+
+    def report(self):
+        """
+        Prints the counts and the first differences
+
+        Args:
+            - None
+
+        Returns:
+            - True if nothing differed
+        """
+        print("%-34s %6s %10s" % ('path', 'users', 'different'))
+        for path, (done, bad) in self.counts.items():
+            print("%-34s %6d %10d" % (path, done, bad))
+        for failure in self.failures[:10]:
+            print(failure)
+        return not self.failures
+
+
+def check_stats(users, today, checks):
+    """
+    Compares the personal statistics of every user, from the database and from the read snapshot, with the expected ones
+
+    Args:
+        - users: dictionary of user id -> generated history
+        - today: the current date
+        - checks: the Checks to count in
+
+    Returns:
+        - Dictionary of user id -> expected statistics
+    """
+    from flask_app import db, shards, stats, summaries, snapshot, shard_session
+    expected = {}
+    snapshot.snapshot.refresh()
+    for user_id, history in users.items():
+        expected[user_id] = expected_stats(history, today)
+        checks.compare('stats.personal_stats', user_id, expected[user_id],
+                       stats.personal_stats(history.runs, history.workouts, history.waters, history.heart_rates, today = today))
+        with shards.use_user(user_id):
+            checks.compare('stats.load', user_id, expected[user_id], stats.load(user_id, today))
+            db.session.remove()
+            shard_session.select_readers(snapshot.snapshot.pairs())
+            try:
+                checks.compare('stats.load from snapshot', user_id, expected[user_id], stats.load(user_id, today))
+            finally:
+                shard_session.select_readers(None)
+                db.session.remove()
+        cards = expected_cards(history, today)
+        checks.compare('summaries.collect', user_id, cards, summaries.collect(user_id, today))
+        checks.compare('summaries.collect_concurrently', user_id, cards, summaries.collect_concurrently(user_id, today))
+        checks.compare('summaries.gather', user_id, cards, asyncio.run(summaries.gather(user_id, today)))
+    return expected
+
+
+def check_retention(users, expected, today, checks):
+    """
+    Archives rows older than KEEP days and compares the personal statistics, now partly from daily roll ups, with the
+    ones expected from all the rows
+
+    Args:
+        - users: dictionary of user id -> generated history
+        - expected: dictionary of user id -> expected statistics
+        - today: the current date
+        - checks: the Checks to count in
+
+    Returns:
+        - None
+    """
+    from flask_app import app, db, shards, stats, retention
+    app.config['RETENTION_POLICIES'] = {'heart_rate': KEEP, 'water': KEEP, 'sleep': KEEP, 'runs': None, 'workout': None}
+    retention.run(today)
+    for user_id in users:
+        with shards.use_user(user_id):
+            checks.compare('stats.load after retention', user_id, expected[user_id], stats.load(user_id, today))
+            db.session.remove()
+
+
+def gate(app, config, args):
+    """
+    Times the key pages for a user with a long history and compares their medians with the baselines (or records them).
+    Skipped when the baselines were recorded for a user with a different history.
+
+    Args:
+        - app: the app
+        - config: name of the configuration
+        - args: the command line arguments
+
+    Returns:
+        - True if every page is within its baseline or the gate was skipped
+    """
+    baselines = {}
+    if(os.path.exists(BASELINES)):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+    settings = {'days': args.days, 'per_day': args.per_day}
+    recorded = baselines.get(config)
+    if(not args.record):
+        if(recorded is None):
+            print("There are no baselines for %s in %s, run with --record to record them" % (config, BASELINES))
+            return False
+        if(recorded['settings'] != settings):
+            print("Latency gate skipped: the baselines for %s were recorded for a user with %s, not %s (run with those "
+                  "settings to compare, or --record new baselines)" % (config, recorded['settings'], settings))
+            return True
+    with app.app_context():
+        make_history(args.days, args.per_day)
+    client = app.test_client()
+    login(client)
+    medians = {}
+    for route in ROUTES:
+        status = client.get(route).status_code
+        if(status != 200):
+            print("%s answered %d" % (route, status))
+            return False
+        medians[route] = round(summary(timed(lambda: client.get(route), args.n))['p50'], 2)
+    if(args.record):
+        recorded = baselines[config] = {'settings': settings, 'medians': medians}
+        with open(BASELINES, 'w') as f:
+            json.dump(baselines, f, indent = 4, sort_keys = True)
+            f.write('\n')
+        print("Recorded the medians as the baselines for %s in %s" % (config, BASELINES))
+    ok = True
+    print("%-36s %12s %12s %8s" % ('page', 'baseline ms', 'median ms', ''))
+    for route, median in medians.items():
+        baseline = recorded['medians'].get(route)
+        if(baseline is None):
+            result = 'MISSING'
+        elif(median > baseline * (1 + args.tolerance) + args.slack):
+            result = 'SLOWER'
+        else:
+            result = 'ok'
+        ok = ok and result == 'ok'
+        print("%-36s %12s %12.2f %8s" % (route, '-' if baseline is None else '%.2f' % baseline, median, result))
+    return ok
+
+
+def run_config(config, args):
+    """
+    Runs the checks and the latency gate in this process, with the app set up for one configuration
+
+    Args:
+        - config: name of the configuration (a key of CONFIGS)
+        - args: the command line arguments
+
+    Returns:
+        - 0 if everything passed, otherwise 1
+    """
+    os.environ.update(CONFIGS[config])
+    app, db = make_app()
+    from flask_app import bcrypt
+    today = date.today()
+    checks = Checks()
+    with app.app_context():
+        password = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+        rng = random.Random(args.seed)
+        users = {}
+        for n in range(args.users):
+            history = generate(rng, today)
+            users[store(history, n, password)] = history
+        expected = check_stats(users, today, checks)
+    print("== %s: %d users, seed %d" % (config, args.users, args.seed))
+    fast = gate(app, config, args)
+    with app.app_context():
+        check_retention(users, expected, today, checks)
+    same = checks.report()
+    return 0 if (same and fast) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type = int, default = 150, help = "random users to check")
+    parser.add_argument('--seed', type = int, default = 1, help = "random seed")
+    parser.add_argument('--days', type = int, default = 1095, help = "days of history of the user the pages are timed for")
+    parser.add_argument('--per-day', type = int, default = 10, help = "water and heart rate entries per day of that user")
+    parser.add_argument('-n', type = int, default = 20, help = "requests per page")
+    parser.add_argument('--tolerance', type = float, default = 1.0, help = "how much slower than the baseline a page may be (1.0 = twice as slow)")
+    parser.add_argument('--slack', type = float, default = 5.0, help = "milliseconds a page may be slower on top of that")
+    parser.add_argument('--record', action = 'store_true', help = "record the medians as the new baselines")
+    parser.add_argument('--config', choices = list(CONFIGS), action = 'append', help = "only run these configurations")
+    parser.add_argument('--in-process', action = 'store_true', help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    configs = args.config or list(CONFIGS)
+    if(args.in_process):
+        sys.exit(run_config(configs[0], args))
+    failed = []
+    for config in configs:
+        rest = [a for a in sys.argv[1:] if a not in ('--config',) + tuple(CONFIGS)]
+        if(subprocess.call([sys.executable, os.path.abspath(__file__), '--in-process', '--config', config] + rest) != 0):
+            failed.append(config)
+        print()
+    print("FAILED: %s" % ', '.join(failed) if failed else "All checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+worker_scaling.py
+Load test for the production server (flask_app/production.py): starts it with 1, 2, 4, ... worker processes and
+measures how many dashboard pages per second it serves with many clients at once. On a machine with several cores the
+throughput should grow with the number of workers up to about the number of cores.
+
+    python benchmarks/worker_scaling.py --workers 1 2 4 8 --clients 64 -n 2000
+
+Needs gunicorn (Unix only). The clients run in several processes so they are not the bottleneck.
+
+Last Modified: 10/19/2026
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+from common import make_app, make_history, free_port, wait_until_up, http_login, http_load
+
+
+def serve(path, port, workers, threads):
+    """
+    Runs the production server (this is what the child process does)
+
+    Args:
+        - path: the database file
+        - port: port to listen on
+        - workers: number of worker processes
+        - threads: threads per worker
+
+    Returns:
+        - None
+    """
+    app, db = make_app(path)
+    from flask_app import production
+    production.serve({'MYHEALTH_BIND': '127.0.0.1:%d' % port, 'MYHEALTH_WORKERS': str(workers),
+                      'MYHEALTH_THREADS': str(threads)})
+
+
+def client_process(job):
+    """
+    Runs one process worth of clients
+
+    Args:
+        - job: (url, cookie, clients, n)
+
+    Returns:
+        - (requests per second, latency summary, errors)
+    """
+    return http_load(*job)
+
+
+def main():
+    cpus = multiprocessing.cpu_count()
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--days', type = int, default = 365, help = "days of history for the user")
+    parser.add_argument('--workers', type = int, nargs = '+', default = sorted(set([1, 2, 4, cpus, cpus * 2])),
+                        help = "worker counts to try")
+    parser.add_argument('--threads', type = int, default = 1, help = "threads per worker")
+    parser.add_argument('--clients', type = int, default = 64, help = "clients at the same time")
+    parser.add_argument('--client-procs', type = int, default = max(1, min(cpus // 2, 8)), help = "processes running the clients")
+    parser.add_argument('-n', type = int, default = 2000, help = "requests per run")
+    parser.add_argument('--page', default = '/dashboard', help = "page to request")
+    parser.add_argument('--serve', action = 'store_true', help = argparse.SUPPRESS)
+    parser.add_argument('--db', help = argparse.SUPPRESS)
+    parser.add_argument('--port', type = int, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    if(args.serve):
+        return serve(args.db, args.port, args.workers[0], args.threads)
+
+    path = os.path.join(tempfile.mkdtemp(prefix = 'myhealth-bench-'), 'bench.db')
+    app, db = make_app(path)
+    with app.app_context():
+        make_history(args.days)
+
+    procs = args.client_procs
+    print("%d CPUs, %d clients in %d processes, %d threads per worker, %s" % (cpus, args.clients, procs, args.threads, args.page))
+    print("%8s %10s %9s %9s %9s %7s" % ('workers', 'req/s', 'speedup', 'p50 ms', 'p99 ms', 'errors'))
+    first = None
+    for workers in args.workers:
+        port = free_port()
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', '--db', path, '--port', str(port),
+                                  '--workers', str(workers), '--threads', str(args.threads)])
+        try:
+            base = 'http://127.0.0.1:%d' % port
+            wait_until_up(base)
+            cookie = http_login(base)
+            http_load(base + args.page, cookie, workers * 2, workers * 20)
+            jobs = [(base + args.page, cookie, max(1, args.clients // procs), args.n // procs)] * procs
+            with multiprocessing.Pool(procs) as pool:
+                results = pool.map(client_process, jobs)
+            rate = sum(r[0] for r in results)
+            p50 = sum(r[1]['p50'] for r in results) / len(results)
+            p99 = max(r[1]['p99'] for r in results)
+            errors = sum(r[2] for r in results)
+            first = first or rate
+            print("%8d %10.1f %8.2fx %9.2f %9.2f %7d" % (workers, rate, rate / first, p50, p99, errors))
+        finally:
+            child.terminate()
+            child.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,65 @@
 from flask import Flask, redirect, url_for, render_template,request,session,flash
-from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
+from werkzeug.middleware.proxy_fix import ProxyFix
+from flask_app.shard_session import ShardedSQLAlchemy, shard_binds
 
 from datetime import datetime
+import os
 
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = '1cc3c2e48b741275bce74ac0ba1da6e0'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
-db = SQLAlchemy(app)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('MYHEALTH_DATABASE_URI', 'sqlite:///site.db')
+app.config['SHARDS'] = int(os.environ.get('MYHEALTH_SHARDS', 0))
+app.config['SQLALCHEMY_BINDS'] = shard_binds(app.config['SQLALCHEMY_DATABASE_URI'], app.config['SHARDS'])
+app.config['SNAPSHOT_ENABLED'] = os.environ.get('MYHEALTH_SNAPSHOT') == '1'
+app.config['SNAPSHOT_URI'] = os.environ.get('MYHEALTH_SNAPSHOT_URI')
+app.config['SNAPSHOT_MAX_AGE'] = int(os.environ.get('MYHEALTH_SNAPSHOT_MAX_AGE', 60))
+app.config['SNAPSHOT_REFRESH'] = None
+app.config['SNAPSHOT_ENDPOINTS'] = ('personal_stats', 'all_runs', 'all_exercises')
+# days of raw rows to keep for each kind of data (None keeps everything), see retention.py
+app.config['RETENTION_POLICIES'] = {'heart_rate': 365, 'water': 365, 'sleep': 365, 'runs': None, 'workout': None}
+app.config['ARCHIVE_DIR'] = os.environ.get('MYHEALTH_ARCHIVE_DIR')
+app.config['ARCHIVE_PAGE_SIZE'] = 100
+app.config['LAKE_DIR'] = os.environ.get('MYHEALTH_LAKE_DIR')
+app.config['LAKE_BATCH_ROWS'] = 50000
+app.config['REMINDERS_ENABLED'] = os.environ.get('MYHEALTH_REMINDERS') == '1'
+app.config['REMINDER_NOTIFIER'] = os.environ.get('MYHEALTH_REMINDER_NOTIFIER', 'log')
+app.config['REMINDER_WEBHOOK_URL'] = os.environ.get('MYHEALTH_REMINDER_WEBHOOK_URL')
+app.config['REMINDER_HOUR'] = 8
+app.config['REMINDER_REFRESH'] = None
+app.config['INGEST_MODE'] = os.environ.get('MYHEALTH_INGEST_MODE', 'sync')
+app.config['INGEST_DURABILITY'] = os.environ.get('MYHEALTH_INGEST_DURABILITY', 'full')
+app.config['SUMMARY_WORKERS'] = 8
+app.config['ASGI_THREADS'] = int(os.environ.get('MYHEALTH_ASGI_THREADS', 16))
+app.config['SEARCH_FTS_ENABLED'] = True
+app.config['PROFILING_ENABLED'] = os.environ.get('MYHEALTH_PROFILING') == '1'
+app.config['PROFILING_TOKEN'] = os.environ.get('MYHEALTH_PROFILING_TOKEN')
+app.config['PROFILING_INTERVAL'] = 0.005
+app.config['PROFILE_DIR'] = os.environ.get('MYHEALTH_PROFILE_DIR')
+app.config['ACCOUNT_FILTER_ENABLED'] = True
+app.config['ACCOUNT_FILTER_REFRESH'] = 30
+app.config['RATELIMIT_ENABLED'] = os.environ.get('MYHEALTH_RATELIMIT', '1') == '1'
+app.config['RATELIMIT_REDIS_URL'] = os.environ.get('MYHEALTH_RATELIMIT_REDIS_URL')
+# number of reverse proxies in front of the app; the client address (used for rate limits) is then read from X-Forwarded-For
+app.config['PROXY_HOPS'] = int(os.environ.get('MYHEALTH_PROXY_HOPS', 0))
+# (requests, seconds): a bucket of that many requests that fills back up over that many seconds
+app.config['RATE_LIMITS'] = {'auth_ip': (20, 60), 'auth_account': (5, 300), 'write_ip': (120, 60), 'write_account': (60, 60),
+                           'check_ip': (60, 60)}
+if(app.config['PROXY_HOPS']):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for = app.config['PROXY_HOPS'], x_proto = app.config['PROXY_HOPS'])
+db = ShardedSQLAlchemy(app)
 bcrypt = Bcrypt(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 login_manager.login_message_category = 'info'
-from flask_app import routes
\ No newline at end of file
+from flask_app import profiler
+from flask_app import shards
+from flask_app import snapshot
+from flask_app import retention
+from flask_app import lake
+from flask_app import fragments
+from flask_app import routes
+from flask_app import assets
+from flask_app import reminders
\ No newline at end of file
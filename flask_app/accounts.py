@@ -0,0 +1,228 @@
+"""
+accounts.py
+Checks whether a username or email is already taken. A Bloom filter of every taken username and email answers "not
+taken" for most new names without a query (it never says a taken name is free, and only says a free name might be taken
+about FALSE_POSITIVE_RATE of the time). Anything the filter can't rule out is checked with one query for both fields.
+
+The filter is built from the user table the first time it is needed and is kept up to date as users are added or
+changed in this process. Users added or renamed by other processes (the other workers of the production server) are
+picked up by building it again from the table every ACCOUNT_FILTER_REFRESH seconds; until then a name could be reported
+free when it is not, so saving still relies on the unique constraints (see claim_error).
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app, db
+from flask_app.models import User
+from sqlalchemy import event, inspect, or_
+import hashlib
+import math
+import threading
+import time
+
+FALSE_POSITIVE_RATE = 0.01
+FIELDS = ('username', 'email')
+
+
+class BloomFilter:
+    """
+    Bloom filter over strings, sized for an expected number of items and a false positive rate. The k bit positions of
+    an item come from two halves of one blake2b hash (Kirsch-Mitzenmacher double hashing).
+    """
+    def __init__(self, capacity, error_rate = FALSE_POSITIVE_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.capacity = capacity
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        """
+        Helper method that gives the bit positions of an item
+
+        Args:
+            - item: the string
+
+        Returns:
+            - Generator of bit positions
+        """
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size = 16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        """
+        Adds an item
+
+        Args:
+            - item: the string
+
+        Returns:
+            - None
+        """
+        for p in self._positions(item):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+
+class TakenNames:
+    """
+    The Bloom filter of taken usernames and emails plus when it was last built from the user table
+    """
+    def __init__(self, refresh = 30):
+        self.refresh = refresh
+        self.filter = None
+        self.checked = 0
+        self.lock = threading.Lock()
+
+    def _load(self, rows):
+        """
+        Helper method that adds (username, email) rows to the filter
+
+        Args:
+            - rows: the rows
+
+        Returns:
+            - None
+        """
+        for username, email in rows:
+            self.filter.add('username:' + username)
+            self.filter.add('email:' + email)
+
+    def rebuild(self):
+        """
+        Builds the filter from every user, sized for twice the current number so it stays accurate as users are added
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        rows = db.session.query(User.username, User.email).all()
+        with self.lock:
+            self.filter = BloomFilter(2 * len(FIELDS) * max(len(rows), 1000))
+            self._load(rows)
+            self.checked = time.monotonic()
+
+    def current(self):
+        """
+        Gives the filter, building it the first time and again every refresh seconds, so users that other processes added
+        or whose username or email they changed are in it (a Bloom filter can't drop the old names, so it is rebuilt
+        rather than added to). It is also rebuilt, bigger, once it holds more than it was sized for.
+
+        Args:
+            - None
+
+        Returns:
+            - The Bloom filter
+        """
+        if(self.filter is None or self.filter.count > self.filter.capacity
+           or (self.refresh is not None and time.monotonic() - self.checked > self.refresh)):
+            self.rebuild()
+        return self.filter
+
+    def add(self, username, email):
+        """
+        Adds a user's username and email (does nothing until the filter is built)
+
+        Args:
+            - username: the username
+            - email: the email
+
+        Returns:
+            - None
+        """
+        with self.lock:
+            if(self.filter is not None):
+                self.filter.add('username:' + username)
+                self.filter.add('email:' + email)
+
+
+names = TakenNames(app.config.get('ACCOUNT_FILTER_REFRESH', 30))
+
+
+@event.listens_for(User, 'after_insert')
+def remember_new_user(mapper, connection, user):
+    """
+    Adds the username and email of a new user to the filter. If the transaction is rolled back they stay in it, which
+    only costs a query later.
+
+    Args:
+        - mapper: unused
+        - connection: unused
+        - user: the user
+
+    Returns:
+        - None
+    """
+    names.add(user.username, user.email)
+
+
+@event.listens_for(User, 'after_update')
+def remember_changed_user(mapper, connection, user):
+    """
+    Adds the username and email of a user to the filter when either of them changed
+
+    Args:
+        - mapper: unused
+        - connection: unused
+        - user: the user
+
+    Returns:
+        - None
+    """
+    state = inspect(user)
+    if(any(state.attrs[f].history.has_changes() for f in FIELDS)):
+        names.add(user.username, user.email)
+
+
+def taken(username = None, email = None, user = None):
+    """
+    Finds which of a username and email already belong to someone, with at most one query
+
+    Args:
+        - username: the username to check (None to skip)
+        - email: the email to check (None to skip)
+        - user: a user whose own username and email don't count (for profile updates)
+
+    Returns:
+        - Set with 'username' and/or 'email' for the ones that are taken
+    """
+    wanted = {f: v for f, v in (('username', username), ('email', email)) if v}
+    if(user is not None):
+        wanted = {f: v for f, v in wanted.items() if getattr(user, f) != v}
+    if(app.config.get('ACCOUNT_FILTER_ENABLED', True)):
+        bloom = names.current()
+        wanted = {f: v for f, v in wanted.items() if '%s:%s' % (f, v) in bloom}
+    if(not wanted):
+        return set()
+    query = db.session.query(User.username, User.email).filter(or_(*[getattr(User, f) == v for f, v in wanted.items()]))
+    if(user is not None):
+        query = query.filter(User.id != user.id)
+    found = set()
+    for row_username, row_email in query.limit(len(wanted)).all():
+        found.update(f for f, v in wanted.items() if (row_username, row_email)[FIELDS.index(f)] == v)
+    return found
+
+
+def claim_error(error):
+    """
+    Turns an IntegrityError from saving a user into the field that was taken, for when someone else took the name
+    between the check and the commit
+
+    Args:
+        - error: the IntegrityError
+
+    Returns:
+        - 'username', 'email', or None if the error was about something else
+    """
+    message = str(error.orig).lower()
+    for field in FIELDS:
+        if('user.' + field in message or '"' + field + '"' in message or field + '_key' in message):
+            return field
+    return None
@@ -0,0 +1,244 @@
+"""
+asgi.py
+ASGI entry point for the MyHealth Web App, for serving it with an ASGI server such as uvicorn or hypercorn:
+
+    uvicorn flask_app.asgi:application
+    MYHEALTH_SERVER=asgi python run.py
+
+The dashboard summary endpoint is handled right on the event loop and awaits its five queries at the same time, so a
+slow query for one user does not hold a thread. Every other request is passed to the Flask app, which runs on a thread
+pool the same way it would under a WSGI server.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app
+from flask_app import summaries, ingest, reminders
+from flask_app.models import load_user
+from flask import Request
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import io
+import json
+import sys
+
+SUMMARY_PATH = '/dashboard/summary'
+
+
+def make_environ(scope, body):
+    """
+    Builds a WSGI environ from an ASGI http scope
+
+    Args:
+        - scope: the ASGI scope
+        - body: the request body
+
+    Returns:
+        - The environ dictionary
+    """
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if(name not in ('CONTENT_TYPE', 'CONTENT_LENGTH')):
+            name = 'HTTP_' + name
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+
+async def read_body(receive):
+    """
+    Helper method that reads the whole request body
+
+    Args:
+        - receive: the ASGI receive callable
+
+    Returns:
+        - The body as bytes
+    """
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if(not message.get('more_body')):
+            return body
+
+
+async def respond(send, status, headers, body):
+    """
+    Helper method that sends a whole response
+
+    Args:
+        - send: the ASGI send callable
+        - status: status code
+        - headers: list of (name, value) strings
+        - body: the body as bytes
+
+    Returns:
+        - None
+    """
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class Application:
+    """
+    The ASGI application. Serves the dashboard summary itself and hands everything else to the Flask app.
+    """
+    def __init__(self, flask_app, threads = 16):
+        self.flask_app = flask_app
+        self.pool = ThreadPoolExecutor(max_workers = threads, thread_name_prefix = "asgi-wsgi")
+
+    async def __call__(self, scope, receive, send):
+        if(scope['type'] == 'lifespan'):
+            return await self.lifespan(receive, send)
+        if(scope['type'] != 'http'):
+            return
+        body = await read_body(receive)
+        environ = make_environ(scope, body)
+        if(scope['method'] == 'GET' and scope['path'] == SUMMARY_PATH):
+            # the user is looked up in the database, so off the event loop
+            user_id = await asyncio.get_event_loop().run_in_executor(self.pool, self.session_user, environ)
+            if(user_id is not None):
+                return await self.summary(send, user_id)
+        await self.call_flask(send, environ)
+
+    async def lifespan(self, receive, send):
+        """
+        Answers the server's startup and shutdown messages
+
+        Args:
+            - receive: the ASGI receive callable
+            - send: the ASGI send callable
+
+        Returns:
+            - None
+        """
+        while True:
+            message = await receive()
+            if(message['type'] == 'lifespan.startup'):
+                await send({'type': 'lifespan.startup.complete'})
+            elif(message['type'] == 'lifespan.shutdown'):
+                self.pool.shutdown(wait = True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def session_user(self, environ):
+        """
+        Reads the logged in user from the Flask session cookie and loads them with the login manager's user loader, like
+        Flask-Login would. Returns None when there is no user in the session (for example when the user is only
+        remembered by the remember me cookie) or the account no longer exists, and Flask then handles the request.
+
+        Args:
+            - environ: the WSGI environ of the request
+
+        Returns:
+            - The user id or None
+        """
+        session = self.flask_app.session_interface.open_session(self.flask_app, Request(environ))
+        if(not session or '_user_id' not in session):
+            return None
+        try:
+            with self.flask_app.app_context():
+                user = load_user(session['_user_id'])
+                return user.id if user is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    async def summary(self, send, user_id):
+        """
+        Sends the dashboard summary for a user as JSON, with the per domain queries running at the same time
+
+        Args:
+            - send: the ASGI send callable
+            - user_id: id of the user
+
+        Returns:
+            - None
+        """
+        loop = asyncio.get_event_loop()
+        if(ingest.writer.thread is not None):
+            await loop.run_in_executor(self.pool, ingest.writer.wait_for, user_id,
+                                       self.flask_app.config.get('INGEST_WAIT_TIMEOUT', 5.0))
+        data = json.dumps(await summaries.gather(user_id)).encode('utf-8')
+        await respond(send, 200, [('Content-Type', 'application/json'), ('Content-Length', str(len(data))),
+                                  ('Cache-Control', 'no-store')], data)
+
+    async def call_flask(self, send, environ):
+        """
+        Runs the Flask app on the thread pool and sends its response
+
+        Args:
+            - send: the ASGI send callable
+            - environ: the WSGI environ of the request
+
+        Returns:
+            - None
+        """
+        started = {}
+        written = []
+
+        def start_response(status, headers, exc_info = None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+            return written.append
+
+        def run():
+            result = self.flask_app.wsgi_app(environ, start_response)
+            try:
+                return b''.join(written) + b''.join(result)
+            finally:
+                if(hasattr(result, 'close')):
+                    result.close()
+
+        body = await asyncio.get_event_loop().run_in_executor(self.pool, run)
+        await respond(send, started['status'], started['headers'], body)
+
+
+application = Application(app, app.config.get('ASGI_THREADS', 16))
+
+
+def serve(host = '127.0.0.1', port = 5000):
+    """
+    Serves the app with uvicorn, or hypercorn if uvicorn is not installed
+
+    Args:
+        - host: address to listen on
+        - port: port to listen on
+
+    Returns:
+        - None
+    """
+    reminders.start_scheduler()
+    try:
+        import uvicorn
+    except ImportError:
+        uvicorn = None
+    if(uvicorn is not None):
+        uvicorn.run(application, host = host, port = port)
+        return
+    try:
+        from hypercorn.asyncio import serve as hypercorn_serve
+        from hypercorn.config import Config
+    except ImportError:
+        raise RuntimeError("Serving over ASGI needs uvicorn or hypercorn (pip install uvicorn)")
+    config = Config()
+    config.bind = ['%s:%d' % (host, port)]
+    asyncio.run(hypercorn_serve(application, config))
@@ -0,0 +1,211 @@
+"""
+assets.py
+Static file pipeline for the MyHealth Web App. `flask build-assets` copies every file in static/ to static/dist/ with a
+hash of its contents in the name, writes gzip (and brotli, when the brotli package is installed) versions next to it,
+and saves a manifest. Once the manifest exists, url_for('static', ...) points at the hashed names, and those files are
+served with a one year immutable Cache-Control header and the smallest encoding the browser accepts.
+Uploaded profile pictures get random names that never change, so they are cached the same way.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app
+from flask import request, send_from_directory
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST = 'dist'
+MANIFEST = os.path.join(app.static_folder, DIST, 'manifest.json')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# files that compress well enough to be worth keeping a compressed copy of
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.json', '.txt')
+DEFAULT_PICTURE = 'profile_pics/default.jpg'
+
+manifest = {}
+immutable = set()
+
+
+def fingerprint(path):
+    """
+    Helper method that gives a short hash of the contents of a file
+
+    Args:
+        - path: path to the file
+
+    Returns:
+        - The first 12 characters of the sha256 of the file
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+
+def compress(path):
+    """
+    Writes path.gz (and path.br when brotli is available) next to a file, unless the compressed copy would not be smaller
+
+    Args:
+        - path: path to the file
+
+    Returns:
+        - List of the encodings that were written
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = []
+    variants = [('gzip', '.gz', lambda d: gzip.compress(d, 9, mtime = 0))]
+    if(brotli is not None):
+        variants.append(('br', '.br', lambda d: brotli.compress(d, quality = 11)))
+    for encoding, ext, fn in variants:
+        packed = fn(data)
+        if(len(packed) < len(data)):
+            with open(path + ext, 'wb') as f:
+                f.write(packed)
+            written.append(encoding)
+    return written
+
+
+def build(static_folder = None):
+    """
+    Copies the static files to static/dist with hashed names, compresses them, and writes the manifest. Uploaded profile
+    pictures are left out (except the default one), they already have names that never change.
+
+    Args:
+        - static_folder: the static folder (defaults to the app's)
+
+    Returns:
+        - The manifest (dictionary of original name -> hashed name)
+    """
+    static_folder = static_folder or app.static_folder
+    dist = os.path.join(static_folder, DIST)
+    if(os.path.isdir(dist)):
+        shutil.rmtree(dist)
+    os.makedirs(dist)
+    built = {}
+    for folder, dirs, files in os.walk(static_folder):
+        rel_folder = os.path.relpath(folder, static_folder)
+        if(rel_folder == DIST or rel_folder.startswith(DIST + os.sep)):
+            continue
+        for name in files:
+            rel = os.path.normpath(os.path.join(rel_folder, name)).replace(os.sep, '/')
+            if(rel.startswith('profile_pics/') and rel != DEFAULT_PICTURE):
+                continue
+            base, ext = os.path.splitext(rel)
+            hashed = '%s/%s.%s%s' % (DIST, base, fingerprint(os.path.join(folder, name)), ext)
+            target = os.path.join(static_folder, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok = True)
+            shutil.copyfile(os.path.join(folder, name), target)
+            if(ext.lower() in COMPRESSIBLE):
+                compress(target)
+            built[rel] = hashed
+    with open(os.path.join(dist, 'manifest.json'), 'w') as f:
+        json.dump(built, f, indent = 1, sort_keys = True)
+    load(built)
+    return built
+
+
+def load(data = None):
+    """
+    Loads the manifest so url_for uses the hashed names. Does nothing if assets were never built.
+
+    Args:
+        - data: the manifest to use instead of reading it from disk
+
+    Returns:
+        - None
+    """
+    if(data is None):
+        if(not os.path.exists(MANIFEST)):
+            return
+        with open(MANIFEST) as f:
+            data = json.load(f)
+    manifest.clear()
+    manifest.update(data)
+    immutable.clear()
+    immutable.update(data.values())
+
+
+@app.url_defaults
+def hashed_static_url(endpoint, values):
+    """
+    Makes url_for('static', filename=...) point at the hashed copy of a file when there is one
+
+    Args:
+        - endpoint: the endpoint the url is for
+        - values: the url arguments
+
+    Returns:
+        - None
+    """
+    if(endpoint == 'static' and values.get('filename') in manifest):
+        values['filename'] = manifest[values['filename']]
+
+
+def _accepts(encoding):
+    """
+    Helper method that checks whether the browser accepts an encoding
+
+    Args:
+        - encoding: 'br' or 'gzip'
+
+    Returns:
+        - True if the Accept-Encoding header allows it
+    """
+    return request.accept_encodings[encoding] > 0
+
+
+def serve_static(filename):
+    """
+    Replaces Flask's static file view. Hashed files and uploaded profile pictures are sent with an immutable
+    Cache-Control header, and hashed files use their brotli or gzip copy when the browser accepts it. Everything else
+    is sent the normal way.
+
+    Args:
+        - filename: path of the file inside static/
+
+    Returns:
+        - The response
+    """
+    folder = app.static_folder
+    is_picture = filename.startswith('profile_pics/') and filename != DEFAULT_PICTURE
+    if(filename not in immutable and not is_picture):
+        return app.send_static_file(filename)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for enc, ext in (('br', '.br'), ('gzip', '.gz')):
+        if(filename in immutable and _accepts(enc) and os.path.exists(os.path.join(folder, filename + ext))):
+            encoding = enc
+            filename = filename + ext
+            break
+    response = send_from_directory(folder, filename, mimetype = mimetype, conditional = True)
+    if(encoding):
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Disposition', None)
+    if(filename.startswith(DIST + '/')):
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """
+    Command line entry point: flask build-assets
+    """
+    built = build()
+    print("Built %d assets into %s (brotli %s)" % (len(built), os.path.join(app.static_folder, DIST),
+                                                   "on" if brotli else "not installed, gzip only"))
+
+
+app.view_functions['static'] = serve_static
+load()
@@ -6,12 +6,33 @@ Last Modified: 01/14/2021
 """
 from flask_wtf import FlaskForm
 from flask_login import current_user
-from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField,PasswordField, SubmitField, BooleanField, FloatField,IntegerField
+from flask_wtf.file import FileField, FileAllowed, FileRequired
+from wtforms import StringField,PasswordField, SubmitField, BooleanField, FloatField,IntegerField, SelectField
 from wtforms.fields.html5 import DateField, TimeField
-from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
-from flask_app.models import User
+from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError, NumberRange
 from datetime import date,datetime
+from flask_app import accounts
+
+TAKEN_MESSAGES = {'username': 'This username already exists. Please choose a different username.',
+                  'email': 'This email already exists. Please choose a different email.'}
+
+def check_unique(form, user = None):
+    """
+    Adds an error to the username and email fields of a form if they belong to another user. Fields that already have
+    errors are not checked.
+
+    Args:
+        - form: a form with username and email fields
+        - user: the user whose own username and email are allowed (None when registering)
+
+    Returns:
+        - True if neither is taken
+    """
+    values = [None if getattr(form, f).errors else getattr(form, f).data for f in accounts.FIELDS]
+    found = accounts.taken(*values, user = user)
+    for f in found:
+        getattr(form, f).errors.append(TAKEN_MESSAGES[f])
+    return not found
 
 class RegistrationForm(FlaskForm):
     """
@@ -32,32 +53,17 @@ class RegistrationForm(FlaskForm):
     
     submit = SubmitField('Create Account')
 
-    def validate_username(self, username):
-        """
-        Validation method to make sure a unique username was entered
-
-        Args:
-            -self: the form
-            -username: the username textbox
-        Returns:
-            An error/exception if the username entered is not unique
-        """
-        user = User.query.filter_by(username = username.data).first()
-        if (user):
-            raise ValidationError('This username already exists. Please choose a different username.')
-    def validate_email(self, email):
+    def validate(self):
         """
-        Validation method to make sure a unique email was entered
+        Validates every field, then makes sure the username and email are not taken (with at most one query)
 
         Args:
             -self: the form
-            -email: the email textbox
         Returns:
-            An error/exception if the email entered is not unique
+            True if the form is valid
         """
-        user = User.query.filter_by(email = email.data).first()
-        if (user):
-            raise ValidationError('This email already exists. Please choose a different email.')
+        valid = super().validate()
+        return check_unique(self) and valid
 class LoginForm(FlaskForm):
     """
     Class that represents the form that allows returning users to log back in. Requires their email and password.
@@ -85,36 +91,18 @@ class UpdateAccountForm(FlaskForm):
     picture = FileField('Update Profile Picture', validators=[FileAllowed(['jpg','png'])])
     submit = SubmitField('Update Profile')
 
-    def validate_username(self, username):
+    def validate(self):
         """
-        Method that checks to make sure that if the username was updated, it is unique
+        Validates every field, then makes sure that if the username or email was updated, it is not taken (with at most one query)
 
         Args:
             - self: the form
-            - username: the username textbox
         
         Returns:
-            - An error/exception if the username is not unique.
+            - True if the form is valid
         """
-        if(username.data != current_user.username):
-            user = User.query.filter_by(username = username.data).first()
-            if (user):
-                raise ValidationError('This username already exists. Please choose a different username.')
-    def validate_email(self, email):
-        """
-        Method that checks to make sure that if the email was updated, it is unique
-
-        Args:
-            - self: the form
-            - email: the email textbox
-        
-        Returns:
-            - An error/exception if the email is not unique.
-        """
-        if(email.data != current_user.email):
-            user = User.query.filter_by(email = email.data).first()
-            if (user):
-                raise ValidationError('This email already exists. Please choose a different email.')
+        valid = super().validate()
+        return check_unique(self, current_user) and valid
 class RoutineForm(FlaskForm):
     """
     Form to add a routine to your routines. Requires a workout, the starting date, and frequency (Every how many days)
@@ -139,6 +127,12 @@ class RunForm(FlaskForm):
     duration = TimeField("For how long?",validators=[DataRequired()],format="%H:%M:%S")
     distance = FloatField("For what distance (miles)?",validators=[DataRequired()])
     submit = SubmitField('Add to your Runs')
+class ImportRunForm(FlaskForm):
+    """
+    Form to add a run from a GPS file (GPX, or FIT if supported). Requires the file.
+    """
+    track = FileField("GPS file (.gpx or .fit)", validators=[FileRequired(), FileAllowed(['gpx', 'fit'])])
+    submit = SubmitField('Import Run')
 class WaterForm(FlaskForm):
     """
     Form to add water intake data for the current user. Requires the date and number of cups drinken
@@ -185,4 +179,13 @@ class HeartRate_form(FlaskForm):
     """
     date = DateField("What date? (mm/dd/YYYY)",validators=[DataRequired()],format='%Y-%m-%d')
     measurement = IntegerField("What heart rate did you measure? (bpm)",validators=[DataRequired()])
-    submit = SubmitField("Add to Heart Rate Data")
\ No newline at end of file
+    submit = SubmitField("Add to Heart Rate Data")
+class GoalForm(FlaskForm):
+    """
+    Form to set a goal for the current user. Requires the kind of goal and the target (cups per day, miles per week, 
+    hours of sleep per night, or percent of routine sessions done per week).
+    """
+    kind = SelectField("Goal", choices = [('water', 'Cups of water per day'), ('distance', 'Miles run per week'),
+                                          ('sleep', 'Hours of sleep per night'), ('routine', 'Percent of routine done per week')])
+    target = FloatField("Target", validators=[DataRequired(), NumberRange(min = 0.1)])
+    submit = SubmitField("Set Goal")
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+fragments.py
+Template speedups for the MyHealth Web App. Compiled templates are kept in a Jinja bytecode cache on disk so they are not
+recompiled after a restart, and parts of the page that are the same for everyone (navigation bar, sidebar, dashboard
+cards) are rendered once and reused through the fragment() template function.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app
+from flask import render_template
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+import os
+import threading
+
+# without TEMPLATE_CACHE_DIR, Jinja uses a folder of its own that only this user can write to (and checks who owns it),
+# so nobody else can plant compiled templates for the app to run
+cache_dir = app.config.get('TEMPLATE_CACHE_DIR')
+if(cache_dir):
+    os.makedirs(cache_dir, mode = 0o700, exist_ok = True)
+# has to be set before app.jinja_env is first used
+app.jinja_options = dict(app.jinja_options, bytecode_cache = FileSystemBytecodeCache(cache_dir))
+
+_rendered = {}
+_lock = threading.Lock()
+
+
+def fragment(name, *key):
+    """
+    Renders a template that does not depend on the user (other than the parts listed in key) once and reuses the HTML.
+    Turned off when the app is in debug mode so template edits show up right away.
+
+    Args:
+        - name: the template to render
+        - key: any values the template depends on (like whether a user is logged in)
+
+    Returns:
+        - The rendered HTML
+    """
+    if(app.debug):
+        return Markup(render_template(name))
+    cache_key = (name,) + key
+    html = _rendered.get(cache_key)
+    if(html is None):
+        html = Markup(render_template(name))
+        with _lock:
+            _rendered[cache_key] = html
+    return html
+
+
+def clear():
+    """
+    Forgets every rendered fragment
+
+    Args:
+        - None
+
+    Returns:
+        - None
+    """
+    with _lock:
+        _rendered.clear()
+
+
+app.jinja_env.globals['fragment'] = fragment
@@ -0,0 +1,422 @@
+"""
+goals.py
+Goal and streak tracking for the MyHealth Web App. Progress for a goal is kept per period (a day or a week) and is updated
+as each piece of data is added, so a streak never has to be recomputed by scanning the whole history.
+Also contains the arithmetic used to find when the workouts in a routine are due.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import db, shards
+from flask_app.models import Goal, GoalPeriod, Routine, Workout, Runs, Water, Sleep
+from datetime import date, datetime, timedelta
+import math
+
+# kind of goal -> (length of a period, unit shown to the user)
+GOAL_KINDS = {
+    'water': ('day', 'cups'),
+    'distance': ('week', 'miles'),
+    'sleep': ('day', 'hours'),
+    'routine': ('week', '% of routine'),
+}
+
+
+def period_length(kind):
+    """
+    Helper method that gives the length of one period of a goal
+
+    Args:
+        - kind: the kind of goal
+
+    Returns:
+        - A timedelta of one day or one week
+    """
+    if(GOAL_KINDS[kind][0] == 'week'):
+        return timedelta(days = 7)
+    return timedelta(days = 1)
+
+
+def period_start(kind, day):
+    """
+    Helper method that finds the first day of the period that a date falls in. Weeks start on Monday.
+
+    Args:
+        - kind: the kind of goal
+        - day: the date
+
+    Returns:
+        - The first date of the period
+    """
+    if(GOAL_KINDS[kind][0] == 'week'):
+        return day - timedelta(days = day.weekday())
+    return day
+
+
+def first_due(every, started, day):
+    """
+    Finds the first date on or after day that a routine item is due, without stepping through every day.
+
+    Args:
+        - every: the routine item is due every this many days
+        - started: the date the routine item was started
+        - day: the date to search from
+
+    Returns:
+        - The first due date on or after day, or None if the frequency is not valid
+    """
+    if(not every or every <= 0):
+        return None
+    if(day <= started):
+        return started
+    offset = (day - started).days % every
+    if(offset == 0):
+        return day
+    return day + timedelta(days = every - offset)
+
+
+def due_dates(every, started, start, end):
+    """
+    Lists every date between start and end (inclusive) that a routine item is due
+
+    Args:
+        - every: the routine item is due every this many days
+        - started: the date the routine item was started
+        - start: first date of the window
+        - end: last date of the window
+
+    Returns:
+        - List of due dates in the window
+    """
+    dates = []
+    d = first_due(every, started, start)
+    while(d is not None and d <= end):
+        dates.append(d)
+        d += timedelta(days = every)
+    return dates
+
+
+def due_today(routine, day):
+    """
+    Finds the workouts of a routine that need to be done on a date
+
+    Args:
+        - routine: the routine dictionary of a user ({workout: [every, started]})
+        - day: the date
+
+    Returns:
+        - List of workouts that are due on that date
+    """
+    today = []
+    if(routine):
+        for workout in routine:
+            if(first_due(routine[workout][0], routine[workout][1], day) == day):
+                today.append(workout)
+    return today
+
+
+def due_in_window(routines, start, end):
+    """
+    Answers "what is due between start and end" across all the given routines in one pass over them
+
+    Args:
+        - routines: iterable of Routine objects (defaults to every routine when None)
+        - start: first date of the window
+        - end: last date of the window
+
+    Returns:
+        - Dictionary of user id -> {workout: [due dates]} containing only the workouts due in the window
+    """
+    if(routines is None):
+        routines = shards.all_rows(Routine.query.all)
+    due = {}
+    for r in routines:
+        if(not r.routine):
+            continue
+        for workout in r.routine:
+            dates = due_dates(r.routine[workout][0], r.routine[workout][1], start, end)
+            if(dates):
+                due.setdefault(r.user_id, {})[workout] = dates
+    return due
+
+
+def overdue(routine, done, start, day):
+    """
+    Finds the due dates of a routine between start and day (not including day) that have no matching workout
+
+    Args:
+        - routine: the routine dictionary of a user
+        - done: set of (exercise, date) pairs of the workouts the user did
+        - start: first date to check
+        - day: the current date
+
+    Returns:
+        - Dictionary of workout -> [missed dates]
+    """
+    missed = {}
+    if(not routine or day <= start):
+        return missed
+    for workout in routine:
+        dates = [d for d in due_dates(routine[workout][0], routine[workout][1], start, day - timedelta(days = 1))
+                 if (workout, d) not in done]
+        if(dates):
+            missed[workout] = dates
+    return missed
+
+
+def routine_due_count(user_id, start):
+    """
+    Counts how many routine sessions a user has due in the week starting at start
+
+    Args:
+        - user_id: id of the user
+        - start: the Monday the week starts on
+
+    Returns:
+        - The number of due sessions in that week
+    """
+    r = Routine.query.filter_by(user_id = user_id).first()
+    if(not r or not r.routine):
+        return 0
+    end = start + timedelta(days = 6)
+    return sum(len(dates) for dates in due_in_window([r], start, end).get(user_id, {}).values())
+
+
+def whole(value):
+    """
+    Helper method that shows a number without a decimal part when it is a whole number (5 cups, not 5.0 cups)
+
+    Args:
+        - value: the number
+
+    Returns:
+        - An int for whole numbers, otherwise the number
+    """
+    return int(value) if float(value).is_integer() else value
+
+
+def required_amount(goal, start):
+    """
+    Helper method that gives the amount that needs to be recorded in a period to meet the goal
+
+    Args:
+        - goal: the Goal
+        - start: the first date of the period
+
+    Returns:
+        - The amount needed, or None if nothing can be done in that period (no routine sessions due)
+    """
+    if(goal.kind == 'routine'):
+        due = routine_due_count(goal.user_id, start)
+        if(due == 0):
+            return None
+        return math.ceil(due * min(goal.target, 100) / 100)
+    return goal.target
+
+
+def _extend_streak(goal, start):
+    """
+    Updates the streak of a goal after the period starting at start was completed. Only the completed periods next to
+    it are looked at.
+
+    Args:
+        - goal: the Goal
+        - start: the first date of the period that was just completed
+
+    Returns:
+        - None
+    """
+    step = period_length(goal.kind)
+    before = 0
+    if(goal.streak_end is not None and goal.streak_end == start - step):
+        before = goal.streak
+    else:
+        prev = start - step
+        for p in goal.periods.filter(GoalPeriod.completed == True, GoalPeriod.start < start).order_by(GoalPeriod.start.desc()):
+            if(p.start != prev):
+                break
+            before += 1
+            prev -= step
+    after = 0
+    following = start + step
+    for p in goal.periods.filter(GoalPeriod.completed == True, GoalPeriod.start > start).order_by(GoalPeriod.start.asc()):
+        if(p.start != following):
+            break
+        after += 1
+        following += step
+    length = before + 1 + after
+    end = start + step * after
+    if(goal.streak_end is None or end >= goal.streak_end):
+        goal.streak = length
+        goal.streak_end = end
+    goal.best_streak = max(goal.best_streak, length)
+
+
+def _rebuild_streak(goal):
+    """
+    Helper method that works out the streak and best streak of a goal again from all of its completed periods. Only used
+    when a period stops being completed (because its target was raised), which _extend_streak can't undo.
+
+    Args:
+        - goal: the Goal
+
+    Returns:
+        - None
+    """
+    step = period_length(goal.kind)
+    length = 0
+    last = None
+    goal.best_streak = 0
+    for p in goal.periods.filter(GoalPeriod.completed == True).order_by(GoalPeriod.start.asc()):
+        length = length + 1 if (last is not None and p.start == last + step) else 1
+        last = p.start
+        goal.best_streak = max(goal.best_streak, length)
+    goal.streak = length
+    goal.streak_end = last
+
+
+def _evaluate(goal, period):
+    """
+    Helper method that marks a period as completed (and extends the streak) once its amount reaches the goal
+
+    Args:
+        - goal: the Goal
+        - period: the GoalPeriod
+
+    Returns:
+        - None
+    """
+    if(period.completed):
+        return
+    needed = required_amount(goal, period.start)
+    if(needed is not None and period.amount >= needed):
+        period.completed = True
+        _extend_streak(goal, period.start)
+
+
+def record(user_id, kind, day, amount):
+    """
+    Adds an amount to the progress of a user's goal for the period that day falls in. Does not commit, so it is saved in
+    the same transaction as the data that was added.
+
+    Args:
+        - user_id: id of the user
+        - kind: the kind of goal ('water', 'distance', 'sleep', 'routine')
+        - day: the date the data is for
+        - amount: cups of water, miles, hours of sleep, or routine sessions done
+
+    Returns:
+        - The updated GoalPeriod, or None if the user does not have that goal
+    """
+    goal = Goal.query.filter_by(user_id = user_id, kind = kind).first()
+    if(not goal):
+        return None
+    start = period_start(kind, day)
+    period = goal.periods.filter_by(start = start).first()
+    if(not period):
+        period = GoalPeriod(start = start, amount = 0.0, goal = goal)
+        db.session.add(period)
+    period.amount += amount
+    _evaluate(goal, period)
+    return period
+
+
+def current_amount(user_id, kind, start, end):
+    """
+    Adds up the data a user already has for a goal between start and end. Only used once when a goal is created.
+
+    Args:
+        - user_id: id of the user
+        - kind: the kind of goal
+        - start: first date of the period
+        - end: last date of the period
+
+    Returns:
+        - The amount already recorded in that period
+    """
+    if(kind == 'water'):
+        return sum(w.num_cups for w in Water.query.filter(Water.user_id == user_id, Water.date >= start, Water.date <= end))
+    if(kind == 'distance'):
+        return sum(r.distance for r in Runs.query.filter(Runs.user_id == user_id, Runs.date >= start, Runs.date <= end))
+    if(kind == 'sleep'):
+        sleeps = Sleep.query.filter(Sleep.user_id == user_id, Sleep.end_time >= datetime.combine(start, datetime.min.time()),
+                                    Sleep.end_time < datetime.combine(end + timedelta(days = 1), datetime.min.time()))
+        return sum((s.end_time - s.start_time).total_seconds()/3600 for s in sleeps)
+    r = Routine.query.filter_by(user_id = user_id).first()
+    if(not r or not r.routine):
+        return 0
+    done = set((w.exercise, w.date) for w in Workout.query.filter(Workout.user_id == user_id, Workout.date >= start, Workout.date <= end))
+    due = due_in_window([r], start, end).get(user_id, {})
+    return sum(1 for workout in due for d in due[workout] if (workout, d) in done)
+
+
+def set_goal(user_id, kind, target, today = None):
+    """
+    Creates a goal for a user or changes the target of an existing one. The current period is filled in from the data
+    the user already has, and checked again against the new target (raising it can undo a completed period and shorten
+    the streak). Does not commit.
+
+    Args:
+        - user_id: id of the user
+        - kind: the kind of goal
+        - target: the new target
+        - today: the current date (defaults to today)
+
+    Returns:
+        - The Goal
+    """
+    today = today or date.today()
+    goal = Goal.query.filter_by(user_id = user_id, kind = kind).first()
+    if(not goal):
+        goal = Goal(user_id = user_id, kind = kind, target = target, streak = 0, best_streak = 0)
+        db.session.add(goal)
+    goal.target = target
+    start = period_start(kind, today)
+    period = goal.periods.filter_by(start = start).first()
+    if(not period):
+        amount = current_amount(user_id, kind, start, start + period_length(kind) - timedelta(days = 1))
+        period = GoalPeriod(start = start, amount = amount, goal = goal)
+        db.session.add(period)
+    elif(period.completed):
+        # a raised target can mean the current period no longer meets the goal
+        needed = required_amount(goal, start)
+        if(needed is None or period.amount < needed):
+            period.completed = False
+            _rebuild_streak(goal)
+    _evaluate(goal, period)
+    return goal
+
+
+def progress(goal, today = None):
+    """
+    Builds what the goals page shows for a goal: the progress of the current period and the streak
+
+    Args:
+        - goal: the Goal
+        - today: the current date (defaults to today)
+
+    Returns:
+        - Dictionary with the kind, unit, target, amount, percent, completed, streak and best streak
+    """
+    today = today or date.today()
+    step = period_length(goal.kind)
+    start = period_start(goal.kind, today)
+    period = goal.periods.filter_by(start = start).first()
+    amount = period.amount if period else 0
+    needed = required_amount(goal, start)
+    if(needed is None):
+        percent = 100
+    elif(needed <= 0):
+        percent = 100
+    else:
+        percent = min(100, int(amount * 100 / needed))
+    streak = goal.streak if (goal.streak_end is not None and goal.streak_end >= start - step) else 0
+    return {
+        'kind': goal.kind,
+        'unit': GOAL_KINDS[goal.kind][1],
+        'per': GOAL_KINDS[goal.kind][0],
+        'target': whole(goal.target),
+        'amount': whole(round(amount, 2)),
+        'percent': percent,
+        'completed': bool(period and period.completed),
+        'streak': streak,
+        'best_streak': goal.best_streak,
+    }
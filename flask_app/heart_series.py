@@ -0,0 +1,234 @@
+"""
+heart_series.py
+Storage for dense heart rate samples from wearables. Instead of one database row per sample, all the samples of a user
+for a day are packed into one HeartRateChunk row (delta encoded times and 16 bit rates, compressed with zlib). Range reads
+only decode the days they touch, and min/max/mean over whole days come from the totals kept on each chunk.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import db
+from flask_app.models import HeartRateChunk
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime, time, timedelta
+from array import array
+import sys
+import zlib
+
+
+def _pack(values, typecode):
+    """
+    Helper method that turns a list of integers into compressed little endian bytes
+
+    Args:
+        - values: list of integers
+        - typecode: array typecode ('I' for times, 'H' for rates)
+
+    Returns:
+        - The compressed bytes
+    """
+    a = array(typecode, values)
+    if(sys.byteorder == 'big'):
+        a.byteswap()
+    return zlib.compress(a.tobytes(), 1)
+
+
+def _unpack(blob, typecode):
+    """
+    Helper method that turns bytes made by _pack back into an array
+
+    Args:
+        - blob: the compressed bytes
+        - typecode: array typecode
+
+    Returns:
+        - The array of integers
+    """
+    a = array(typecode)
+    a.frombytes(zlib.decompress(blob))
+    if(sys.byteorder == 'big'):
+        a.byteswap()
+    return a
+
+
+def encode(seconds, rates):
+    """
+    Encodes the samples of one day. Times are stored as the difference from the previous sample.
+
+    Args:
+        - seconds: sorted list of seconds since midnight
+        - rates: list of heart rates (same length as seconds)
+
+    Returns:
+        - (times bytes, rates bytes)
+    """
+    deltas = [seconds[0]] + [seconds[i] - seconds[i - 1] for i in range(1, len(seconds))] if seconds else []
+    return _pack(deltas, 'I'), _pack(rates, 'H')
+
+
+def decode(chunk):
+    """
+    Decodes the samples of a chunk
+
+    Args:
+        - chunk: the HeartRateChunk
+
+    Returns:
+        - (list of seconds since midnight, array of heart rates)
+    """
+    seconds = []
+    t = 0
+    for d in _unpack(chunk.times, 'I'):
+        t += d
+        seconds.append(t)
+    return seconds, _unpack(chunk.rates, 'H')
+
+
+def _merge_day(user_id, day, samples):
+    """
+    Helper method that adds samples to the chunk of a day (creating it if needed). A new sample at the same second as
+    an old one replaces it. Does not commit.
+
+    Args:
+        - user_id: id of the user
+        - day: the date
+        - samples: dictionary of seconds since midnight -> heart rate
+
+    Returns:
+        - The HeartRateChunk
+    """
+    chunk = HeartRateChunk.query.filter_by(user_id = user_id, day = day).first()
+    if(chunk):
+        seconds, rates = decode(chunk)
+        merged = dict(zip(seconds, rates))
+        merged.update(samples)
+    else:
+        chunk = HeartRateChunk(user_id = user_id, day = day)
+        db.session.add(chunk)
+        merged = samples
+    seconds = sorted(merged)
+    rates = [merged[s] for s in seconds]
+    chunk.times, chunk.rates = encode(seconds, rates)
+    chunk.count = len(rates)
+    chunk.min_rate = min(rates)
+    chunk.max_rate = max(rates)
+    chunk.total = sum(rates)
+    return chunk
+
+
+def append(user_id, samples):
+    """
+    Saves heart rate samples for a user, grouped into one chunk per day, and commits them
+
+    Args:
+        - user_id: id of the user
+        - samples: iterable of (datetime, heart rate) pairs
+
+    Returns:
+        - The number of samples saved
+    """
+    days = {}
+    n = 0
+    for when, rate in samples:
+        if(not 0 <= rate <= 65535):
+            raise ValueError("Heart rate out of range: %r" % rate)
+        days.setdefault(when.date(), {})[when.hour*3600 + when.minute*60 + when.second] = int(rate)
+        n += 1
+    for attempt in range(2):
+        try:
+            for day in days:
+                _merge_day(user_id, day, days[day])
+            db.session.commit()
+            return n
+        except IntegrityError:
+            # another request created the same day's chunk first, merge into theirs
+            db.session.rollback()
+            if(attempt == 1):
+                raise
+    return n
+
+
+def read_chunk(chunk):
+    """
+    Helper method that gives the samples of one chunk with their full datetimes
+
+    Args:
+        - chunk: the HeartRateChunk
+
+    Returns:
+        - List of (datetime, heart rate) pairs
+    """
+    midnight = datetime.combine(chunk.day, time())
+    seconds, rates = decode(chunk)
+    return [(midnight + timedelta(seconds = s), r) for s, r in zip(seconds, rates)]
+
+
+def read(user_id, start, end):
+    """
+    Reads the samples of a user between two times. Only the days in the range are loaded.
+
+    Args:
+        - user_id: id of the user
+        - start: first datetime (inclusive)
+        - end: last datetime (inclusive)
+
+    Returns:
+        - List of (datetime, heart rate) pairs in time order
+    """
+    out = []
+    chunks = HeartRateChunk.query.filter(HeartRateChunk.user_id == user_id, HeartRateChunk.day >= start.date(),
+                                         HeartRateChunk.day <= end.date()).order_by(HeartRateChunk.day).all()
+    for chunk in chunks:
+        out.extend((w, r) for w, r in read_chunk(chunk) if start <= w <= end)
+    return out
+
+
+def stats(user_id, start, end):
+    """
+    Finds the minimum, maximum and mean heart rate of a user between two times. Days fully inside the range use the
+    totals kept on their chunk; only the first and last day are decoded when they are partly covered.
+
+    Args:
+        - user_id: id of the user
+        - start: first datetime (inclusive)
+        - end: last datetime (inclusive)
+
+    Returns:
+        - Dictionary with count, min, max and mean (None values when there are no samples)
+    """
+    count = 0
+    total = 0
+    low = None
+    high = None
+    chunks = HeartRateChunk.query.filter(HeartRateChunk.user_id == user_id, HeartRateChunk.day >= start.date(),
+                                         HeartRateChunk.day <= end.date()).all()
+    for chunk in chunks:
+        day_start = datetime.combine(chunk.day, time())
+        if(start <= day_start and day_start + timedelta(days = 1) <= end + timedelta(seconds = 1)):
+            c, t, lo, hi = chunk.count, chunk.total, chunk.min_rate, chunk.max_rate
+        else:
+            rates = [r for w, r in read_chunk(chunk) if start <= w <= end]
+            if(not rates):
+                continue
+            c, t, lo, hi = len(rates), sum(rates), min(rates), max(rates)
+        count += c
+        total += t
+        low = lo if low is None else min(low, lo)
+        high = hi if high is None else max(high, hi)
+    return {'count': count, 'min': low, 'max': high, 'mean': round(total / count, 1) if count else None}
+
+
+def day_stats(user_id, day = None):
+    """
+    Summary of one day of samples, used by the heart rate page
+
+    Args:
+        - user_id: id of the user
+        - day: the date (defaults to today)
+
+    Returns:
+        - Dictionary with count, min, max and mean, or None if there are no samples that day
+    """
+    chunk = HeartRateChunk.query.filter_by(user_id = user_id, day = day or date.today()).first()
+    if(not chunk):
+        return None
+    return {'count': chunk.count, 'min': chunk.min_rate, 'max': chunk.max_rate, 'mean': round(chunk.total / chunk.count, 1)}
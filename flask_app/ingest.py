@@ -0,0 +1,309 @@
+"""
+ingest.py
+Write path for the data a user adds (runs, workouts, water, sleep, heart rate). By default every record is committed
+right away. In batch mode (INGEST_MODE = 'batch') records are put on a queue and a writer thread commits them in groups,
+either when a group is full or when the oldest record has waited long enough, so many records share one fsync.
+A user's next page load waits until their own queued records are committed, so they always see what they added.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app, db
+from flask_app import goals, shards
+from flask_app.shard_session import use
+from flask import g, has_request_context
+from flask_login import current_user
+from sqlalchemy import event
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """
+    Queue of records waiting to be written plus the writer thread that commits them in groups. Keeps a count of the
+    records each user has waiting so their next request can wait for them.
+    """
+    def __init__(self, batch_size = 200, max_delay = 0.05, max_pending = 10000, put_timeout = 1.0):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.put_timeout = put_timeout
+        self.queue = queue.Queue(maxsize = max_pending)
+        self.pending = {}
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        """
+        Starts the writer thread
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        if(self.thread is None):
+            self.thread = threading.Thread(target = self.run, name = "ingest-writer", daemon = True)
+            self.thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """
+        Writes everything still on the queue and stops the writer thread
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        if(self.thread is not None):
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def put(self, user_id, record, goal = None):
+        """
+        Puts a record on the queue. If the queue stays full for put_timeout seconds the record is written right away
+        instead, which slows the caller down to the speed of the writer (backpressure).
+
+        Args:
+            - user_id: id of the user the record belongs to
+            - record: the model instance to add, or a list of them
+            - goal: optional (kind, date, amount) to add to the user's goal progress
+
+        Returns:
+            - True if the record was queued, False if it was written right away
+        """
+        with self.cond:
+            self.pending[user_id] = self.pending.get(user_id, 0) + 1
+        try:
+            self.queue.put((user_id, record, goal), timeout = self.put_timeout)
+            return True
+        except queue.Full:
+            self._done([user_id])
+            write_now(user_id, record, goal)
+            return False
+
+    def _done(self, user_ids):
+        """
+        Helper method that lowers the pending count of users once their records are written and wakes up anyone waiting
+
+        Args:
+            - user_ids: list with the user id of every record that was written
+
+        Returns:
+            - None
+        """
+        with self.cond:
+            for user_id in user_ids:
+                left = self.pending.get(user_id, 0) - 1
+                if(left > 0):
+                    self.pending[user_id] = left
+                else:
+                    self.pending.pop(user_id, None)
+            self.cond.notify_all()
+
+    def wait_for(self, user_id, timeout = 5.0):
+        """
+        Waits until every record a user put on the queue has been committed
+
+        Args:
+            - user_id: id of the user
+            - timeout: longest time to wait in seconds
+
+        Returns:
+            - True if nothing is left for the user, False if the wait timed out
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: user_id not in self.pending, timeout)
+
+    def _next_batch(self):
+        """
+        Helper method that takes the next group of records off the queue. Waits for the first record, then collects more
+        until the group is full or max_delay has passed since the first one.
+
+        Args:
+            - None
+
+        Returns:
+            - List of (user id, record, goal) tuples (empty once the queue is stopped)
+        """
+        first = self.queue.get()
+        if(first is None):
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while(len(batch) < self.batch_size):
+            left = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout = left) if left > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if(item is None):
+                self.queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def write(self, batch):
+        """
+        Commits a group of records in one transaction. If the transaction fails, the records are written one at a time
+        so one bad record does not lose the others.
+
+        Args:
+            - batch: list of (user id, record, goal) tuples
+
+        Returns:
+            - None
+        """
+        try:
+            for user_id, record, goal in batch:
+                _add(user_id, record, goal)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("Batch of %d records failed, writing them one at a time", len(batch))
+            for user_id, record, goal in batch:
+                try:
+                    write_now(user_id, record, goal)
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Could not write %r", record)
+        finally:
+            self._done([item[0] for item in batch])
+
+    def run(self):
+        """
+        Loop of the writer thread
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        with app.app_context():
+            while(True):
+                batch = self._next_batch()
+                if(not batch):
+                    break
+                # one transaction per shard, and a new session for each so ids from different shards don't mix
+                groups = {}
+                for item in batch:
+                    groups.setdefault(shards.shard_of(item[0]) if shards.count() else None, []).append(item)
+                for shard, group in groups.items():
+                    with use(shard):
+                        self.write(group)
+                    db.session.remove()
+
+
+def _add(user_id, record, goal):
+    """
+    Helper method that adds a record (and its goal progress) to the current session without committing
+
+    Args:
+        - user_id: id of the user
+        - record: the model instance, or a list of them
+        - goal: optional (kind, date, amount)
+
+    Returns:
+        - None
+    """
+    db.session.add_all(record if isinstance(record, list) else [record])
+    if(goal):
+        goals.record(user_id, goal[0], goal[1], goal[2])
+
+
+def write_now(user_id, record, goal = None):
+    """
+    Adds a record and commits it right away
+
+    Args:
+        - user_id: id of the user
+        - record: the model instance, or a list of them (committed together)
+        - goal: optional (kind, date, amount)
+
+    Returns:
+        - None
+    """
+    _add(user_id, record, goal)
+    db.session.commit()
+
+
+writer = IngestQueue(app.config.get('INGEST_BATCH_SIZE', 200), app.config.get('INGEST_MAX_DELAY', 0.05),
+                     app.config.get('INGEST_MAX_PENDING', 10000))
+
+
+def submit(user_id, record, goal = None):
+    """
+    Saves a record that a user added, either right away or through the queue depending on INGEST_MODE. A list of records
+    is saved together: one commit, or one item on the queue.
+
+    Args:
+        - user_id: id of the user
+        - record: the model instance, or a list of them
+        - goal: optional (kind, date, amount) to add to the user's goal progress
+
+    Returns:
+        - None
+    """
+    if(app.config.get('INGEST_MODE') == 'batch'):
+        writer.start()
+        writer.put(user_id, record, goal)
+        # the write happens on the writer thread, so mark the request as having saved something here (see snapshot.py)
+        if(has_request_context()):
+            g.wrote = True
+    else:
+        write_now(user_id, record, goal)
+
+
+def set_sqlite_durability(dbapi_connection, connection_record):
+    """
+    Sets how durable SQLite commits are when a connection to the main database or a shard is opened (other engines, like
+    the read snapshot's, are left alone). 'full' is SQLite's default. 'normal' turns on WAL journaling with
+    synchronous=NORMAL, where a commit does not wait for fsync (the last commits can be lost if the machine loses power,
+    but the database is never corrupted).
+
+    Args:
+        - dbapi_connection: the new database connection
+        - connection_record: unused
+
+    Returns:
+        - None
+    """
+    if(not isinstance(dbapi_connection, sqlite3.Connection)):
+        return
+    if(app.config.get('INGEST_DURABILITY') == 'normal'):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+for _engine in shards.engines():
+    event.listen(_engine, "connect", set_sqlite_durability)
+    # connections opened before this (creating the tables) are closed, so every connection gets the setting
+    _engine.dispose()
+
+
+@app.before_request
+def read_your_writes():
+    """
+    Makes a user's request wait until the records they queued are committed so the page shows them
+
+    Args:
+        - None
+
+    Returns:
+        - None
+    """
+    if(writer.thread is None):
+        return
+    if(current_user.is_authenticated and not writer.wait_for(current_user.id, app.config.get('INGEST_WAIT_TIMEOUT', 5.0))):
+        logger.warning("Records for user %s were not written in time", current_user.id)
@@ -0,0 +1,405 @@
+"""
+lake.py
+Export of the health data to Parquet files for offline analysis, so analytics can read columns instead of copying site.db.
+Each table is written under LAKE_DIR partitioned by database and month, the way pyarrow, pandas, DuckDB or Spark read
+partitioned datasets:
+
+    LAKE_DIR/runs/shard=main/month=2026-10/part-1234.parquet
+    LAKE_DIR/water/shard=0/month=2026-09/part-5678.parquet
+
+shard is the database the rows are in ('main', or the shard number with MYHEALTH_SHARDS) and month is the month of the
+row's date (the end of a sleep, the start of a routine). Runs, workouts, water, sleep and heart rate are exported
+incrementally: _watermarks.json keeps the highest id exported from each table of each database, and a run only reads rows
+after it, LAKE_BATCH_ROWS at a time (by id, so memory doesn't grow with the table). The id range of a batch is saved in
+_watermarks.json before its files are written and the watermark after, and a run that finds a range still there (because
+the last one stopped part way) exports that same range again into the same files, even if LAKE_BATCH_ROWS changed, so
+rows are never missed or written twice. This needs ids that are never used again: the exported tables are created with
+AUTOINCREMENT, since otherwise SQLite gives a new row the highest id + 1, and after the newest rows are deleted (by the
+user, or by a shard move) new rows could get ids at or below the watermark and never be exported. Databases created
+before that are rebuilt with it by `flask lake upgrade`, and until then export refuses to run. Rows that are changed or deleted after they were exported (by edits or by retention) stay as
+they were in the lake. A user moved to another shard gets new ids there, so their rows are exported again under the new
+shard.
+
+Routines are changed in place, so they are written again in full on each run, one row per exercise.
+
+    flask lake export                  export what is new
+    flask lake export --every 60       keep running, exporting every 60 minutes
+    flask lake upgrade                 rebuild the tables of older databases with AUTOINCREMENT (with the app stopped)
+
+Needs the pyarrow package.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app, db, shards
+from flask_app.models import Routine, Workout, Runs, Water, Sleep, HeartRate
+from sqlalchemy import select
+from sqlalchemy.schema import CreateTable
+from datetime import date, datetime, time
+import click
+import json
+import logging
+import os
+import shutil
+import time as clock
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# table name -> (model, column that gives the month)
+TABLES = {
+    'runs': (Runs, Runs.date),
+    'workout': (Workout, Workout.date),
+    'water': (Water, Water.date),
+    'sleep': (Sleep, Sleep.end_time),
+    'heart_rate': (HeartRate, HeartRate.date),
+}
+WATERMARKS = '_watermarks.json'
+
+
+def lake_dir():
+    """
+    Folder the files go in: LAKE_DIR, or a lake folder next to the database
+
+    Args:
+        - None
+
+    Returns:
+        - The path
+    """
+    return app.config.get('LAKE_DIR') or os.path.join(os.path.dirname(db.engine.url.database), 'lake')
+
+
+def arrow_type(column):
+    """
+    The Arrow type for a column
+
+    Args:
+        - column: the table column
+
+    Returns:
+        - The pyarrow type
+    """
+    kind = column.type.python_type
+    if(kind is bool):
+        return pyarrow.bool_()
+    if(kind is int):
+        return pyarrow.int64()
+    if(kind is float):
+        return pyarrow.float64()
+    if(kind is datetime):
+        return pyarrow.timestamp('us')
+    if(kind is date):
+        return pyarrow.date32()
+    if(kind is time):
+        return pyarrow.time64('us')
+    return pyarrow.string()
+
+
+def schema(model):
+    """
+    The Arrow schema of a model's table
+
+    Args:
+        - model: the model
+
+    Returns:
+        - The pyarrow schema
+    """
+    return pyarrow.schema([(c.name, arrow_type(c)) for c in model.__table__.columns])
+
+
+def month(value):
+    """
+    The month partition of a date
+
+    Args:
+        - value: a date, datetime or None
+
+    Returns:
+        - 'YYYY-MM', or 'none' when there is no date
+    """
+    return '%04d-%02d' % (value.year, value.month) if value is not None else 'none'
+
+
+def shard_names():
+    """
+    Every database with its partition name
+
+    Args:
+        - None
+
+    Returns:
+        - List of (name, engine) pairs
+    """
+    engines = shards.engines()
+    return [('main', engines[0])] + [(str(i), e) for i, e in enumerate(engines[1:])]
+
+
+def load_watermarks(directory):
+    """
+    Reads the highest ids exported so far
+
+    Args:
+        - directory: the lake folder
+
+    Returns:
+        - Dictionary of table -> dictionary of shard -> id, and 'in_flight' -> table -> shard -> [first id, last id]
+    """
+    path = os.path.join(directory, WATERMARKS)
+    if(not os.path.exists(path)):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_watermarks(directory, watermarks):
+    """
+    Writes the highest ids exported so far (to a new file that then replaces the old one)
+
+    Args:
+        - directory: the lake folder
+        - watermarks: dictionary of table -> dictionary of shard -> id
+
+    Returns:
+        - None
+    """
+    path = os.path.join(directory, WATERMARKS)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(watermarks, f, indent = 1, sort_keys = True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def reusable_ids(engine):
+    """
+    Finds the exported tables of a database that were created without AUTOINCREMENT, so their ids can be used again
+
+    Args:
+        - engine: the database engine
+
+    Returns:
+        - List of table names
+    """
+    if(engine.dialect.name != 'sqlite'):
+        return []
+    with engine.connect() as conn:
+        created = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'").fetchall())
+    return [name for name in TABLES if name in created and 'AUTOINCREMENT' not in created[name].upper()]
+
+
+def upgrade(shard, engine, watermarks):
+    """
+    Rebuilds the exported tables of a database that can reuse ids with AUTOINCREMENT, in one transaction: the rows are
+    copied to a new table that replaces the old one, and its indexes and triggers (like the search triggers) are created
+    again. New ids then start above the highest id in the table or exported from it, whichever is higher.
+
+    Args:
+        - shard: the partition name of the database
+        - engine: the database engine
+        - watermarks: dictionary of table -> dictionary of shard -> id (see load_watermarks)
+
+    Returns:
+        - List of the tables rebuilt
+    """
+    names = reusable_ids(engine)
+    with engine.begin() as conn:
+        for name in names:
+            table = TABLES[name][0].__table__
+            columns = ', '.join(c.name for c in table.columns)
+            extras = [row[0] for row in conn.execute("SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') "
+                                                     "AND sql IS NOT NULL", name)]
+            conn.execute(str(CreateTable(table).compile(dialect = engine.dialect)).replace('CREATE TABLE %s (' % name, 'CREATE TABLE _new_%s (' % name, 1))
+            conn.execute("INSERT INTO _new_%s (%s) SELECT %s FROM %s" % (name, columns, columns, name))
+            conn.execute("DROP TABLE %s" % name)
+            conn.execute("ALTER TABLE _new_%s RENAME TO %s" % (name, name))
+            for sql in extras:
+                conn.execute(sql)
+            exported = max([watermarks.get(name, {}).get(shard, 0)] + watermarks.get('in_flight', {}).get(name, {}).get(shard, [0]))
+            top = max(conn.execute("SELECT max(id) FROM %s" % name).scalar() or 0, exported)
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", name)
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", name, top)
+    return names
+
+
+def write(columns, arrow_schema, path):
+    """
+    Writes columns to a Parquet file. The file is written under a hidden name (which readers of the dataset skip) and
+    renamed when it is complete.
+
+    Args:
+        - columns: dictionary of column name -> list of values
+        - arrow_schema: the pyarrow schema
+        - path: the file to write
+
+    Returns:
+        - None
+    """
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    partial = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+    pyarrow.parquet.write_table(pyarrow.Table.from_pydict(columns, schema = arrow_schema), partial, compression = 'zstd')
+    os.replace(partial, path)
+
+
+def export_table(name, shard, engine, directory, watermarks, batch_rows):
+    """
+    Exports the rows of one table of one database added since the watermark, one batch of ids at a time. Each batch is
+    split by month into files named after the first id of the batch. A batch left in flight by an earlier run is
+    exported first, with the same range of ids, so its files are overwritten rather than written again under other names.
+
+    Args:
+        - name: the table name (a key of TABLES)
+        - shard: the partition name of the database
+        - engine: the database engine
+        - directory: the lake folder
+        - watermarks: dictionary of table -> dictionary of shard -> id (and 'in_flight': table -> shard -> [first id,
+          last id] of a batch being written), updated and saved before and after each batch
+        - batch_rows: rows to read at a time
+
+    Returns:
+        - Number of rows exported
+    """
+    model, date_column = TABLES[name]
+    table = model.__table__
+    arrow_schema = schema(model)
+    names = [c.name for c in table.columns]
+    exported = 0
+    in_flight = watermarks.setdefault('in_flight', {}).setdefault(name, {})
+    while(True):
+        last = watermarks.get(name, {}).get(shard, 0)
+        batch = in_flight.get(shard)
+        query = select([table]).where(table.c.id > last).order_by(table.c.id)
+        if(batch):
+            query = query.where(table.c.id <= batch[1])
+        else:
+            query = query.limit(batch_rows)
+        with engine.connect() as conn:
+            rows = conn.execute(query).fetchall()
+        if(not rows and not batch):
+            return exported
+        if(not batch):
+            batch = in_flight[shard] = [rows[0].id, rows[-1].id]
+            save_watermarks(directory, watermarks)
+        months = {}
+        for row in rows:
+            months.setdefault(month(row[date_column.name]), []).append(row)
+        for key, group in months.items():
+            path = os.path.join(directory, name, 'shard=' + shard, 'month=' + key, 'part-%d.parquet' % batch[0])
+            write({n: [row[n] for row in group] for n in names}, arrow_schema, path)
+        watermarks.setdefault(name, {})[shard] = batch[1]
+        del in_flight[shard]
+        save_watermarks(directory, watermarks)
+        exported += len(rows)
+
+
+def export_routines(shard, engine, directory):
+    """
+    Writes every routine of one database again, one row per exercise, replacing the routines exported before. The new
+    files are written to a hidden folder, the old folder is renamed aside and the new one renamed into its place, and only
+    then is the old one deleted.
+
+    Args:
+        - shard: the partition name of the database
+        - engine: the database engine
+        - directory: the lake folder
+
+    Returns:
+        - Number of rows exported
+    """
+    arrow_schema = pyarrow.schema([('routine_id', pyarrow.int64()), ('user_id', pyarrow.int64()), ('date_started', pyarrow.timestamp('us')),
+                                   ('exercise', pyarrow.string()), ('every_days', pyarrow.int64()), ('start', pyarrow.date32())])
+    months = {}
+    with engine.connect() as conn:
+        for routine in conn.execute(select([Routine.__table__])):
+            for exercise, (every, start) in (routine.routine or {}).items():
+                months.setdefault(month(routine.date_started), []).append(
+                    (routine.id, routine.user_id, routine.date_started, exercise, every, start.date() if isinstance(start, datetime) else start))
+    final = os.path.join(directory, 'routine', 'shard=' + shard)
+    fresh = os.path.join(directory, 'routine', '.shard=' + shard + '.tmp')
+    old = os.path.join(directory, 'routine', '.shard=' + shard + '.old')
+    shutil.rmtree(fresh, ignore_errors = True)
+    shutil.rmtree(old, ignore_errors = True)
+    for key, rows in months.items():
+        write({field.name: [row[i] for row in rows] for i, field in enumerate(arrow_schema)}, arrow_schema,
+              os.path.join(fresh, 'month=' + key, 'part-0.parquet'))
+    if(os.path.exists(final)):
+        os.replace(final, old)
+    if(months):
+        os.replace(fresh, final)
+    shutil.rmtree(old, ignore_errors = True)
+    return sum(len(rows) for rows in months.values())
+
+
+def export(directory = None, batch_rows = None):
+    """
+    Exports what is new in every table of every database
+
+    Args:
+        - directory: the lake folder (defaults to lake_dir())
+        - batch_rows: rows to read at a time (defaults to LAKE_BATCH_ROWS)
+
+    Returns:
+        - Dictionary of table -> number of rows exported
+    """
+    if(pyarrow is None):
+        raise RuntimeError("Exporting to Parquet needs the pyarrow package")
+    directory = directory or lake_dir()
+    batch_rows = batch_rows or app.config.get('LAKE_BATCH_ROWS', 50000)
+    for shard, engine in shard_names():
+        if(reusable_ids(engine)):
+            raise RuntimeError("The %s tables of database %s can reuse ids, run flask lake upgrade (with the app stopped) first"
+                               % (', '.join(reusable_ids(engine)), shard))
+    os.makedirs(directory, exist_ok = True)
+    watermarks = load_watermarks(directory)
+    exported = dict.fromkeys(list(TABLES) + ['routine'], 0)
+    for shard, engine in shard_names():
+        for name in TABLES:
+            exported[name] += export_table(name, shard, engine, directory, watermarks, batch_rows)
+        exported['routine'] += export_routines(shard, engine, directory)
+    return exported
+
+
+@app.cli.group('lake')
+def lake_command():
+    """
+    Parquet export for offline analysis: flask lake ...
+    """
+
+
+@lake_command.command('export')
+@click.option('--every', type = int, help = "keep running, exporting every this many minutes")
+@click.option('--dir', 'directory', help = "folder to export to (defaults to LAKE_DIR)")
+def export_command(every, directory):
+    """
+    Exports the rows added since the last export to Parquet files
+    """
+    if(pyarrow is None):
+        raise click.ClickException("Exporting to Parquet needs the pyarrow package")
+    while(True):
+        started = clock.monotonic()
+        try:
+            exported = export(directory)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        for name, count in exported.items():
+            click.echo("%s: %d rows exported" % (name, count))
+        if(not every):
+            return
+        clock.sleep(max(0, every * 60 - (clock.monotonic() - started)))
+
+
+@lake_command.command('upgrade')
+@click.option('--dir', 'directory', help = "folder exported to (defaults to LAKE_DIR), for the ids exported so far")
+def upgrade_command(directory):
+    """
+    Rebuilds the exported tables of databases created before they used AUTOINCREMENT. Run it with the app stopped.
+    """
+    watermarks = load_watermarks(directory or lake_dir())
+    for shard, engine in shard_names():
+        names = upgrade(shard, engine, watermarks)
+        click.echo("%s: %s" % (shard, ', '.join(names) + " rebuilt" if names else "nothing to do"))
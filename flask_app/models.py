@@ -1,6 +1,6 @@
 """
 models.py
-Classes that blueprint all data that will be stored in the sqlite database. Includes a user, routine, workout, run, water intake, sleep data, and heart rate data
+Classes that blueprint all data that will be stored in the sqlite database. Includes a user, routine, workout, run, water intake, sleep data, heart rate data, and goals
 
 Last Modified: 01/14/2021
 """
@@ -40,6 +40,7 @@ class User(db.Model, UserMixin):
     water = db.relationship("Water", backref = 'drinker', lazy = True)
     sleep = db.relationship("Sleep",backref = 'sleeper', lazy = True)
     heart = db.relationship("HeartRate", backref = "who", lazy = True)
+    goals = db.relationship("Goal", backref = "owner", lazy = True)
     def __repr__(self):
         """
         String representation of the User object
@@ -67,6 +68,7 @@ class Routine(db.Model):
     Class that models a routine of a user. Includes date of routine, the workouts, and the frequency of the workout, and the user id of the
     user it is associated with
     """
+    __sharded__ = True
     id = db.Column(db.Integer,primary_key= True)
     date_started = db.Column(db.DateTime,nullable=False, default = date.today())
     routine = db.Column(db.PickleType,nullable = False, default = {})
@@ -88,6 +90,8 @@ class Workout(db.Model):
     Class that blueprints a workout of a user. Includes data, duration of workout, type of workout, and the user id of the
     user it is associated with.
     """
+    __sharded__ = True
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key = True)
     exercise = db.Column(db.String(100))
     date = db.Column(db.Date)
@@ -109,11 +113,14 @@ class Runs(db.Model):
     Class that represents a run of a user. Includes data such as date, duration of run, distance of run, and the user id of the
     user it is associated with
     """
+    __sharded__ = True
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key = True)
     date = db.Column(db.Date)
     time = db.Column(db.Time)
     distance = db.Column(db.REAL, nullable = False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable = False)
+    track = db.relationship('RunTrack', backref = 'run', uselist = False, lazy = True, cascade = "all, delete-orphan")
     def __repr__ (self):
         """
         String representation of the Runs object
@@ -125,11 +132,43 @@ class Runs(db.Model):
             String representation of the runs
         """
         return f"Run('{self.distance}','{self.date}','{self.time}')"
+class RunTrack(db.Model):
+    """
+    Class that represents the GPS track of a run. The points are stored compressed (latitude and longitude in 1e-7 degrees,
+    delta encoded, elevation in meters, and seconds since the start), along with the results computed from them when the
+    track was imported: moving time, elevation gain, mile splits, and the fastest mile and 5k within the run.
+    """
+    __sharded__ = True
+    id = db.Column(db.Integer, primary_key = True)
+    points = db.Column(db.Integer, nullable = False)
+    lats = db.Column(db.LargeBinary, nullable = False)
+    lons = db.Column(db.LargeBinary, nullable = False)
+    eles = db.Column(db.LargeBinary, nullable = False)
+    secs = db.Column(db.LargeBinary, nullable = False)
+    moving_time = db.Column(db.REAL)
+    elevation_gain = db.Column(db.REAL)
+    best_mile = db.Column(db.REAL)
+    best_5k = db.Column(db.REAL)
+    splits = db.Column(db.PickleType, nullable = False, default = [])
+    run_id = db.Column(db.Integer, db.ForeignKey('runs.id'), nullable = False, unique = True)
+    def __repr__ (self):
+        """
+        String representation of the RunTrack object
+
+        Args:
+            -self: the RunTrack instance
+
+        Returns:
+            String representation of the run track
+        """
+        return f"RunTrack('{self.points}','{self.best_mile}','{self.best_5k}')"
 class Water(db.Model):
     """
     Class that represents data of water intake of a user. Includes date of data, number of cups drinken, and the user id of the
     user it is associated with
     """
+    __sharded__ = True
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key = True)
     num_cups = db.Column(db.Integer,nullable = False)
     date = db.Column(db.Date, nullable = False)
@@ -150,6 +189,8 @@ class Sleep(db.Model):
     Class that represents sleep data of a user. Includes start time of sleep, end time of sleep, and the user id of the
     user it is associated with
     """
+    __sharded__ = True
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer,primary_key = True)
     start_time = db.Column(db.DateTime,nullable = False)
     end_time = db.Column(db.DateTime, nullable = False)
@@ -170,6 +211,8 @@ class HeartRate(db.Model):
     Class that represents data of a heart rate measruement. Includes date, the measurement, and the user id of the
     user it is associated with
     """
+    __sharded__ = True
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key = True)
     date = db.Column(db.Date, nullable = False)
     heartrate = db.Column(db.Integer, nullable = False)
@@ -185,5 +228,130 @@ class HeartRate(db.Model):
             String representation of the heart rate data
         """
         return f"Heart Rate('{self.date}','{self.heartrate}')"
+class HeartRateChunk(db.Model):
+    """
+    Class that holds all the heart rate samples (from a watch or other wearable) of a user for one day in one row. The
+    times are stored as seconds since midnight, delta encoded, and the samples as unsigned 16 bit integers, both compressed.
+    The count, minimum, maximum and sum are kept so whole days can be summarized without decoding the samples.
+    """
+    __sharded__ = True
+    id = db.Column(db.Integer, primary_key = True)
+    day = db.Column(db.Date, nullable = False)
+    count = db.Column(db.Integer, nullable = False, default = 0)
+    min_rate = db.Column(db.Integer, nullable = False)
+    max_rate = db.Column(db.Integer, nullable = False)
+    total = db.Column(db.Integer, nullable = False, default = 0)
+    times = db.Column(db.LargeBinary, nullable = False)
+    rates = db.Column(db.LargeBinary, nullable = False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable = False)
+    __table_args__ = (db.UniqueConstraint('user_id', 'day'),)
+    def __repr__ (self):
+        """
+        String representation of the HeartRateChunk object
+
+        Args:
+            -self: the HeartRateChunk instance
+
+        Returns:
+            String representation of the heart rate chunk
+        """
+        return f"HeartRateChunk('{self.day}','{self.count}')"
+class Goal(db.Model):
+    """
+    Class that represents a goal of a user (water per day, distance per week, sleep per night, or routine adherence per week).
+    Keeps the running streak so it can be updated as each piece of data is added instead of recomputed from history.
+    """
+    __sharded__ = True
+    id = db.Column(db.Integer, primary_key = True)
+    kind = db.Column(db.String(20), nullable = False)
+    target = db.Column(db.REAL, nullable = False)
+    streak = db.Column(db.Integer, nullable = False, default = 0)
+    best_streak = db.Column(db.Integer, nullable = False, default = 0)
+    streak_end = db.Column(db.Date)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable = False)
+    periods = db.relationship("GoalPeriod", backref = "goal", lazy = 'dynamic', cascade = "all, delete-orphan")
+    __table_args__ = (db.UniqueConstraint('user_id', 'kind'),)
+    def __repr__ (self):
+        """
+        String representation of the Goal object
+
+        Args:
+            -self: the Goal instance
+
+        Returns:
+            String representation of the goal
+        """
+        return f"Goal('{self.kind}','{self.target}','{self.streak}')"
+class GoalPeriod(db.Model):
+    """
+    Class that represents the progress of a goal for one period (a day or a week starting on Monday). Includes the 
+    start of the period, the amount recorded so far, and whether the goal was met.
+    """
+    __sharded__ = True
+    id = db.Column(db.Integer, primary_key = True)
+    start = db.Column(db.Date, nullable = False)
+    amount = db.Column(db.REAL, nullable = False, default = 0.0)
+    completed = db.Column(db.Boolean, nullable = False, default = False)
+    goal_id = db.Column(db.Integer, db.ForeignKey('goal.id'), nullable = False)
+    __table_args__ = (db.UniqueConstraint('goal_id', 'start'),)
+    def __repr__ (self):
+        """
+        String representation of the GoalPeriod object
+
+        Args:
+            -self: the GoalPeriod instance
+
+        Returns:
+            String representation of the goal period
+        """
+        return f"GoalPeriod('{self.start}','{self.amount}','{self.completed}')"
     
+class DailySummary(db.Model):
+    """
+    Class that holds one day of a user's water, sleep or heart rate data after the raw rows were rolled up and archived
+    (see retention.py). Keeps the number of rows, their total, and the lowest and highest value (cups, hours slept, or
+    beats per minute).
+    """
+    __sharded__ = True
+    id = db.Column(db.Integer, primary_key = True)
+    kind = db.Column(db.String(20), nullable = False)
+    day = db.Column(db.Date, nullable = False)
+    count = db.Column(db.Integer, nullable = False, default = 0)
+    total = db.Column(db.REAL, nullable = False, default = 0.0)
+    low = db.Column(db.REAL, nullable = False)
+    high = db.Column(db.REAL, nullable = False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable = False)
+    __table_args__ = (db.UniqueConstraint('user_id', 'kind', 'day'),)
+    def __repr__ (self):
+        """
+        String representation of the DailySummary object
+
+        Args:
+            -self: the DailySummary instance
+
+        Returns:
+            String representation of the daily summary
+        """
+        return f"DailySummary('{self.kind}','{self.day}','{self.count}','{self.total}')"
+    
+class ShardDirectory(db.Model):
+    """
+    Which shard file holds a user's data when the app runs with shards. Kept in the main database next to the users.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key = True)
+    shard = db.Column(db.Integer, nullable = False, index = True)
+
+    def __repr__(self):
+        """
+        String representation of the ShardDirectory object
+
+        Args:
+            -self: the ShardDirectory instance
+
+        Returns:
+            String representation of the directory entry
+        """
+        return f"ShardDirectory('{self.user_id}', '{self.shard}')"
+
+
 db.create_all()
\ No newline at end of file
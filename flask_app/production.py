@@ -0,0 +1,120 @@
+"""
+production.py
+Production server for the MyHealth Web App: gunicorn with a master process that loads the app once and forks worker
+processes from it (so they share its memory copy-on-write), each with a number of threads. Start it with
+
+    MYHEALTH_SERVER=production python run.py
+
+Settings come from the environment: MYHEALTH_BIND (default 127.0.0.1:8000), MYHEALTH_WORKERS (default 2 per CPU + 1),
+MYHEALTH_THREADS (default 1), MYHEALTH_TIMEOUT, MYHEALTH_MAX_REQUESTS and MYHEALTH_PIDFILE.
+
+Reloading: `kill -HUP <master pid>` starts new workers and lets the old ones finish their requests before stopping. The
+app is loaded before forking, so new code needs a new master: `kill -USR2 <master pid>` starts one next to the old one,
+then `kill -QUIT <old master pid>` stops the old one once the new one is up.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app, db
+from flask_app import reminders, shards
+import logging
+import multiprocessing
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def settings(environ = os.environ):
+    """
+    Builds the gunicorn settings from the environment
+
+    Args:
+        - environ: where to read the settings from
+
+    Returns:
+        - Dictionary of gunicorn setting -> value
+    """
+    workers = int(environ.get('MYHEALTH_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+    threads = int(environ.get('MYHEALTH_THREADS', 1))
+    return {
+        'bind': environ.get('MYHEALTH_BIND', '127.0.0.1:8000'),
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'preload_app': True,
+        'timeout': int(environ.get('MYHEALTH_TIMEOUT', 30)),
+        'graceful_timeout': int(environ.get('MYHEALTH_TIMEOUT', 30)),
+        'max_requests': int(environ.get('MYHEALTH_MAX_REQUESTS', 0)),
+        'max_requests_jitter': int(environ.get('MYHEALTH_MAX_REQUESTS', 0)) // 10,
+        'pidfile': environ.get('MYHEALTH_PIDFILE'),
+        'pre_fork': pre_fork,
+        'post_fork': post_fork,
+    }
+
+
+def pre_fork(server, worker):
+    """
+    Runs in the master before each worker is forked. Closes the master's pooled database connections (main database and
+    shards) so no worker starts with a copy of a connection that another process is using.
+
+    Args:
+        - server: the gunicorn arbiter
+        - worker: the worker about to be forked
+
+    Returns:
+        - None
+    """
+    db.session.remove()
+    for engine in shards.engines():
+        engine.dispose()
+
+
+def post_fork(server, worker):
+    """
+    Runs in a worker right after it is forked. Starts it with an empty connection pool, so its database connections are
+    all opened in the worker.
+
+    Args:
+        - server: the gunicorn arbiter
+        - worker: the new worker
+
+    Returns:
+        - None
+    """
+    for engine in shards.engines():
+        engine.dispose()
+
+
+def serve(environ = os.environ):
+    """
+    Runs the app under gunicorn with the settings from the environment
+
+    Args:
+        - environ: where to read the settings from
+
+    Returns:
+        - None
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise RuntimeError("The production server needs gunicorn (pip install gunicorn), which only runs on Unix")
+
+    options = settings(environ)
+    if(app.config.get('INGEST_MODE') == 'batch' and options['workers'] > 1):
+        logger.warning("INGEST_MODE is batch with %d workers: a user only waits for their own queued records when "
+                       "their next request goes to the same worker", options['workers'])
+    reminders.start_scheduler()
+    if(reminders.scheduler.thread is not None):
+        # the scheduler runs in the master, so it reads routines that workers changed from the database
+        reminders.scheduler.refresh = reminders.scheduler.refresh or int(environ.get('MYHEALTH_REMINDER_REFRESH', 300))
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                if(value is not None):
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Server().run()
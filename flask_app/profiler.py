@@ -0,0 +1,354 @@
+"""
+profiler.py
+Opt-in sampling profiler for finding what takes the time inside a page (the route, the queries, the Jinja render). With
+MYHEALTH_PROFILING=1 a request is profiled when it has an X-Profile header with PROFILING_TOKEN, or every request is
+while profiling is switched on for all (POST /_profile/toggle). While at least one request is being profiled, a thread
+looks at the stack of each thread serving one every PROFILING_INTERVAL seconds and counts it under the request's endpoint,
+so the counts add up across requests.
+
+The results are per process (each worker of the production server has its own):
+
+    GET  /_profile                  top functions by samples in the function itself and in everything it called
+    GET  /_profile/collapsed        stacks in collapsed format (for flamegraph.pl, speedscope, ...)
+    GET  /_profile/flamegraph.svg   flame graph
+    POST /_profile/export           writes all three to PROFILE_DIR
+    POST /_profile/reset            forgets the samples
+
+All of them need the token too, in the X-Profile header (not the query string, which ends up in access logs). Without a
+PROFILING_TOKEN nothing is profiled and the pages answer 404. When MYHEALTH_PROFILING is not set the only cost is checking
+the config at the start of each request.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app
+from flask import Flask, request, g
+from collections import Counter
+from html import escape
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+
+# stacks start at the app: the frames of the server (or test client) below it are the same for every request
+ROOT = Flask.wsgi_app.__code__
+
+
+def where(filename):
+    """
+    Shortens the file of a frame: relative to the app for its own files, from the package for installed ones
+
+    Args:
+        - filename: the file name of the code
+
+    Returns:
+        - The shortened name
+    """
+    root = os.path.dirname(app.root_path)
+    if(filename.startswith(root)):
+        return os.path.relpath(filename, root)
+    for marker in ('site-packages' + os.sep, 'dist-packages' + os.sep):
+        if(marker in filename):
+            return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+class Sampler:
+    """
+    Sampling profiler for the threads that are serving profiled requests. Counts each stack (a tuple of frames from the
+    outermost call to the innermost, named "function (file:line)") under the label of the request it was taken in.
+    """
+    def __init__(self, interval = 0.005, max_depth = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.active = {}
+        self.stacks = Counter()
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.profile_all = False
+
+    def begin(self, label):
+        """
+        Starts sampling the current thread, starting the sampling thread if it is not running
+
+        Args:
+            - label: what to count the samples under (the endpoint)
+
+        Returns:
+            - None
+        """
+        with self.lock:
+            self.active[threading.get_ident()] = label
+            if(self.thread is None):
+                self.thread = threading.Thread(target = self._run, name = 'profiler', daemon = True)
+                self.thread.start()
+
+    def end(self):
+        """
+        Stops sampling the current thread
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        with self.lock:
+            label = self.active.pop(threading.get_ident(), None)
+            if(label is not None):
+                self.requests[label] += 1
+
+    def _stack(self, frame):
+        """
+        Helper method that names the frames of a stack
+
+        Args:
+            - frame: the innermost frame
+
+        Returns:
+            - Tuple of frame names, outermost first
+        """
+        names = []
+        while(frame is not None and len(names) < self.max_depth):
+            code = frame.f_code
+            names.append('%s (%s:%d)' % (code.co_name, where(code.co_filename), code.co_firstlineno))
+            if(code is ROOT):
+                break
+            frame = frame.f_back
+        return tuple(reversed(names))
+
+    def _run(self):
+        """
+        Helper method that takes samples until no thread is being profiled (runs on the sampling thread)
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        while(True):
+            with self.lock:
+                if(not self.active):
+                    self.thread = None
+                    return
+                targets = dict(self.active)
+            frames = sys._current_frames()
+            samples = [(label, self._stack(frames[ident])) for ident, label in targets.items() if ident in frames]
+            del frames
+            with self.lock:
+                for key in samples:
+                    self.stacks[key] += 1
+            time.sleep(self.interval)
+
+    def collapsed(self):
+        """
+        The samples in collapsed stack format: one line per stack, "label;outer;...;inner count"
+
+        Args:
+            - None
+
+        Returns:
+            - The text
+        """
+        with self.lock:
+            items = sorted(self.stacks.items())
+        return ''.join('%s;%s %d\n' % (label, ';'.join(stack), count) for (label, stack), count in items)
+
+    def top(self, n = 25, by = 'total'):
+        """
+        The functions with the most samples, in themselves (self) and including what they called (total)
+
+        Args:
+            - n: how many functions
+            - by: 'self' or 'total', which count to sort by
+
+        Returns:
+            - (total number of samples, list of (function, self samples, total samples))
+        """
+        own = Counter()
+        total = Counter()
+        with self.lock:
+            items = list(self.stacks.items())
+        for (label, stack), count in items:
+            if(stack):
+                own[stack[-1]] += count
+            for name in set(stack):
+                total[name] += count
+        samples = sum(count for key, count in items)
+        order = own if by == 'self' else total
+        return samples, [(name, own[name], total[name]) for name, count in order.most_common(n)]
+
+    def summary(self, n = 25):
+        """
+        Text report: samples and requests per endpoint, then the top functions by self and by total samples
+
+        Args:
+            - n: how many functions
+
+        Returns:
+            - The text
+        """
+        with self.lock:
+            per_label = Counter()
+            for (label, stack), count in self.stacks.items():
+                per_label[label] += count
+            requests = dict(self.requests)
+        samples = sum(per_label.values())
+        lines = ["%d samples every %.1f ms" % (samples, self.interval * 1000), ""]
+        lines += ["%-40s %8d samples %6d requests" % (label, count, requests.get(label, 0)) for label, count in per_label.most_common()]
+        for by in ('self', 'total'):
+            lines += ["", "By %s:" % by, "%7s %7s  %s" % ('self %', 'total %', 'function')]
+            for name, own, count in self.top(n, by)[1]:
+                lines.append("%7.1f %7.1f  %s" % (100.0 * own / samples, 100.0 * count / samples, name))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """
+        Forgets every sample
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        with self.lock:
+            self.stacks.clear()
+            self.requests.clear()
+
+
+def flamegraph(collapsed, width = 1200, row = 16, title = "MyHealth profile"):
+    """
+    Draws a flame graph of collapsed stacks as an SVG: each box is a frame, as wide as its share of the samples, on top
+    of the frame that called it. Hovering a box shows its name and samples.
+
+    Args:
+        - collapsed: the collapsed stack text
+        - width: width of the picture in pixels
+        - row: height of a box in pixels
+        - title: heading of the picture
+
+    Returns:
+        - The SVG text
+    """
+    root = {'count': 0, 'children': {}}
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if(not stack):
+            continue
+        node = root
+        node['count'] += int(count)
+        for name in stack.split(';'):
+            node = node['children'].setdefault(name, {'count': 0, 'children': {}})
+            node['count'] += int(count)
+
+    def depth(node):
+        return 1 + max([depth(child) for child in node['children'].values()] or [0])
+
+    height = depth(root) * row + 40
+    scale = (width - 20) / max(root['count'], 1)
+    boxes = []
+
+    def draw(name, node, x, level):
+        w = node['count'] * scale
+        if(w < 0.5):
+            return
+        y = height - 10 - (level + 1) * row
+        hue = int(hashlib.md5(name.encode('utf-8')).hexdigest()[:4], 16)
+        color = 'rgb(%d,%d,%d)' % (205 + hue % 50, 80 + hue % 130, 40 + hue % 50)
+        label = name if w > 7 * len(name) else name[:max(0, int(w / 7) - 2)] + '..' if w > 28 else ''
+        boxes.append('<g><title>%s (%d samples, %.1f%%)</title><rect x="%.1f" y="%d" width="%.1f" height="%d" fill="%s" rx="2"/>'
+                     '<text x="%.1f" y="%d">%s</text></g>' % (escape(name), node['count'], 100.0 * node['count'] / max(root['count'], 1),
+                                                              x, y, w, row - 1, color, x + 3, y + row - 4, escape(label)))
+        for child_name, child in sorted(node['children'].items()):
+            draw(child_name, child, x, level + 1)
+            x += child['count'] * scale
+
+    x = 10.0
+    for name, child in sorted(root['children'].items()):
+        draw(name, child, x, 0)
+        x += child['count'] * scale
+    return ('<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" font-family="monospace" font-size="11">'
+            '<text x="%d" y="20" text-anchor="middle" font-size="15">%s (%d samples)</text>%s</svg>'
+            % (width, height, width // 2, escape(title), root['count'], ''.join(boxes)))
+
+
+sampler = Sampler(app.config.get('PROFILING_INTERVAL', 0.005))
+
+
+def authorized():
+    """
+    Checks whether the request may use the profiler: profiling is on, PROFILING_TOKEN is set and the request's X-Profile
+    header is the token
+
+    Args:
+        - None
+
+    Returns:
+        - True or False
+    """
+    if(not app.config.get('PROFILING_ENABLED')):
+        return False
+    token = app.config.get('PROFILING_TOKEN')
+    given = request.headers.get('X-Profile')
+    if(not token or given is None):
+        return False
+    return hmac.compare_digest(given.encode('utf-8'), token.encode('utf-8'))
+
+
+def export(directory = None):
+    """
+    Writes the collapsed stacks, the flame graph and the summary of this process to files
+
+    Args:
+        - directory: where to write them (defaults to PROFILE_DIR)
+
+    Returns:
+        - List of the paths written
+    """
+    directory = directory or app.config.get('PROFILE_DIR') or os.path.join(app.root_path, 'profiles')
+    os.makedirs(directory, exist_ok = True)
+    base = os.path.join(directory, 'profile-%d' % os.getpid())
+    collapsed = sampler.collapsed()
+    paths = []
+    for ext, content in (('.collapsed', collapsed), ('.svg', flamegraph(collapsed)), ('.txt', sampler.summary())):
+        with open(base + ext, 'w', encoding = 'utf-8') as f:
+            f.write(content)
+        paths.append(base + ext)
+    return paths
+
+
+@app.before_request
+def start_profiling():
+    """
+    Starts sampling the request if it asked to be profiled or profiling is switched on for all requests
+
+    Args:
+        - None
+
+    Returns:
+        - None
+    """
+    if(not app.config.get('PROFILING_ENABLED') or request.path.startswith('/_profile')):
+        return
+    if(sampler.profile_all or ('X-Profile' in request.headers and authorized())):
+        g.profiling = True
+        sampler.begin(request.endpoint or request.path)
+
+
+@app.teardown_request
+def stop_profiling(error = None):
+    """
+    Stops sampling the request
+
+    Args:
+        - error: unused
+
+    Returns:
+        - None
+    """
+    if(g.get('profiling')):
+        sampler.end()
@@ -0,0 +1,300 @@
+"""
+ratelimit.py
+Rate limiting for the MyHealth Web App. Every limited request takes a token from two token buckets, one for the IP
+address it came from and one for the account it is about (the email typed into the login form, or the logged in user).
+A bucket holds up to `requests` tokens and refills at requests/seconds tokens per second, so short bursts are allowed
+but a steady stream is held to the rate. When either bucket is empty the request gets a 429 with a Retry-After header,
+and no token is used from the other one.
+
+The IP address is request.remote_addr. Behind a reverse proxy (nginx, a load balancer) that is the proxy's address, so
+set MYHEALTH_PROXY_HOPS to the number of proxies in front of the app and the address is read from X-Forwarded-For
+instead (see PROXY_HOPS in __init__.py). Only do that when every request comes through those proxies, since clients can
+send any X-Forwarded-For they like.
+
+Buckets are kept in memory by default, which is per process. Set RATELIMIT_REDIS_URL to keep them in Redis (or anything
+that speaks its protocol) so all workers of the production server share them.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app
+from flask import request, abort
+from flask_login import current_user
+from functools import wraps
+import logging
+import math
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStore:
+    """
+    Token buckets in a dictionary of key -> [tokens, last time]. Buckets that have filled back up are the same as no bucket,
+    so they are dropped every sweep_every calls to keep memory bounded by the number of recently active keys.
+    """
+    def __init__(self, sweep_every = 10000):
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.sweep_every = sweep_every
+        self.calls = 0
+
+    def take(self, key, requests, seconds, now = None):
+        """
+        Takes a token from a bucket
+
+        Args:
+            - key: the bucket
+            - requests: size of the bucket
+            - seconds: time for an empty bucket to fill back up
+            - now: the current time in seconds (defaults to time.monotonic())
+
+        Returns:
+            - 0 if a token was taken, otherwise how many seconds until one is available
+        """
+        now = time.monotonic() if now is None else now
+        rate = requests / seconds
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if(bucket is None):
+                bucket = self.buckets[key] = [requests, now]
+            else:
+                bucket[0] = min(requests, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            self.calls += 1
+            if(self.calls >= self.sweep_every):
+                self._sweep(now)
+            if(bucket[0] >= 1):
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+    def give_back(self, key, requests):
+        """
+        Puts back a token taken from a bucket
+
+        Args:
+            - key: the bucket
+            - requests: size of the bucket
+
+        Returns:
+            - None
+        """
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if(bucket is not None):
+                bucket[0] = min(requests, bucket[0] + 1)
+
+    def _sweep(self, now):
+        """
+        Helper method that drops buckets that have not been used for longer than the longest refill time seen
+
+        Args:
+            - now: the current time in seconds
+
+        Returns:
+            - None
+        """
+        self.calls = 0
+        longest = max(seconds for requests, seconds in app.config['RATE_LIMITS'].values())
+        self.buckets = {k: b for k, b in self.buckets.items() if now - b[1] < longest}
+
+    def clear(self):
+        """
+        Empties the store
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        with self.lock:
+            self.buckets.clear()
+
+
+class RedisStore:
+    """
+    Token buckets in Redis hashes, updated by a Lua script so taking a token is one atomic round trip. Keys expire once
+    their bucket would be full again. If Redis cannot be reached, requests are let through.
+    """
+    SCRIPT = """
+    local requests = tonumber(ARGV[1])
+    local rate = requests / tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+    local tokens = tonumber(bucket[1]) or requests
+    local at = tonumber(bucket[2]) or now
+    tokens = math.min(requests, tokens + math.max(0, now - at) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])) + 1)
+    return tostring(wait)
+    """
+    GIVE_BACK = """
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+    if tokens then
+        redis.call('HSET', KEYS[1], 'tokens', tostring(math.min(tonumber(ARGV[1]), tokens + 1)))
+    end
+    return 0
+    """
+
+    def __init__(self, url, prefix = 'myhealth:rl:'):
+        if(redis is None):
+            raise RuntimeError("RATELIMIT_REDIS_URL is set but the redis package is not installed (pip install redis)")
+        self.client = redis.Redis.from_url(url, socket_timeout = 0.1)
+        self.script = self.client.register_script(self.SCRIPT)
+        self.give_back_script = self.client.register_script(self.GIVE_BACK)
+        self.prefix = prefix
+
+    def take(self, key, requests, seconds, now = None):
+        """
+        Takes a token from a bucket
+
+        Args:
+            - key: the bucket
+            - requests: size of the bucket
+            - seconds: time for an empty bucket to fill back up
+            - now: the current time in seconds (defaults to time.time(), which all workers agree on)
+
+        Returns:
+            - 0 if a token was taken, otherwise how many seconds until one is available
+        """
+        now = time.time() if now is None else now
+        try:
+            return float(self.script(keys = [self.prefix + key], args = [requests, seconds, now]))
+        except redis.RedisError:
+            logger.exception("Rate limit store is unreachable, letting the request through")
+            return 0
+
+    def give_back(self, key, requests):
+        """
+        Puts back a token taken from a bucket
+
+        Args:
+            - key: the bucket
+            - requests: size of the bucket
+
+        Returns:
+            - None
+        """
+        try:
+            self.give_back_script(keys = [self.prefix + key], args = [requests])
+        except redis.RedisError:
+            logger.exception("Rate limit store is unreachable, could not give back a token")
+
+    def clear(self):
+        """
+        Deletes every bucket
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def make_store(config):
+    """
+    Makes the bucket store the config asks for
+
+    Args:
+        - config: the app config
+
+    Returns:
+        - The store
+    """
+    if(config.get('RATELIMIT_REDIS_URL')):
+        return RedisStore(config['RATELIMIT_REDIS_URL'])
+    return MemoryStore()
+
+
+store = make_store(app.config)
+
+
+def check(group, account):
+    """
+    Takes a token from the IP bucket and the account bucket of a group of endpoints. Tokens are only used when both
+    buckets let the request through: the account bucket is not touched when the IP one is empty, and the IP token is put
+    back when the account bucket is empty, so a blocked request doesn't use up the other limit.
+
+    Args:
+        - group: 'auth' or 'write' (the limits are RATE_LIMITS[group + '_ip'] and RATE_LIMITS[group + '_account'])
+        - account: who the request is about (None to only limit by IP)
+
+    Returns:
+        - 0 if the request can go ahead, otherwise how many seconds to wait
+    """
+    limits = app.config['RATE_LIMITS']
+    ip_key = '%s:ip:%s' % (group, request.remote_addr)
+    wait = store.take(ip_key, *limits[group + '_ip'])
+    if(wait > 0 or account is None):
+        return wait
+    wait = store.take('%s:account:%s' % (group, account), *limits[group + '_account'])
+    if(wait > 0):
+        store.give_back(ip_key, limits[group + '_ip'][0])
+    return wait
+
+
+def form_email():
+    """
+    Account of a login or register request: the email typed into the form
+
+    Args:
+        - None
+
+    Returns:
+        - The lowercased email, or None if there is none
+    """
+    email = request.form.get('email', '').strip().lower()
+    return email or None
+
+
+def logged_in_user():
+    """
+    Account of a write request: the logged in user
+
+    Args:
+        - None
+
+    Returns:
+        - The user id, or None if nobody is logged in
+    """
+    return current_user.id if current_user.is_authenticated else None
+
+
+def limit(group, account = logged_in_user, methods = ('POST',)):
+    """
+    Decorator that rate limits a view. Requests over the limit get a 429 with a Retry-After header.
+
+    Args:
+        - group: 'auth' or 'write'
+        - account: function giving the account the request is about
+        - methods: the methods that are limited (None for all of them)
+
+    Returns:
+        - The decorated view
+    """
+    def decorator(view):
+        @wraps(view)
+        def limited(*args, **kwargs):
+            if(app.config.get('RATELIMIT_ENABLED') and (methods is None or request.method in methods)):
+                wait = check(group, account())
+                if(wait > 0):
+                    abort(429, retry_after = math.ceil(wait))
+            return view(*args, **kwargs)
+        return limited
+    return decorator
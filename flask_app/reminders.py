@@ -0,0 +1,356 @@
+"""
+reminders.py
+Background reminders for routines. Every workout of every routine is kept in a priority queue ordered by the next time it
+is due, so each tick only looks at the reminders that are actually due instead of going through every user. Due reminders
+are sent in batches through a notifier (log, local SMTP server, or webhook).
+
+With MYHEALTH_REMINDERS=1 the scheduler is started by the server entry points (run.py, production.serve and asgi.serve)
+through start_scheduler, not when the app is imported: the debug reloader imports the app in two processes, and flask
+commands import it without serving, and each of those would otherwise send every reminder too.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app, db, shards
+from flask_app.models import User, Routine
+from flask_app.goals import first_due
+from datetime import datetime, time, timedelta
+from email.message import EmailMessage
+import heapq
+import json
+import logging
+import smtplib
+import threading
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+
+class LogNotifier:
+    """
+    Notifier that writes reminders to the log. Used by default and for development.
+    """
+    def send(self, batch):
+        """
+        Sends a batch of reminders
+
+        Args:
+            - batch: list of (user, workout, due date) tuples
+
+        Returns:
+            - None
+        """
+        for user, workout, day in batch:
+            logger.info("Reminder for %s: %s is due on %s", user.username, workout, day)
+
+
+class SMTPNotifier:
+    """
+    Notifier that emails reminders through an SMTP server (a local debugging server by default). One connection is used
+    for a whole batch.
+    """
+    def __init__(self, host = 'localhost', port = 1025, sender = 'reminders@myhealth.local'):
+        self.host = host
+        self.port = port
+        self.sender = sender
+
+    def send(self, batch):
+        """
+        Sends a batch of reminders
+
+        Args:
+            - batch: list of (user, workout, due date) tuples
+
+        Returns:
+            - None
+        """
+        with smtplib.SMTP(self.host, self.port) as server:
+            for user, workout, day in batch:
+                msg = EmailMessage()
+                msg['Subject'] = f"MyHealth: {workout} is due today"
+                msg['From'] = self.sender
+                msg['To'] = user.email
+                msg.set_content(f"Hello {user.first_name}, your routine has {workout} on {day.strftime('%m/%d/%Y')}.")
+                server.send_message(msg)
+
+
+class WebhookNotifier:
+    """
+    Notifier that posts each batch of reminders as one JSON request to a URL
+    """
+    def __init__(self, url, timeout = 5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, batch):
+        """
+        Sends a batch of reminders
+
+        Args:
+            - batch: list of (user, workout, due date) tuples
+
+        Returns:
+            - None
+        """
+        body = json.dumps([{'user_id': user.id, 'email': user.email, 'workout': workout, 'date': day.isoformat()}
+                           for user, workout, day in batch]).encode('utf-8')
+        req = urllib.request.Request(self.url, data = body, headers = {'Content-Type': 'application/json'})
+        urllib.request.urlopen(req, timeout = self.timeout).close()
+
+
+def make_notifier(config):
+    """
+    Builds the notifier chosen in the app config (REMINDER_NOTIFIER is 'log', 'smtp', or 'webhook')
+
+    Args:
+        - config: the app config
+
+    Returns:
+        - The notifier
+    """
+    kind = config.get('REMINDER_NOTIFIER', 'log')
+    if(kind == 'smtp'):
+        return SMTPNotifier(config.get('REMINDER_SMTP_HOST', 'localhost'), config.get('REMINDER_SMTP_PORT', 1025))
+    if(kind == 'webhook'):
+        return WebhookNotifier(config['REMINDER_WEBHOOK_URL'])
+    return LogNotifier()
+
+
+class ReminderScheduler:
+    """
+    Keeps the next due time of every routine workout in a heap. When a routine changes the old entries are not searched
+    for; they are left in the heap and skipped when they come up because they belong to an older version of the routine.
+    If refresh is set, every routine is loaded again from the database that often, for when routines are changed by
+    other processes.
+    """
+    def __init__(self, notifier, hour = 8, batch_size = 500, refresh = None):
+        self.notifier = notifier
+        self.hour = hour
+        self.batch_size = batch_size
+        self.refresh = refresh
+        self.heap = []
+        self.versions = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _remind_at(self, day):
+        """
+        Helper method that gives the time a reminder for a due date is sent
+
+        Args:
+            - day: the due date
+
+        Returns:
+            - The datetime of the reminder
+        """
+        return datetime.combine(day, time(self.hour))
+
+    def update(self, user_id, routine, now = None):
+        """
+        Schedules the workouts of a user's routine, replacing what was scheduled for that user before
+
+        Args:
+            - user_id: id of the user
+            - routine: the routine dictionary of the user ({workout: [every, started]})
+            - now: the current time (defaults to now)
+
+        Returns:
+            - None
+        """
+        now = now or datetime.now()
+        today = now.date() if now < self._remind_at(now.date()) else now.date() + timedelta(days = 1)
+        with self.lock:
+            version = self.versions.get(user_id, 0) + 1
+            self.versions[user_id] = version
+            for workout in (routine or {}):
+                every, started = routine[workout][0], routine[workout][1]
+                day = first_due(every, started, today)
+                if(day is None):
+                    continue
+                heapq.heappush(self.heap, (self._remind_at(day), user_id, workout, every, version))
+
+    def load(self, now = None):
+        """
+        Schedules every routine in the database, replacing everything that was scheduled. Reminders that were already
+        sent today are not scheduled again.
+
+        Args:
+            - now: the current time (defaults to now)
+
+        Returns:
+            - None
+        """
+        with self.lock:
+            self.heap = []
+            self.versions = {}
+        for r in shards.all_rows(Routine.query.all):
+            self.update(r.user_id, r.routine, now)
+
+    def pop_due(self, now = None):
+        """
+        Takes every reminder that is due out of the heap and schedules the next time each one is due
+
+        Args:
+            - now: the current time (defaults to now)
+
+        Returns:
+            - List of (user id, workout, due date) tuples
+        """
+        now = now or datetime.now()
+        due = []
+        with self.lock:
+            while(self.heap and self.heap[0][0] <= now):
+                at, user_id, workout, every, version = heapq.heappop(self.heap)
+                if(self.versions.get(user_id) != version):
+                    continue
+                due.append((user_id, workout, at.date()))
+                heapq.heappush(self.heap, (at + timedelta(days = every), user_id, workout, every, version))
+        return due
+
+    def dispatch(self, due):
+        """
+        Sends due reminders through the notifier in batches. The users of a batch are loaded with one query.
+
+        Args:
+            - due: list of (user id, workout, due date) tuples
+
+        Returns:
+            - The number of reminders sent
+        """
+        sent = 0
+        for i in range(0, len(due), self.batch_size):
+            chunk = due[i:i + self.batch_size]
+            users = {u.id: u for u in User.query.filter(User.id.in_(set(c[0] for c in chunk))).all()}
+            batch = [(users[user_id], workout, day) for user_id, workout, day in chunk if user_id in users]
+            try:
+                self.notifier.send(batch)
+                sent += len(batch)
+            except Exception:
+                logger.exception("Could not send %d reminders", len(batch))
+        return sent
+
+    def tick(self, now = None):
+        """
+        Sends every reminder that is due
+
+        Args:
+            - now: the current time (defaults to now)
+
+        Returns:
+            - The number of reminders sent
+        """
+        due = self.pop_due(now)
+        if(not due):
+            return 0
+        return self.dispatch(due)
+
+    def wait_time(self, now = None, longest = 60):
+        """
+        Helper method that gives how long the thread can sleep until the next reminder is due
+
+        Args:
+            - now: the current time (defaults to now)
+            - longest: the longest time to sleep in seconds
+
+        Returns:
+            - Number of seconds to sleep
+        """
+        now = now or datetime.now()
+        with self.lock:
+            if(not self.heap):
+                return longest
+            return max(0, min(longest, (self.heap[0][0] - now).total_seconds()))
+
+    def run(self):
+        """
+        Loop of the background thread. Sleeps until the next reminder is due (or something changes) and sends it.
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        with app.app_context():
+            loaded = None
+            while(not self.stop_event.is_set()):
+                try:
+                    if(loaded is None):
+                        self.load()
+                        loaded = datetime.now()
+                    self.tick()
+                    # after tick, so reminders that just came due are sent before load skips them as already past
+                    if(self.refresh and (datetime.now() - loaded).total_seconds() >= self.refresh):
+                        self.load()
+                        loaded = datetime.now()
+                except Exception:
+                    # keep the thread alive: a failed load is tried again on the next pass
+                    logger.exception("Reminder loop failed")
+                finally:
+                    db.session.remove()
+                self.stop_event.wait(self.wait_time())
+
+    def start(self):
+        """
+        Starts the background thread
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        if(self.thread is None):
+            self.stop_event.clear()
+            self.thread = threading.Thread(target = self.run, name = "reminders", daemon = True)
+            self.thread.start()
+
+    def stop(self):
+        """
+        Stops the background thread
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        self.stop_event.set()
+        if(self.thread is not None):
+            self.thread.join()
+            self.thread = None
+
+
+scheduler = ReminderScheduler(make_notifier(app.config), app.config.get('REMINDER_HOUR', 8), app.config.get('REMINDER_BATCH_SIZE', 500),
+                              app.config.get('REMINDER_REFRESH'))
+
+
+def start_scheduler():
+    """
+    Starts the scheduler in this process when reminders are on and it is not running already
+
+    Args:
+        - None
+
+    Returns:
+        - None
+    """
+    if(app.config.get('REMINDERS_ENABLED')):
+        scheduler.start()
+
+
+def routine_changed(user_id, routine):
+    """
+    Tells the scheduler that a user's routine was added to, edited, or deleted from. Does nothing when reminders are off
+    or the scheduler runs in another process (under the production server it runs in the master process, which picks up
+    changes when it reloads the routines).
+
+    Args:
+        - user_id: id of the user
+        - routine: the new routine dictionary
+
+    Returns:
+        - None
+    """
+    if(app.config.get('REMINDERS_ENABLED') and scheduler.thread is not None and scheduler.thread.is_alive()):
+        scheduler.update(user_id, routine)
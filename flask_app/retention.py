@@ -0,0 +1,388 @@
+"""
+retention.py
+Retention for old data of the MyHealth Web App, so the database doesn't grow forever. RETENTION_POLICIES gives, for each
+kind of data, how many days of raw rows to keep (None keeps everything). Rows older than that are
+
+    - rolled up into one DailySummary per day (water, sleep and heart rate only), so totals and averages still count them
+    - written to the user's archive: one compressed NDJSON file per user and kind in ARCHIVE_DIR (zstd if the zstandard
+      package is installed, gzip otherwise), which the all runs and all exercises pages page through on request
+    - deleted from the database
+
+Each run appends a new compressed frame to the archive files. The archive is written and synced before the rows are
+deleted, so a run that stops part way can only leave a duplicate in the archive (which reading skips), never lose rows.
+Runs with a GPS track are kept in the database. Afterwards `compact` gives the freed pages back to the file system with
+incremental VACUUM.
+
+    flask retention run [--dry-run]    apply the policies
+    flask retention compact            give free pages back (the first time, converts the database with a full VACUUM)
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app, db, shards
+from flask_app.models import User, Runs, Workout, Water, Sleep, HeartRate, DailySummary
+from types import SimpleNamespace
+from datetime import date, datetime, time, timedelta
+import click
+import gzip
+import io
+import json
+import logging
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MODELS = {'water': Water, 'sleep': Sleep, 'heart_rate': HeartRate, 'runs': Runs, 'workout': Workout}
+# value of a row that goes into its day's summary (kinds without one are only archived)
+VALUES = {
+    'water': lambda row: row.num_cups,
+    'sleep': lambda row: (row.end_time - row.start_time).total_seconds() / 3600,
+    'heart_rate': lambda row: row.heartrate,
+}
+CHUNK = 500
+
+
+def _date_column(model):
+    """
+    Helper method that gives the column a kind of data is dated by (sleep goes by when it ended)
+
+    Args:
+        - model: the model
+
+    Returns:
+        - The column
+    """
+    return Sleep.end_time if model is Sleep else model.date
+
+
+def _day(row):
+    """
+    Helper method that gives the day a row belongs to
+
+    Args:
+        - row: the row
+
+    Returns:
+        - The date
+    """
+    return row.end_time.date() if isinstance(row, Sleep) else row.date
+
+
+def archive_dir():
+    """
+    Folder the archives go in: ARCHIVE_DIR, or an archive folder next to the database
+
+    Args:
+        - None
+
+    Returns:
+        - The path
+    """
+    return app.config.get('ARCHIVE_DIR') or os.path.join(os.path.dirname(db.engine.url.database), 'archive')
+
+
+def _paths(user_id, kind):
+    """
+    Helper method that gives the archive files of a user and kind (a zstd one and a gzip one, if they exist)
+
+    Args:
+        - user_id: id of the user
+        - kind: the kind of data
+
+    Returns:
+        - List of paths
+    """
+    base = os.path.join(archive_dir(), str(user_id), kind + '.ndjson')
+    return [base + ext for ext in ('.zst', '.gz') if os.path.exists(base + ext)]
+
+
+def has_archive(user_id, kind):
+    """
+    Checks whether a user has archived rows of a kind
+
+    Args:
+        - user_id: id of the user
+        - kind: the kind of data
+
+    Returns:
+        - True or False
+    """
+    return bool(_paths(user_id, kind))
+
+
+def encode(row):
+    """
+    Turns a row into a dictionary that can be written as JSON
+
+    Args:
+        - row: the row
+
+    Returns:
+        - Dictionary of column -> value, with dates and times as ISO strings
+    """
+    record = {}
+    for column in row.__table__.columns:
+        value = getattr(row, column.key)
+        record[column.name] = value.isoformat() if isinstance(value, (date, time)) else value
+    return record
+
+
+def decode(model, record):
+    """
+    Turns an archived dictionary back into an object with the same attributes as a row (it is not a row: it isn't in the
+    database)
+
+    Args:
+        - model: the model the record came from
+        - record: the dictionary
+
+    Returns:
+        - SimpleNamespace with the columns as attributes
+    """
+    values = dict(record)
+    for column in model.__table__.columns:
+        kind = column.type.python_type
+        if(kind in (date, time, datetime) and values.get(column.name) is not None):
+            values[column.name] = kind.fromisoformat(values[column.name])
+    return SimpleNamespace(**values)
+
+
+def append(user_id, kind, records):
+    """
+    Appends records to a user's archive as one compressed frame, and syncs it to disk
+
+    Args:
+        - user_id: id of the user
+        - kind: the kind of data
+        - records: list of dictionaries
+
+    Returns:
+        - Path of the archive file
+    """
+    folder = os.path.join(archive_dir(), str(user_id))
+    os.makedirs(folder, exist_ok = True)
+    data = ''.join(json.dumps(r, sort_keys = True) + '\n' for r in records).encode('utf-8')
+    if(zstandard is not None):
+        path, data = os.path.join(folder, kind + '.ndjson.zst'), zstandard.ZstdCompressor(level = 10).compress(data)
+    else:
+        path, data = os.path.join(folder, kind + '.ndjson.gz'), gzip.compress(data)
+    with open(path, 'ab') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+
+def _lines(path):
+    """
+    Helper method that reads the lines of an archive file (every frame)
+
+    Args:
+        - path: the archive file
+
+    Returns:
+        - Generator of lines
+    """
+    if(path.endswith('.gz')):
+        with gzip.open(path, 'rt', encoding = 'utf-8') as f:
+            yield from f
+        return
+    if(zstandard is None):
+        raise RuntimeError("%s is compressed with zstd, install the zstandard package to read it" % path)
+    with open(path, 'rb') as raw:
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames = True)
+        yield from io.TextIOWrapper(reader, encoding = 'utf-8')
+
+
+def read(user_id, kind):
+    """
+    Reads every archived record of a user and kind, oldest first, skipping duplicates left by a run that stopped part way
+
+    Args:
+        - user_id: id of the user
+        - kind: the kind of data
+
+    Returns:
+        - List of dictionaries
+    """
+    seen = set()
+    records = []
+    for path in _paths(user_id, kind):
+        for line in _lines(path):
+            if(line.strip() and line not in seen):
+                seen.add(line)
+                records.append(json.loads(line))
+    return records
+
+
+def archived_page(user_id, kind, page, per_page = None):
+    """
+    One page of a user's archived rows of a kind, newest first
+
+    Args:
+        - user_id: id of the user
+        - kind: the kind of data
+        - page: the page number, starting at 1
+        - per_page: rows per page (defaults to ARCHIVE_PAGE_SIZE)
+
+    Returns:
+        - (list of row-like objects, whether there is an older page)
+    """
+    per_page = per_page or app.config.get('ARCHIVE_PAGE_SIZE', 100)
+    model = MODELS[kind]
+    column = _date_column(model).key
+    records = sorted(read(user_id, kind), key = lambda r: (r[column], r['id']), reverse = True)
+    start = (page - 1) * per_page
+    return [decode(model, r) for r in records[start:start + per_page]], len(records) > start + per_page
+
+
+def roll_up(user_id, kind, rows):
+    """
+    Adds rows to the DailySummary of their days (in the session, not committed)
+
+    Args:
+        - user_id: id of the user
+        - kind: 'water', 'sleep' or 'heart_rate'
+        - rows: the rows
+
+    Returns:
+        - None
+    """
+    value = VALUES[kind]
+    days = {}
+    for row in rows:
+        days.setdefault(_day(row), []).append(value(row))
+    existing = {}
+    day_list = list(days)
+    for i in range(0, len(day_list), CHUNK):
+        for summary in DailySummary.query.filter(DailySummary.user_id == user_id, DailySummary.kind == kind,
+                                                 DailySummary.day.in_(day_list[i:i + CHUNK])):
+            existing[summary.day] = summary
+    for day, values in days.items():
+        summary = existing.get(day)
+        if(summary is None):
+            db.session.add(DailySummary(user_id = user_id, kind = kind, day = day, count = len(values), total = sum(values),
+                                        low = min(values), high = max(values)))
+        else:
+            summary.count += len(values)
+            summary.total += sum(values)
+            summary.low = min(summary.low, min(values))
+            summary.high = max(summary.high, max(values))
+
+
+def retain(user_id, kind, days, today = None, dry_run = False):
+    """
+    Applies a policy to one user's rows of one kind: rolls up, archives and deletes the rows older than days days
+
+    Args:
+        - user_id: id of the user
+        - kind: the kind of data
+        - days: how many days of raw rows to keep
+        - today: the current date (defaults to today)
+        - dry_run: only count the rows
+
+    Returns:
+        - Number of rows (that would be) archived
+    """
+    model = MODELS[kind]
+    column = _date_column(model)
+    cutoff = (today or date.today()) - timedelta(days = days)
+    if(model is Sleep):
+        cutoff = datetime.combine(cutoff, datetime.min.time())
+    with shards.use_user(user_id):
+        query = model.query.filter(model.user_id == user_id, column < cutoff)
+        if(model is Runs):
+            query = query.filter(~Runs.track.has())
+        rows = query.order_by(column, model.id).all()
+        if(not rows or dry_run):
+            db.session.remove()
+            return len(rows)
+        append(user_id, kind, [encode(row) for row in rows])
+        if(kind in VALUES):
+            roll_up(user_id, kind, rows)
+        ids = [row.id for row in rows]
+        for i in range(0, len(ids), CHUNK):
+            model.query.filter(model.id.in_(ids[i:i + CHUNK])).delete(synchronize_session = False)
+        db.session.commit()
+        db.session.remove()
+    return len(rows)
+
+
+def run(today = None, dry_run = False):
+    """
+    Applies every policy in RETENTION_POLICIES to every user
+
+    Args:
+        - today: the current date (defaults to today)
+        - dry_run: only count the rows
+
+    Returns:
+        - Dictionary of kind -> number of rows (that would be) archived
+    """
+    policies = {kind: days for kind, days in app.config['RETENTION_POLICIES'].items() if days is not None}
+    archived = dict.fromkeys(policies, 0)
+    for (user_id,) in db.session.query(User.id).all():
+        for kind, days in policies.items():
+            archived[kind] += retain(user_id, kind, days, today, dry_run)
+    return archived
+
+
+def compact(engine, pages = None):
+    """
+    Gives free pages of a database back to the file system with incremental VACUUM. A database that wasn't created with
+    auto_vacuum=INCREMENTAL is converted first, which takes one full VACUUM (the database is locked while it runs).
+
+    Args:
+        - engine: the database engine
+        - pages: most pages to free (None for all of them)
+
+    Returns:
+        - Number of pages freed
+    """
+    raw = engine.raw_connection()
+    try:
+        conn = raw.connection
+        if(conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2):
+            logger.info("Converting %s to incremental auto vacuum", engine.url.database)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # each step of the pragma frees one page, and executescript steps it to the end (execute stops after one)
+        conn.executescript("PRAGMA incremental_vacuum(%d);" % (free if pages is None else min(pages, free)))
+        conn.commit()
+        if(conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'):
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        raw.close()
+
+
+@app.cli.group('retention')
+def retention_command():
+    """
+    Retention of old data: flask retention ...
+    """
+
+
+@retention_command.command('run')
+@click.option('--dry-run', is_flag = True, help = "only count what would be archived")
+def run_command(dry_run):
+    """
+    Rolls up, archives and deletes rows older than RETENTION_POLICIES allows
+    """
+    for kind, count in run(dry_run = dry_run).items():
+        click.echo("%s: %d rows %s" % (kind, count, 'to archive' if dry_run else 'archived'))
+
+
+@retention_command.command('compact')
+@click.option('--pages', type = int, help = "most pages to free in each database")
+def compact_command(pages):
+    """
+    Gives the space of deleted rows back to the file system
+    """
+    for engine in shards.engines():
+        click.echo("%s: %d pages freed" % (engine.url.database, compact(engine, pages)))
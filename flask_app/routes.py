@@ -4,11 +4,14 @@ contains all the methods for every page/URL for the MyHealth WebApp.
 Is dependent on forms.py and models.py
 Last Modified: 01/14/2021
 """
-from flask import Flask, redirect, url_for, render_template, request, session, flash
+from flask import Flask, redirect, url_for, render_template, request, session, flash, jsonify, abort, Response
 from flask_app import app, db, bcrypt
-from flask_app.models import User, Post, Routine, Workout, Runs, Water, Sleep, HeartRate
-from flask_app.forms import RegistrationForm, LoginForm, UpdateAccountForm, RoutineForm, ExerciseForm, RunForm, WaterForm, SleepForm, HeartRate_form
+from flask_app.models import User, Post, Routine, Workout, Runs, Water, Sleep, HeartRate, Goal, RunTrack
+from flask_app.forms import TAKEN_MESSAGES, RegistrationForm, LoginForm, UpdateAccountForm, RoutineForm, ExerciseForm, RunForm, WaterForm, SleepForm, HeartRate_form, GoalForm, ImportRunForm
+from flask_app import goals, reminders, ingest, heart_series, tracks, summaries, ratelimit, accounts, shards, retention, search, profiler, stats
+from flask_app.stats import seconds_to_time
 from flask_login import login_user, current_user, logout_user, login_required
+from sqlalchemy.exc import IntegrityError
 import secrets
 import os
 from PIL import Image
@@ -36,6 +39,7 @@ def about():
 
 
 @app.route('/register', methods=["GET", "POST"])
+@ratelimit.limit('auth', ratelimit.form_email)
 def register():
     """
     Page to allow someone to create an account that they can log in with. 
@@ -55,17 +59,48 @@ def register():
         user = User(first_name=form.name.data, last_name=form.last_name.data, username=form.username.data,
                     email=form.email.data, password=hashed_password, height=form.height.data, weight=form.weight.data)
         db.session.add(user)
-        db.session.commit()
-        rout = Routine(person=user)
-        db.session.add(rout)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            # someone took the username or email after the form was checked
+            db.session.rollback()
+            field = accounts.claim_error(e)
+            if(field is None):
+                raise
+            getattr(form, field).errors.append(TAKEN_MESSAGES[field])
+            return render_template('register.html', title='Register', form=form)
+        with shards.use_user(user.id):
+            rout = Routine(person=user)
+            db.session.add(rout)
+            db.session.commit()
 
         flash('Your account has been created! You are now able to log in', 'success')
         return redirect(url_for('login'))
     return render_template('register.html', title='Register', form=form)
 
 
+@app.route('/register/check')
+@ratelimit.limit('check', lambda: None, methods = None)
+def check_available():
+    """
+    Tells the registration page whether a username and/or email (?username=...&email=...) are free while the user is typing
+
+    Args:
+        - None
+
+    Returns:
+        - JSON like {"username": true, "email": false} where true means available
+    """
+    values = {f: request.args.get(f, '').strip() for f in accounts.FIELDS if request.args.get(f, '').strip()}
+    found = accounts.taken(values.get('username'), values.get('email'),
+                           user = current_user if current_user.is_authenticated else None)
+    response = jsonify({f: f not in found for f in values})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
 @app.route('/login', methods=["GET", "POST"])
+@ratelimit.limit('auth', ratelimit.form_email)
 def login():
     """
     Page that allows a user to login to an already existing account with their email and password. 
@@ -135,14 +170,27 @@ def dashboard():
     day = date.today()
     r = Routine.query.filter_by(user_id=current_user.id).first()
     r = r.routine
-    today = []
-    if(r):
-        for i in r:
-            if((day - r[i][1]).days >= 0  and  (day - r[i][1]).days% r[i][0] == 0):
-                today.append(i)
+    today = goals.due_today(r, day)
     stuff = len(today)
 
-    return render_template('dashboard.html', title="dashboard", routine=r, day=day,stuff=stuff)
+    return render_template('dashboard.html', title="dashboard", routine=r, day=day,stuff=stuff, today=today)
+
+
+@app.route('/dashboard/summary')
+@login_required
+def dashboard_summary():
+    """
+    Returns this week's numbers for the dashboard cards as JSON. The queries for each card run at the same time.
+
+    Args:
+        - None
+
+    Returns:
+        - JSON with the runs, workouts, water, sleep and heart rate summaries
+    """
+    response = jsonify(summaries.collect_concurrently(current_user.id))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 
 def save_picture(form_picture):
@@ -163,12 +211,13 @@ def save_picture(form_picture):
     output_size = (125, 125)
     i = Image.open(form_picture)
     i.thumbnail(output_size)
-    form_picture.save(picture_path)
+    i.save(picture_path)
     return picture_fn
 
 
 @app.route("/profile", methods=['GET', 'POST'])
 @login_required
+@ratelimit.limit('write')
 def profile():
     """
     Returns the profile page of the web app if a user is currently logged in.
@@ -191,9 +240,17 @@ def profile():
         current_user.email = form.email.data
         current_user.height = form.height.data
         current_user.weight = form.weight.data
-        db.session.commit()
-        flash('Your account has been update!', 'success')
-        return redirect(url_for('account'))
+        try:
+            db.session.commit()
+            flash('Your account has been update!', 'success')
+            return redirect(url_for('profile'))
+        except IntegrityError as e:
+            # someone took the username or email after the form was checked, show the form again with the error
+            db.session.rollback()
+            field = accounts.claim_error(e)
+            if(field is None):
+                raise
+            getattr(form, field).errors.append(TAKEN_MESSAGES[field])
     elif request.method == 'GET':
         form.username.data = current_user.username
         form.email.data = current_user.email
@@ -224,11 +281,13 @@ def routines():
         return redirect(url_for('home'))
     day = date.today()
     routine = Routine.query.filter_by(user_id=current_user.id).first()
-    return render_template('routines.html', title='routines', routine=routine.routine, day=day)
+    due = goals.due_today(routine.routine, day)
+    return render_template('routines.html', title='routines', routine=routine.routine, day=day, due=due)
 
 
 @app.route('/dashboard/routines/add_routine', methods=['GET', 'POST'])
 @login_required
+@ratelimit.limit('write')
 def add_routine():
     """
     Returns the page with the form that allows a user to add or update a routine.
@@ -253,6 +312,7 @@ def add_routine():
         rout = Routine(routine=r_dict, person=current_user)
         db.session.commit()
         print(Routine.query.filter_by(user_id=current_user.id).first())
+        reminders.routine_changed(current_user.id, r_dict)
         flash('Workout has been added to your routine!', 'success')
         return redirect(url_for('routines'))
     return render_template('add_routine.html', title='add routine', form=form, legend="Add to your Routine")
@@ -260,6 +320,7 @@ def add_routine():
 
 @app.route('/dashboard/routines/<rout>/edit', methods=["GET", "POST"])
 @login_required
+@ratelimit.limit('write')
 def edit_routine(rout):
     """
     Allows a user to edit a current routine they already have
@@ -284,6 +345,7 @@ def edit_routine(rout):
         db.session.delete(routine)
         r = Routine(routine=r_dict, person=current_user)
         db.session.commit()
+        reminders.routine_changed(current_user.id, r_dict)
         flash('Workout has been successfully updated!', 'success')
         return redirect(url_for('routines'))
     elif (request.method == 'GET'):
@@ -295,6 +357,7 @@ def edit_routine(rout):
 
 @app.route('/dashboard/routines/<rout>/delete', methods=["GET", "POST"])
 @login_required
+@ratelimit.limit('write', methods = None)
 def delete_routine(rout):
     """
     Allows a user to delete something off of their routines
@@ -314,6 +377,7 @@ def delete_routine(rout):
     db.session.delete(routine)
     rout = Routine(routine=r_dict, person=current_user)
     db.session.commit()
+    reminders.routine_changed(current_user.id, r_dict)
     flash('Workout has been successfully deleted from your routine!', 'success')
     return redirect(url_for('routines'))
 
@@ -330,20 +394,15 @@ def exercises():
     Returns:
         - The page that displays past workout and run data.
     """
-    data = False
-    run_data = False
     today = date.today()
     if(not current_user.is_authenticated):
         return redirect(url_for('home'))
-    workouts = Workout.query.filter_by(user_id=current_user.id).all()
+    week_start = today - timedelta(days = 6)
+    recent_workouts = Workout.query.filter(Workout.user_id == current_user.id, Workout.date >= week_start).all()
+    has_workouts = bool(recent_workouts) or Workout.query.filter_by(user_id = current_user.id).first() is not None
     runs = Runs.query.filter_by(user_id = current_user.id).all()
-    for w in workouts:
-        if((today - w.date).days < 7):
-            data = True
-    for r in runs:
-        if((today - r.date).days<7):
-            run_data = True
-    return render_template('exercises.html', title='My Exercises', workouts = workouts, runs = runs,today=today,data = data, run_data = run_data)
+    run_data = any(r.date >= week_start for r in runs)
+    return render_template('exercises.html', title='My Exercises', recent_workouts = recent_workouts, has_workouts = has_workouts, runs = runs,today=today, run_data = run_data)
 
 
 @app.route('/dashboard/water')
@@ -361,20 +420,19 @@ def water():
     most_water = {}
     if(not current_user.is_authenticated):
         return redirect(url_for('home'))
+    today = date.today()
     cups_today = 0
-    waters = Water.query.filter_by(user_id = current_user.id).all()
+    waters = Water.query.filter(Water.user_id == current_user.id, Water.date >= today - timedelta(days = 6)).all()
     for i in waters:
-        if(i.date == date.today()):
+        if(i.date == today):
             cups_today += i.num_cups
-    for i in waters:
-        if(i.date not in most_water):
-            most_water[i.date]= i.num_cups
         else:
-            print("HELLO")
-            most_water[i.date] = most_water[i.date] + i.num_cups
-    most_water_list = sorted(most_water, reverse = True)
-    print(most_water)
-    return render_template('water.html', title='Water Intake', waters = waters,cups_today = cups_today,today = date.today(),most_water = most_water,most_water_list = most_water_list)
+            most_water[i.date] = most_water.get(i.date, 0) + i.num_cups
+    recent_days = [(d, most_water[d]) for d in sorted(most_water, reverse = True)]
+    has_waters = bool(waters) or Water.query.filter_by(user_id = current_user.id).first() is not None
+    goal = Goal.query.filter_by(user_id = current_user.id, kind = 'water').first()
+    water_goal = goals.whole(goal.target) if goal else 8
+    return render_template('water.html', title='Water Intake', has_waters = has_waters,cups_today = cups_today,today = today,recent_days = recent_days, water_goal = water_goal)
 
 
 @app.route('/dashboard/sleep')
@@ -392,8 +450,12 @@ def sleep():
     today = datetime.today()
     if(not current_user.is_authenticated):
         return redirect(url_for('home'))
-    sleeps = Sleep.query.filter_by(user_id = current_user.id).order_by(Sleep.id.desc()).all()
-    return render_template('sleep.html', title="Sleep", sleeps = sleeps,today = today)
+    last = Sleep.query.filter_by(user_id = current_user.id).order_by(Sleep.id.desc()).first()
+    last_sleep = sleep_length(last) if last else None
+    recent = Sleep.query.filter(Sleep.user_id == current_user.id, Sleep.end_time > today - timedelta(days = 7)).order_by(Sleep.id.desc()).all()
+    sleeps = [{'start': s.start_time.strftime("%H:%M %p"), 'end': s.end_time.strftime("%H:%M %p"),
+               'total': sleep_length(s), 'date': s.end_time.strftime("%m/%d/%Y")} for s in recent]
+    return render_template('sleep.html', title="Sleep", sleeps = sleeps, last_sleep = last_sleep)
 @app.route('/dashboard/heart_rate')
 @login_required
 def heart_rate():
@@ -409,7 +471,8 @@ def heart_rate():
     if(not current_user.is_authenticated):
         return redirect(url_for('home'))
     heart_rates = HeartRate.query.filter_by(user_id = current_user.id).order_by(HeartRate.id.desc()).all()
-    return render_template('heart_rate.html',title = "Heart Rate", heart_rates = heart_rates)
+    series_today = heart_series.day_stats(current_user.id)
+    return render_template('heart_rate.html',title = "Heart Rate", heart_rates = heart_rates, series_today = series_today)
 @app.route('/dashboard/exercises/run_or_workout')
 @login_required
 def run_or_workout():
@@ -427,6 +490,7 @@ def run_or_workout():
     return render_template('run_or_workout.html', title = "Run or Workout")
 @app.route('/dashboard/exercises/add_run', methods = ["GET","POST"])
 @login_required
+@ratelimit.limit('write')
 def add_run():
     """
     Page that prompts user with a form that allows them to input data for a past run
@@ -445,12 +509,56 @@ def add_run():
         date =form.date.data
         time = form.duration.data
         new_run = Runs(date = date, time = time, distance = dis, user_id = current_user.id)
-        db.session.add(new_run)
-        db.session.commit()
+        ingest.submit(current_user.id, new_run, ('distance', date, dis))
         return redirect(url_for('exercises'))
     return render_template('run_form.html', title= "Add Run", legend = "Add a Run", form =form)
+@app.route('/dashboard/exercises/import_run', methods = ["GET","POST"])
+@login_required
+@ratelimit.limit('write')
+def import_run():
+    """
+    Page that lets a user add a run by uploading the GPS file from their watch or phone. The date, time and distance of
+    the run come from the track.
+
+    Args:
+        - None
+
+    Returns:
+        - Page with the upload form, or the page of the new run once it is saved
+    """
+    if(not current_user.is_authenticated):
+        return redirect(url_for('home'))
+    form = ImportRunForm()
+    if(form.validate_on_submit()):
+        try:
+            points = tracks.parse(form.track.data.filename, form.track.data.read())
+            new_run = tracks.build_run(points, current_user.id)
+        except tracks.TrackError as e:
+            flash(str(e), 'danger')
+            return render_template('import_run.html', title = "Import Run", legend = "Import a Run", form = form)
+        db.session.add(new_run)
+        goals.record(current_user.id, 'distance', new_run.date, new_run.distance)
+        db.session.commit()
+        return redirect(url_for('run_detail', run_id = new_run.id))
+    return render_template('import_run.html', title = "Import Run", legend = "Import a Run", form = form)
+@app.route('/dashboard/exercises/runs/<int:run_id>')
+@login_required
+def run_detail(run_id):
+    """
+    Page that shows one run with the splits, moving time, elevation gain and best efforts from its GPS track
+
+    Args:
+        - run_id: id of the run
+
+    Returns:
+        - Page with the details of the run
+    """
+    run = Runs.query.filter_by(id = run_id, user_id = current_user.id).first_or_404()
+    splits = [(miles, seconds_to_time(seconds)) for miles, seconds in run.track.splits] if run.track else []
+    return render_template('run_detail.html', title = "Run", run = run, splits = splits, seconds_to_time = seconds_to_time)
 @app.route('/dashboard/exercises/add_workout', methods = ["GET","POST"])
 @login_required
+@ratelimit.limit('write')
 def add_workout():
     """
     Page that prompts user with a form that allows them to input data for a past workout
@@ -468,13 +576,17 @@ def add_workout():
         name = form.workout.data
         date = form.date.data
         time = form.duration.data
+        r = Routine.query.filter_by(user_id = current_user.id).first()
+        goal = None
+        if(r and name in goals.due_today(r.routine, date) and not Workout.query.filter_by(user_id = current_user.id, exercise = name, date = date).first()):
+            goal = ('routine', date, 1)
         work = Workout(exercise = name, date = date, time = time, user_id = current_user.id)
-        db.session.add(work)
-        db.session.commit()
+        ingest.submit(current_user.id, work, goal)
         return redirect(url_for('exercises'))
     return render_template('workout_form.html', title= "Add Workout", legend = "Add a Workout", form =form)
 @app.route('/dashboard/water/add_water', methods = ["GET","POST"])
 @login_required
+@ratelimit.limit('write')
 def add_water():
     """
     Page that allows user to fill out data for water intake
@@ -492,12 +604,12 @@ def add_water():
         cup = form.num_cups.data
         date = form.date.data
         intake = Water(num_cups = cup, date = date, user_id = current_user.id)
-        db.session.add(intake)
-        db.session.commit()
+        ingest.submit(current_user.id, intake, ('water', date, cup))
         return redirect(url_for('water'))
     return render_template('water_form.html', title= "Add Water", legend = "Add Water Intake", form =form)
 @app.route('/dashboard/heart_rate/add_heart', methods = ["GET","POST"])
 @login_required
+@ratelimit.limit('write')
 def add_heart():
     """
     Page that a user can fill out data for heart rate measurement
@@ -515,12 +627,83 @@ def add_heart():
         rate = form.measurement.data
         date = form.date.data
         new_rate = HeartRate(date = date, heartrate = rate, user_id = current_user.id)
-        db.session.add(new_rate)
-        db.session.commit()
+        ingest.submit(current_user.id, new_rate)
         return redirect(url_for('heart_rate'))
     return render_template('heartrate_form.html', title= "Add Water", legend = "Add Sleep Data", form =form)
+@app.route('/dashboard/heart_rate/add_samples', methods = ["POST"])
+@login_required
+@ratelimit.limit('write')
+def add_heart_samples():
+    """
+    Lets a client (like a watch) send many heart rate measurements at once as JSON: [{"date": "YYYY-mm-dd", "heartrate": 70}, ...]
+
+    Args:
+        - None
+
+    Returns:
+        - JSON with the number of measurements saved, or an error with status 400
+    """
+    samples = request.get_json(silent = True)
+    if(not isinstance(samples, list)):
+        return jsonify(error = "Expected a list of measurements"), 400
+    rates = []
+    for s in samples:
+        try:
+            rates.append(HeartRate(date = datetime.strptime(s['date'], "%Y-%m-%d").date(), heartrate = int(s['heartrate']), user_id = current_user.id))
+        except (KeyError, TypeError, ValueError):
+            return jsonify(error = "Each measurement needs a date (YYYY-mm-dd) and a heartrate"), 400
+    if(rates):
+        ingest.submit(current_user.id, rates)
+    return jsonify(saved = len(rates))
+def local_time(text):
+    """
+    Helper method that reads a sample time, which has to be local time without a UTC offset (like the stored samples)
+
+    Args:
+        - text: the time in the format YYYY-mm-ddTHH:MM:SS
+
+    Returns:
+        - The datetime (raises ValueError for bad text or a time with an offset)
+    """
+    when = datetime.fromisoformat(text)
+    if(when.tzinfo is not None):
+        raise ValueError("Time has a UTC offset: %r" % text)
+    return when
+@app.route('/dashboard/heart_rate/series', methods = ["GET","POST"])
+@login_required
+@ratelimit.limit('write')
+def heart_rate_series():
+    """
+    Lets a wearable send dense heart rate samples as JSON ([{"time": "YYYY-mm-ddTHH:MM:SS", "bpm": 70}, ...]) with a POST,
+    or gives back the samples and their min/max/mean between ?start= and ?end= (same time format) with a GET
+
+    Args:
+        - None
+
+    Returns:
+        - JSON with the number of samples saved, or the samples and their statistics, or an error with status 400
+    """
+    if(request.method == 'POST'):
+        samples = request.get_json(silent = True)
+        if(not isinstance(samples, list)):
+            return jsonify(error = "Expected a list of samples"), 400
+        try:
+            parsed = [(local_time(s['time']), int(s['bpm'])) for s in samples]
+            saved = heart_series.append(current_user.id, parsed)
+        except (KeyError, TypeError, ValueError):
+            return jsonify(error = "Each sample needs a local time (YYYY-mm-ddTHH:MM:SS, without a UTC offset) and a bpm between 0 and 65535"), 400
+        return jsonify(saved = saved)
+    try:
+        start = local_time(request.args.get('start', date.today().isoformat()))
+        end = local_time(request.args['end']) if 'end' in request.args else start + timedelta(days = 1, seconds = -1)
+    except ValueError:
+        return jsonify(error = "start and end need to be local times in the format YYYY-mm-ddTHH:MM:SS, without a UTC offset"), 400
+    samples = heart_series.read(current_user.id, start, end)
+    return jsonify(stats = heart_series.stats(current_user.id, start, end),
+                   samples = [[when.isoformat(), rate] for when, rate in samples])
 @app.route('/dashboard/sleep/add_sleep', methods = ["GET","POST"])
 @login_required
+@ratelimit.limit('write')
 def add_sleep():
     """
     Page that a user can fill out data for a past sleep
@@ -544,37 +727,66 @@ def add_sleep():
         start = datetime.strptime(start,"%m/%d/%Y %H:%M %p")
         end = datetime.strptime(end,"%m/%d/%Y %H:%M %p")
         new_sleep = Sleep(start_time = start, end_time = end, user_id = current_user.id)
-        db.session.add(new_sleep)
-        db.session.commit()
+        ingest.submit(current_user.id, new_sleep, ('sleep', end.date(), (end - start).total_seconds()/3600))
         return redirect(url_for('sleep'))
     return render_template('sleep_form.html',title= 'Add Sleep', legend = "Add Sleep Data", form = form)
-def seconds_to_time(seconds):
+@app.route('/dashboard/goals')
+@login_required
+def goals_page():
+    """
+    Page that displays the goals of the current user with the progress for the current day or week and their streaks.
+    Also shows the routine sessions that are due this week and the ones that were missed.
+
+    Args:
+        - None
+
+    Returns:
+        - Page that displays the goals
+    """
+    if(not current_user.is_authenticated):
+        return redirect(url_for('home'))
+    today = date.today()
+    week_start = goals.period_start('distance', today)
+    user_goals = [goals.progress(g, today) for g in Goal.query.filter_by(user_id = current_user.id).all()]
+    r = Routine.query.filter_by(user_id = current_user.id).first()
+    due = goals.due_in_window([r], week_start, week_start + timedelta(days = 6)).get(current_user.id, {}) if r else {}
+    done = set((w.exercise, w.date) for w in Workout.query.filter(Workout.user_id == current_user.id, Workout.date >= week_start, Workout.date < today))
+    missed = goals.overdue(r.routine if r else None, done, week_start, today)
+    return render_template('goals.html', title = "Goals", goals = user_goals, due = due, missed = missed, today = today)
+@app.route('/dashboard/goals/add_goal', methods = ["GET","POST"])
+@login_required
+@ratelimit.limit('write')
+def add_goal():
     """
-    Helper method that take a total amount of seconds and converts it into minutes and seconds
+    Page with a form that allows a user to set a new goal or change the target of an existing one
 
     Args:
-        -seconds: total number of seconds
+        - None
 
     Returns:
-        - Minutes and seconds in format M' S"
+        - Page with the form to set a goal, or the goals page once it is saved
     """
-    minutes = int(seconds//60)
-    seconds = int(round(seconds % 60,0))
-    return str(minutes)+"'" +str(seconds).zfill(2) + '"'
-def add_times(t1, t2):
+    if(not current_user.is_authenticated):
+        return redirect(url_for('home'))
+    form = GoalForm()
+    if(form.validate_on_submit()):
+        goals.set_goal(current_user.id, form.kind.data, form.target.data)
+        db.session.commit()
+        flash('Your goal has been saved!', 'success')
+        return redirect(url_for('goals_page'))
+    return render_template('goal_form.html', title = "Set Goal", legend = "Set a Goal", form = form)
+def sleep_length(s):
     """
-    Helper method that adds two time objects together to add hours and minures
+    Helper method that formats how long a sleep lasted
 
     Args:
-        - t1: the first time object
-        - t2: the second time object
+        - s: the Sleep object
 
     Returns:
-        - The result of adding the hours and minutes of both times
+        - The length in the format "H hours M minutes"
     """
-    a = timedelta(hours = t1.hour, minutes=t1.minute, seconds= t1.second)
-    b = timedelta(hours = t2.hour, minutes=t2.minute, seconds=t2.second)
-    return (a+b).time()
+    seconds = (s.end_time - s.start_time).seconds
+    return str(seconds//3600) + " hours " + str((seconds//60) % 60) + " minutes"
 @app.route('/personal_stats')
 @login_required
 def personal_stats():
@@ -590,93 +802,11 @@ def personal_stats():
     """
     if(not current_user.is_authenticated):
         return redirect(url_for("home"))
-    longest_run = [0,date.today()]
-    fastest_run = [100000,"format",date.today()]
-    most_water = {}
-    activity = {}
-    most_activity = []
-    paces = []
-    distances = []
-    times = []
-    rates = []
-    min_date = date.today()
-    max_date = date.today()
-    min_date2 = date.today()
-    total_waters = 0
-    avg_water = 0
-    avg_activity = 0
-    avg_distance = 0
-    avg_pace = seconds_to_time(0)
-    avg_heartrate = 0
-    m = 0
-    d = date.today()
-    runs = Runs.query.filter_by(user_id = current_user.id).all()
-    exercises = Workout.query.filter_by(user_id = current_user.id).all()
-    waters = Water.query.filter_by(user_id = current_user.id).all()
-    heart_rates = HeartRate.query.filter_by(user_id = current_user.id).all()
-    for i in runs:
-        distances.append(i.distance)
-        if(i.distance > longest_run[0]):
-            longest_run[0] = i.distance
-            longest_run[1] = i.date
-        total_seconds = int(i.time.strftime("%H"))*3600 + int(i.time.strftime("%M"))*60 + int(i.time.strftime("%S"))
-        pace = round(total_seconds/i.distance,2)
-        paces.append(pace)
-        if(pace<fastest_run[0]):
-            fastest_run[0] = pace
-            fastest_run[1] = seconds_to_time(pace)
-            fastest_run[2] = i.date
-        if(i.date not in activity):
-            activity[i.date] = i.time
-        else:
-            activity[i.date] = add_times(activity[i.date], i.time)
-    if(distances):
-        avg_distance = sum(distances)/len(distances)
-    print(paces)
-    if(paces):
-        avg_pace = seconds_to_time(sum(paces)/len(paces))
-    for i in waters:
-        if(min_date > i.date):
-            min_date = i.date
-        if(i.date not in most_water):
-            most_water[i.date]= i.num_cups
-        else:
-            print("HELLO")
-            most_water[i.date] = most_water[i.date] + i.num_cups
-    if(most_water.values()):
-        m = max(most_water.values())
-        d = date.today()
-        for i in most_water:
-            if(most_water[i] == m):
-                d = i 
-                break
-        avg_water = round(sum(most_water.values())/((max_date-min_date).days + 1),2)
-    for i in exercises:
-        if(i.date not in activity):
-            activity[i.date] = i.time
-        else:
-            activity[i.date] = add_times(activity[i.date], i.time)
-    if(activity):
-        m1 = max(activity.values())
-        total_activity = 0
-        for i in activity:
-            if(i < min_date2):
-                min_date2 = i
-            total_activity += int(activity[i].strftime("%H"))*3600 + int(activity[i].strftime("%M"))*60 + int(activity[i].strftime("%S"))
-            if(activity[i] == m1):
-                most_activity.append(m1)
-                most_activity.append(i)
-        avg_activity = total_activity/((max_date-min_date2).days +1)
-    avg_time = time(int(avg_activity//3600), int((avg_activity//60)%60), int(avg_activity%60))
-    for i in heart_rates:
-        avg_heartrate += i.heartrate
-    if(heart_rates):
-        avg_heartrate/= len(heart_rates)
-    return render_template("personal_stats.html", title = "Personal Statistics", longest_run = longest_run, fastest_run = fastest_run, most_water = m, water_date = d, most_activity=most_activity,avg_distance = avg_distance, avg_pace = avg_pace,avg_water = avg_water, avg_time = avg_time,avg_heartrate = avg_heartrate)
+    return render_template("personal_stats.html", title = "Personal Statistics", **stats.load(current_user.id))
 @app.route('/dashboard/exercises/all_exercises')
 def all_exercises():
     """
-    Page that displays all exercise data 
+    Page that displays all exercise data. With ?archived=N it shows page N of the workouts that were moved to the archive.
 
     Args:
         - None
@@ -684,12 +814,48 @@ def all_exercises():
     Return:
         - Page that displays exercise data
     """
+    archived = request.args.get('archived', type = int)
+    if(archived):
+        workouts, older = retention.archived_page(current_user.id, 'workout', archived)
+        return render_template("all_exercises.html", title = "All Exercises", workouts = workouts, archived = archived, older = older)
     workouts = Workout.query.filter_by(user_id = current_user.id).order_by(Workout.date.desc()).all()
-    return render_template("all_exercises.html", title = "All Exercises",workouts=workouts)
+    return render_template("all_exercises.html", title = "All Exercises",workouts=workouts, older = retention.has_archive(current_user.id, 'workout'))
+@app.route('/dashboard/exercises/search')
+@login_required
+def search_exercises():
+    """
+    Page that finds the workouts whose exercise matches a search (optionally between two dates) and shows how many times,
+    for how long in total, and how often each matching exercise was done
+
+    Args:
+        - None
+
+    Returns:
+        - Page with the matching workouts and their totals
+    """
+    query = request.args.get('q', '').strip()
+    start = request.args.get('from', type = date.fromisoformat)
+    end = request.args.get('to', type = date.fromisoformat)
+    workouts, totals = search.history(current_user.id, query, start, end)
+    return render_template("exercise_search.html", title = "Search Exercises", query = query, start = start, end = end,
+                           workouts = workouts, totals = totals)
+@app.route('/dashboard/exercises/suggest')
+@login_required
+def suggest_exercises():
+    """
+    Exercise names that start with what was typed, for autocomplete on the workout and routine forms
+
+    Args:
+        - None
+
+    Returns:
+        - JSON list of names
+    """
+    return jsonify(search.suggest(current_user.id, request.args.get('q', ''), max(1, min(request.args.get('limit', 10, type = int), 50))))
 @app.route('/dashboard/exercises/all_runs')
 def all_runs():
     """
-    Page that displays all run data 
+    Page that displays all run data. With ?archived=N it shows page N of the runs that were moved to the archive.
 
     Args:
         - None
@@ -697,5 +863,96 @@ def all_runs():
     Return:
         - Page that displays run data
     """
+    archived = request.args.get('archived', type = int)
+    if(archived):
+        runs, older = retention.archived_page(current_user.id, 'runs', archived)
+        return render_template("all_runs.html", title = "All Runs", runs = runs, tracked = set(), archived = archived, older = older)
     runs = Runs.query.filter_by(user_id = current_user.id).order_by(Runs.date.desc()).all()
-    return render_template("all_runs.html",title = "All Runs", runs = runs)
\ No newline at end of file
+    tracked = set(t.run_id for t in RunTrack.query.join(Runs).filter(Runs.user_id == current_user.id).with_entities(RunTrack.run_id))
+    return render_template("all_runs.html",title = "All Runs", runs = runs, tracked = tracked, older = retention.has_archive(current_user.id, 'runs'))
+@app.route('/_profile')
+def profile_summary():
+    """
+    Top functions of the requests profiled by this process (needs MYHEALTH_PROFILING and the profiling token)
+
+    Args:
+        - None
+
+    Returns:
+        - Text summary
+    """
+    if(not profiler.authorized()):
+        abort(404)
+    return Response(profiler.sampler.summary(request.args.get('top', 25, type = int)), mimetype = 'text/plain')
+@app.route('/_profile/collapsed')
+def profile_collapsed():
+    """
+    Profiled stacks of this process in collapsed format, for flamegraph.pl or speedscope
+
+    Args:
+        - None
+
+    Returns:
+        - Collapsed stacks as text
+    """
+    if(not profiler.authorized()):
+        abort(404)
+    return Response(profiler.sampler.collapsed(), mimetype = 'text/plain')
+@app.route('/_profile/flamegraph.svg')
+def profile_flamegraph():
+    """
+    Flame graph of the profiled stacks of this process
+
+    Args:
+        - None
+
+    Returns:
+        - SVG picture
+    """
+    if(not profiler.authorized()):
+        abort(404)
+    return Response(profiler.flamegraph(profiler.sampler.collapsed()), mimetype = 'image/svg+xml')
+@app.route('/_profile/toggle', methods = ['POST'])
+def profile_toggle():
+    """
+    Switches profiling of every request on or off (?on=1 or ?on=0) for this process
+
+    Args:
+        - None
+
+    Returns:
+        - JSON with whether every request is profiled
+    """
+    if(not profiler.authorized()):
+        abort(404)
+    profiler.sampler.profile_all = request.args.get('on', '1') == '1'
+    return jsonify({'profile_all': profiler.sampler.profile_all})
+@app.route('/_profile/export', methods = ['POST'])
+def profile_export():
+    """
+    Writes the collapsed stacks, flame graph and summary of this process to PROFILE_DIR
+
+    Args:
+        - None
+
+    Returns:
+        - JSON list of the files written
+    """
+    if(not profiler.authorized()):
+        abort(404)
+    return jsonify(profiler.export())
+@app.route('/_profile/reset', methods = ['POST'])
+def profile_reset():
+    """
+    Forgets the profiled stacks of this process
+
+    Args:
+        - None
+
+    Returns:
+        - Empty response
+    """
+    if(not profiler.authorized()):
+        abort(404)
+    profiler.sampler.reset()
+    return '', 204
\ No newline at end of file
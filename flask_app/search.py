@@ -0,0 +1,316 @@
+"""
+search.py
+Search over the names of a user's workouts and routine exercises, using SQLite FTS5 full-text indexes:
+
+    - workout_search: one entry per workout (rowid = workout id), kept up to date by triggers on the workout table, so
+      rows added, changed or deleted any way (forms, batch ingest, retention, shard moves) are indexed
+    - routine_search: one entry per exercise in a routine. The exercise names are inside the pickled routine, which
+      triggers can't read, so new and changed routines are indexed by ORM events on Routine, deleted ones by a trigger,
+      and setup() catches up on routines added some other way (like shards.move_user) when the app starts
+
+Both also index an owner token ('u' + user id) so a search only looks at one user's entries. Searches match every word
+typed, the last ones as prefixes ("squ" finds "Squats" and "Back squat"). suggest() gives names for autocomplete and
+history() gives matching workouts with totals per exercise. If SQLite was built without FTS5 (or SEARCH_FTS_ENABLED is
+off) the same searches are done with LIKE, which has to look at every workout of the user.
+
+Archived workouts (see retention.py) are not searched.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app, shards
+from flask_app.models import Routine, Workout
+from sqlalchemy import event, select, table, column, text, and_, or_, func
+from sqlalchemy.exc import OperationalError
+from datetime import timedelta
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+SETUP = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS workout_search USING fts5(exercise, owner, content='', prefix='2 3', tokenize='%s')" % TOKENIZER,
+    "CREATE VIRTUAL TABLE IF NOT EXISTS routine_search USING fts5(name, owner, routine_id UNINDEXED, prefix='2 3', tokenize='%s')" % TOKENIZER,
+    """CREATE TRIGGER IF NOT EXISTS workout_search_insert AFTER INSERT ON workout BEGIN
+        INSERT INTO workout_search(rowid, exercise, owner) VALUES (new.id, new.exercise, 'u' || new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS workout_search_delete AFTER DELETE ON workout BEGIN
+        INSERT INTO workout_search(workout_search, rowid, exercise, owner) VALUES ('delete', old.id, old.exercise, 'u' || old.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS workout_search_update AFTER UPDATE OF exercise, user_id ON workout BEGIN
+        INSERT INTO workout_search(workout_search, rowid, exercise, owner) VALUES ('delete', old.id, old.exercise, 'u' || old.user_id);
+        INSERT INTO workout_search(rowid, exercise, owner) VALUES (new.id, new.exercise, 'u' || new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS routine_search_delete AFTER DELETE ON routine BEGIN
+        DELETE FROM routine_search WHERE routine_search MATCH 'owner : u' || old.user_id AND routine_id = old.id;
+    END""",
+]
+workout_search = table('workout_search', column('rowid'))
+
+_fts = {}
+
+
+def owner(user_id):
+    """
+    The token that marks a user's entries in the indexes
+
+    Args:
+        - user_id: id of the user
+
+    Returns:
+        - The token
+    """
+    return 'u%d' % user_id
+
+
+def words(text):
+    """
+    Splits what was typed into lowercase words
+
+    Args:
+        - text: the search text
+
+    Returns:
+        - List of words
+    """
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def match(user_id, field, text):
+    """
+    Builds an FTS5 query for a user's entries whose field contains every word of text, each as a prefix. Words are quoted,
+    so nothing typed is read as query syntax.
+
+    Args:
+        - user_id: id of the user
+        - field: 'exercise' or 'name'
+        - text: the search text
+
+    Returns:
+        - The query, or None if there are no words
+    """
+    terms = words(text)
+    if(not terms):
+        return None
+    return 'owner : %s AND %s : (%s)' % (owner(user_id), field, ' '.join('"%s"*' % t for t in terms))
+
+
+def _index_routine(connection, routine):
+    """
+    Helper method that adds the exercises of a routine to routine_search
+
+    Args:
+        - connection: connection to write with
+        - routine: the Routine
+
+    Returns:
+        - None
+    """
+    for name in (routine.routine or {}):
+        connection.execute(text("INSERT INTO routine_search(name, owner, routine_id) VALUES (:name, :owner, :id)"),
+                           name = name, owner = owner(routine.user_id), id = routine.id)
+
+
+def _unindex_routine(connection, routine):
+    """
+    Helper method that removes the exercises of a routine from routine_search
+
+    Args:
+        - connection: connection to write with
+        - routine: the Routine
+
+    Returns:
+        - None
+    """
+    connection.execute(text("DELETE FROM routine_search WHERE routine_search MATCH :match AND routine_id = :id"),
+                       match = 'owner : %s' % owner(routine.user_id), id = routine.id)
+
+
+def setup(engine):
+    """
+    Creates the indexes and triggers in a database if they are missing, fills in a workout index that was just created,
+    and brings routine_search up to date with the routine table
+
+    Args:
+        - engine: the database engine
+
+    Returns:
+        - True if the database has FTS5, otherwise False
+    """
+    try:
+        with engine.begin() as conn:
+            existing = set(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%_search'"))
+            for statement in SETUP:
+                conn.execute(statement)
+            if('workout_search' not in existing):
+                conn.execute("INSERT INTO workout_search(rowid, exercise, owner) SELECT id, exercise, 'u' || user_id FROM workout")
+            r = Routine.__table__
+            indexed = set(row[0] for row in conn.execute("SELECT DISTINCT routine_id FROM routine_search"))
+            ids = set(row[0] for row in conn.execute(select([r.c.id])))
+            for routine_id in indexed - ids:
+                conn.execute(text("DELETE FROM routine_search WHERE routine_id = :id"), id = routine_id)
+            missing = sorted(ids - indexed)
+            for i in range(0, len(missing), shards.CHUNK):
+                for routine in conn.execute(r.select().where(r.c.id.in_(missing[i:i + shards.CHUNK]))):
+                    _index_routine(conn, routine)
+    except OperationalError as e:
+        logger.warning("Full-text search is not available, searching with LIKE instead: %s", e.orig)
+        _fts[engine] = False
+        return False
+    _fts[engine] = True
+    return True
+
+
+def fts(engine):
+    """
+    Checks whether searches on a database can use the FTS5 indexes
+
+    Args:
+        - engine: the database engine
+
+    Returns:
+        - True or False
+    """
+    return app.config.get('SEARCH_FTS_ENABLED', True) and _fts.get(engine, False)
+
+
+@event.listens_for(Routine, 'after_insert')
+def routine_added(mapper, connection, routine):
+    """
+    Indexes the exercises of a new routine
+
+    Args:
+        - mapper: unused
+        - connection: the connection of the flush (on the user's shard)
+        - routine: the Routine
+
+    Returns:
+        - None
+    """
+    if(_fts.get(connection.engine)):
+        _index_routine(connection, routine)
+
+
+@event.listens_for(Routine, 'after_update')
+def routine_changed(mapper, connection, routine):
+    """
+    Indexes the exercises of a changed routine again
+
+    Args:
+        - mapper: unused
+        - connection: the connection of the flush (on the user's shard)
+        - routine: the Routine
+
+    Returns:
+        - None
+    """
+    if(_fts.get(connection.engine)):
+        _unindex_routine(connection, routine)
+        _index_routine(connection, routine)
+
+
+def suggest(user_id, prefix, limit = 10):
+    """
+    Exercise names for autocomplete: the user's routine exercises and workouts that match what was typed, routine
+    exercises first and then workouts by how often they were done
+
+    Args:
+        - user_id: id of the user
+        - prefix: what was typed so far
+        - limit: most names to give
+
+    Returns:
+        - List of names
+    """
+    terms = words(prefix)
+    if(not terms):
+        return []
+    engine = shards.engine_for(user_id)
+    w = Workout.__table__
+    with engine.connect() as conn:
+        if(fts(engine)):
+            names = [row[0] for row in conn.execute(text("SELECT name FROM routine_search WHERE routine_search MATCH :match"),
+                                                    match = match(user_id, 'name', prefix))]
+            condition = text("workout_search MATCH :match").bindparams(match = match(user_id, 'exercise', prefix))
+            source = w.join(workout_search, workout_search.c.rowid == w.c.id)
+        else:
+            routine = conn.execute(select([Routine.__table__.c.routine]).where(Routine.__table__.c.user_id == user_id)).scalar()
+            names = [name for name in (routine or {}) if all(any(word.startswith(t) for word in words(name)) for t in terms)]
+            condition = and_(w.c.user_id == user_id, *[or_(func.lower(w.c.exercise).like(t + '%'), func.lower(w.c.exercise).like('% ' + t + '%'))
+                                                      for t in terms])
+            source = w
+        done = conn.execute(select([w.c.exercise, func.count()]).select_from(source).where(condition)
+                            .group_by(func.lower(w.c.exercise)).order_by(func.count().desc()).limit(limit)).fetchall()
+    seen = set()
+    found = []
+    for name in sorted(names, key = str.lower) + [row[0] for row in done]:
+        if(name and name.lower() not in seen):
+            seen.add(name.lower())
+            found.append(name)
+    return found[:limit]
+
+
+def seconds(t):
+    """
+    Length of a workout in seconds
+
+    Args:
+        - t: the duration as a time
+
+    Returns:
+        - Number of seconds
+    """
+    return t.hour * 3600 + t.minute * 60 + t.second if t else 0
+
+
+def history(user_id, query, start = None, end = None):
+    """
+    A user's workouts whose exercise matches what was typed, optionally between two dates, with totals per exercise
+
+    Args:
+        - user_id: id of the user
+        - query: the search text
+        - start: first date to include (None for no limit)
+        - end: last date to include (None for no limit)
+
+    Returns:
+        - (list of workout rows newest first, list of dictionaries with exercise, count, total (timedelta), first, last
+          and per_week, most done first)
+    """
+    terms = words(query)
+    if(not terms):
+        return [], []
+    engine = shards.engine_for(user_id)
+    w = Workout.__table__
+    if(fts(engine)):
+        conditions = [text("workout_search MATCH :match").bindparams(match = match(user_id, 'exercise', query))]
+        source = w.join(workout_search, workout_search.c.rowid == w.c.id)
+    else:
+        conditions = [w.c.user_id == user_id] + [or_(func.lower(w.c.exercise).like(t + '%'), func.lower(w.c.exercise).like('% ' + t + '%'))
+                                                 for t in terms]
+        source = w
+    if(start is not None):
+        conditions.append(w.c.date >= start)
+    if(end is not None):
+        conditions.append(w.c.date <= end)
+    with engine.connect() as conn:
+        rows = conn.execute(select([w.c.id, w.c.exercise, w.c.date, w.c.time]).select_from(source).where(and_(*conditions))
+                            .order_by(w.c.date.desc(), w.c.id.desc())).fetchall()
+    totals = {}
+    for row in rows:
+        key = (row.exercise or '').lower()
+        entry = totals.get(key)
+        if(entry is None):
+            entry = totals[key] = {'exercise': row.exercise, 'count': 0, 'seconds': 0, 'first': row.date, 'last': row.date}
+        entry['count'] += 1
+        entry['seconds'] += seconds(row.time)
+        entry['first'] = min(entry['first'], row.date)
+        entry['last'] = max(entry['last'], row.date)
+    for entry in totals.values():
+        entry['total'] = timedelta(seconds = entry.pop('seconds'))
+        entry['per_week'] = round(entry['count'] / max(1, ((entry['last'] - entry['first']).days + 1) / 7), 1)
+    return rows, sorted(totals.values(), key = lambda e: (-e['count'], e['exercise'].lower()))
+
+
+for _engine in shards.engines():
+    setup(_engine)
@@ -0,0 +1,151 @@
+"""
+shard_session.py
+Database session for the MyHealth Web App that knows about shards. When SHARDS is more than 0, a user's own data (models
+with __sharded__ = True: routines, workouts, runs, water, sleep, heart rate and goals) lives in one of SHARDS SQLite files
+and everything else (users and the shard directory) stays in the main database. Code picks the shard for the current
+thread with use(shard) (shards.py does this for each request), and the session sends queries and writes for sharded
+models to that shard's engine.
+
+The session can also be pointed at read-only copies of the databases for a thread with select_readers (snapshot.py
+does this for the analytics pages).
+
+Kept separate from shards.py because it has to exist before db is created in __init__.py.
+
+Last Modified: 10/19/2026
+"""
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from contextlib import contextmanager
+import threading
+
+_local = threading.local()
+
+
+def current():
+    """
+    Gives the shard selected for this thread
+
+    Args:
+        - None
+
+    Returns:
+        - The shard number, or None if none is selected
+    """
+    return getattr(_local, 'shard', None)
+
+
+@contextmanager
+def use(shard):
+    """
+    Selects a shard for this thread while the with block runs (None leaves the selection as it is)
+
+    Args:
+        - shard: the shard number
+
+    Returns:
+        - Context manager
+    """
+    if(shard is None):
+        yield
+        return
+    before = current()
+    _local.shard = shard
+    try:
+        yield
+    finally:
+        _local.shard = before
+
+
+def select(shard):
+    """
+    Selects a shard for this thread until it is changed again (used for a whole request)
+
+    Args:
+        - shard: the shard number, or None to clear it
+
+    Returns:
+        - None
+    """
+    _local.shard = shard
+
+
+def readers():
+    """
+    Gives the read-only copies selected for this thread
+
+    Args:
+        - None
+
+    Returns:
+        - Dictionary of engine -> engine to read from instead, or None
+    """
+    return getattr(_local, 'readers', None)
+
+
+def select_readers(engines):
+    """
+    Sends this thread's session to read-only copies of the databases until it is changed again
+
+    Args:
+        - engines: dictionary of engine -> engine to read from instead, or None to use the databases themselves
+
+    Returns:
+        - None
+    """
+    _local.readers = engines
+
+
+def bind_key(shard):
+    """
+    Name of a shard in SQLALCHEMY_BINDS
+
+    Args:
+        - shard: the shard number
+
+    Returns:
+        - The bind key
+    """
+    return 'shard%d' % shard
+
+
+def shard_binds(uri, count):
+    """
+    Makes the SQLALCHEMY_BINDS entries for the shards, as files next to the main SQLite database (site.db ->
+    site.shard0.db, site.shard1.db, ...)
+
+    Args:
+        - uri: the main database uri
+        - count: number of shards
+
+    Returns:
+        - Dictionary of bind key -> uri
+    """
+    if(count and not uri.startswith('sqlite:///')):
+        raise ValueError("Sharding is only supported for SQLite databases")
+    base = uri[:-3] if uri.endswith('.db') else uri
+    return {bind_key(i): '%s.shard%d.db' % (base, i) for i in range(count)}
+
+
+class ShardedSession(SignallingSession):
+    """
+    Session that sends sharded models to the engine of the shard selected for the thread, and everything to the
+    read-only copies selected for the thread if there are any
+    """
+    def get_bind(self, mapper = None, clause = None):
+        if(mapper is not None and getattr(mapper.class_, '__sharded__', False) and self.app.config.get('SHARDS')):
+            shard = current()
+            if(shard is None):
+                raise RuntimeError("No shard selected for %s, use shards.use_user(user_id)" % mapper.class_.__name__)
+            engine = get_state(self.app).db.get_engine(self.app, bind = bind_key(shard))
+        else:
+            engine = super().get_bind(mapper, clause)
+        copies = readers()
+        return copies.get(engine, engine) if copies else engine
+
+
+class ShardedSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy with ShardedSession as its session class
+    """
+    def create_session(self, options):
+        return orm.sessionmaker(class_ = ShardedSession, db = self, **options)
@@ -0,0 +1,424 @@
+"""
+shards.py
+Optional sharding of user data for the MyHealth Web App. With MYHEALTH_SHARDS=N, each user's routines, workouts, runs,
+water, sleep, heart rate and goals are stored in one of N SQLite files (site.shard0.db, ...) so users on different shards
+don't wait on each other's write lock. Users themselves stay in the main database, along with a directory table saying
+which shard each user is on. New users go to shard user_id % N.
+
+Each request selects the logged in user's shard (see shard_session.py for how the session uses it). Code that works on
+some other user's data wraps it in use_user(user_id); a session should only touch one shard at a time, because row ids
+are only unique within a shard.
+
+    flask shards status               users and rows on each shard
+    flask shards rebalance            move users whose shard is not user_id % N (after changing N)
+    flask shards move USER_ID SHARD   move one user
+    flask shards import-main          copy data from before sharding was turned on out of the main database
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app, db
+from flask_app.models import User, ShardDirectory, Routine, Workout, Runs, RunTrack, Water, Sleep, HeartRate, HeartRateChunk, Goal, GoalPeriod, DailySummary
+from flask_app.shard_session import use, select as select_shard, bind_key, shard_binds
+from flask_login import current_user
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from contextlib import contextmanager
+import click
+import threading
+
+SHARDED_MODELS = (Routine, Workout, Runs, RunTrack, Water, Sleep, HeartRate, HeartRateChunk, Goal, GoalPeriod, DailySummary)
+# parents before children, so copies can map the ids of runs and goals to their new ids
+TABLES = [t for t in db.Model.metadata.sorted_tables if t in set(m.__table__ for m in SHARDED_MODELS)]
+CHUNK = 500
+
+_directory = {}
+_lock = threading.Lock()
+
+
+def count():
+    """
+    Number of shards (0 when sharding is off)
+
+    Args:
+        - None
+
+    Returns:
+        - The number of shards
+    """
+    return app.config.get('SHARDS', 0)
+
+
+def engine(shard):
+    """
+    Engine of a shard
+
+    Args:
+        - shard: the shard number
+
+    Returns:
+        - The engine
+    """
+    return db.get_engine(app, bind = bind_key(shard))
+
+
+def engines():
+    """
+    Every engine: the main database and each shard
+
+    Args:
+        - None
+
+    Returns:
+        - List of engines
+    """
+    return [db.engine] + [engine(i) for i in range(count())]
+
+
+def target(user_id):
+    """
+    The shard a user belongs on with the current number of shards
+
+    Args:
+        - user_id: id of the user
+
+    Returns:
+        - The shard number
+    """
+    return user_id % count()
+
+
+def shard_of(user_id):
+    """
+    Looks up which shard a user's data is on, adding them to the directory (on their target shard) the first time
+
+    Args:
+        - user_id: id of the user
+
+    Returns:
+        - The shard number
+    """
+    shard = _directory.get(user_id)
+    if(shard is not None):
+        return shard
+    t = ShardDirectory.__table__
+    with db.engine.connect() as conn:
+        shard = conn.execute(select([t.c.shard]).where(t.c.user_id == user_id)).scalar()
+        if(shard is None):
+            shard = target(user_id)
+            try:
+                conn.execute(t.insert().values(user_id = user_id, shard = shard))
+            except IntegrityError:
+                shard = conn.execute(select([t.c.shard]).where(t.c.user_id == user_id)).scalar()
+    with _lock:
+        _directory[user_id] = shard
+    return shard
+
+
+def engine_for(user_id):
+    """
+    Engine holding a user's data
+
+    Args:
+        - user_id: id of the user
+
+    Returns:
+        - The engine
+    """
+    return engine(shard_of(user_id)) if count() else db.engine
+
+
+@contextmanager
+def use_user(user_id):
+    """
+    Selects a user's shard while the with block runs. Does nothing when sharding is off.
+
+    Args:
+        - user_id: id of the user
+
+    Returns:
+        - Context manager
+    """
+    with use(shard_of(user_id) if count() else None):
+        yield
+
+
+def all_rows(query):
+    """
+    Runs a query on every shard and puts the results together. The objects are detached from the session, since ids
+    from different shards can be the same.
+
+    Args:
+        - query: function that runs the query and returns a list (like Routine.query.all)
+
+    Returns:
+        - List of the results from every shard
+    """
+    if(not count()):
+        return query()
+    rows = []
+    for shard in range(count()):
+        with use(shard):
+            found = query()
+            for row in found:
+                db.session.expunge(row)
+            rows.extend(found)
+    return rows
+
+
+@app.before_request
+def select_user_shard():
+    """
+    Selects the logged in user's shard for the request
+
+    Args:
+        - None
+
+    Returns:
+        - None
+    """
+    if(count() and current_user.is_authenticated):
+        select_shard(shard_of(current_user.id))
+
+
+@app.teardown_request
+def clear_shard(error = None):
+    """
+    Clears the shard selection after a request so the thread starts the next one without one
+
+    Args:
+        - error: unused
+
+    Returns:
+        - None
+    """
+    select_shard(None)
+
+
+def create_tables():
+    """
+    Creates the tables of the sharded models in every shard
+
+    Args:
+        - None
+
+    Returns:
+        - None
+    """
+    for shard in range(count()):
+        db.Model.metadata.create_all(engine(shard), tables = TABLES)
+
+
+def _parent(table):
+    """
+    Helper method that finds the sharded table a table without a user_id belongs to (runs for run_track, goal for goal_period)
+
+    Args:
+        - table: the table
+
+    Returns:
+        - (foreign key column, parent table) or None
+    """
+    for fk in table.foreign_keys:
+        if(fk.column.table in TABLES):
+            return fk.parent, fk.column.table
+    return None
+
+
+def _user_rows(conn, table, user_id, ids):
+    """
+    Helper method that reads every row of a user in a table
+
+    Args:
+        - conn: connection to read from
+        - table: the table
+        - user_id: id of the user
+        - ids: dictionary of table name -> ids of the user's rows read so far (for tables without a user_id)
+
+    Returns:
+        - List of rows
+    """
+    if('user_id' in table.c):
+        return conn.execute(table.select().where(table.c.user_id == user_id)).fetchall()
+    column, parent = _parent(table)
+    parent_ids = list(ids.get(parent.name, ()))
+    rows = []
+    for i in range(0, len(parent_ids), CHUNK):
+        rows.extend(conn.execute(table.select().where(column.in_(parent_ids[i:i + CHUNK]))).fetchall())
+    return rows
+
+
+def delete_user(conn, user_id):
+    """
+    Deletes every row of a user's data through a connection (children first)
+
+    Args:
+        - conn: connection to delete through
+        - user_id: id of the user
+
+    Returns:
+        - Number of rows deleted
+    """
+    ids = {}
+    for table in TABLES:
+        ids[table.name] = [row.id for row in _user_rows(conn, table, user_id, ids)]
+    deleted = 0
+    for table in reversed(TABLES):
+        for i in range(0, len(ids[table.name]), CHUNK):
+            deleted += conn.execute(table.delete().where(table.c.id.in_(ids[table.name][i:i + CHUNK]))).rowcount
+    return deleted
+
+
+def copy_user(source, destination, user_id, replace = True):
+    """
+    Copies a user's data from one database to another in one transaction on the destination. Rows get new ids there
+    (ids are only unique within a database), and run tracks and goal periods are pointed at the new ids of their run and
+    goal.
+
+    Args:
+        - source: engine to copy from
+        - destination: engine to copy to
+        - user_id: id of the user
+        - replace: whether to first remove anything already in the destination for the user (left over from a move
+          that stopped part way), or add to it
+
+    Returns:
+        - Number of rows copied
+    """
+    copied = 0
+    with source.connect() as src, destination.begin() as dst:
+        if(replace):
+            delete_user(dst, user_id)
+        old_ids = {}
+        new_ids = {}
+        for table in TABLES:
+            rows = _user_rows(src, table, user_id, old_ids)
+            old_ids[table.name] = [row.id for row in rows]
+            new_ids[table.name] = {}
+            parent = _parent(table) if 'user_id' not in table.c else None
+            for row in rows:
+                values = dict(row)
+                old = values.pop('id')
+                if(parent is not None):
+                    values[parent[0].name] = new_ids[parent[1].name][values[parent[0].name]]
+                new_ids[table.name][old] = dst.execute(table.insert().values(**values)).inserted_primary_key[0]
+                copied += 1
+    return copied
+
+
+def set_shard(user_id, shard):
+    """
+    Points the directory at a new shard for a user
+
+    Args:
+        - user_id: id of the user
+        - shard: the shard number
+
+    Returns:
+        - None
+    """
+    t = ShardDirectory.__table__
+    with db.engine.begin() as conn:
+        if(not conn.execute(t.update().where(t.c.user_id == user_id).values(shard = shard)).rowcount):
+            conn.execute(t.insert().values(user_id = user_id, shard = shard))
+    with _lock:
+        _directory[user_id] = shard
+
+
+def move_user(user_id, shard):
+    """
+    Moves a user's data to another shard: copies it, switches the directory, then deletes the old copy. Meant to be run
+    while the app is stopped (running workers keep the shard they looked up in memory).
+
+    Args:
+        - user_id: id of the user
+        - shard: the shard to move to
+
+    Returns:
+        - Number of rows moved
+    """
+    source = shard_of(user_id)
+    if(source == shard):
+        return 0
+    moved = copy_user(engine(source), engine(shard), user_id)
+    set_shard(user_id, shard)
+    with engine(source).begin() as conn:
+        delete_user(conn, user_id)
+    return moved
+
+
+@app.cli.group('shards')
+def shards_command():
+    """
+    Command line tools for sharded storage: flask shards ...
+    """
+    if(not count()):
+        raise click.UsageError("Sharding is off, set MYHEALTH_SHARDS to the number of shards")
+
+
+@shards_command.command('status')
+def status_command():
+    """
+    Shows how many users and rows are on each shard
+    """
+    t = ShardDirectory.__table__
+    users = dict(db.engine.execute(select([t.c.shard, func.count()]).group_by(t.c.shard)).fetchall())
+    for shard in range(count()):
+        with engine(shard).connect() as conn:
+            rows = sum(conn.execute(select([func.count()]).select_from(table)).scalar() for table in TABLES)
+        click.echo("shard %d: %d users, %d rows" % (shard, users.get(shard, 0), rows))
+    for shard in sorted(set(users) - set(range(count()))):
+        click.echo("shard %d (no longer configured): %d users, run flask shards rebalance" % (shard, users[shard]))
+
+
+@shards_command.command('move')
+@click.argument('user_id', type = int)
+@click.argument('shard', type = int)
+def move_command(user_id, shard):
+    """
+    Moves one user to a shard
+    """
+    if(not 0 <= shard < count()):
+        raise click.BadParameter("shard has to be between 0 and %d" % (count() - 1))
+    click.echo("Moved %d rows" % move_user(user_id, shard))
+
+
+@shards_command.command('rebalance')
+@click.option('--dry-run', is_flag = True, help = "only show what would move")
+def rebalance_command(dry_run):
+    """
+    Moves every user whose shard is not user_id % SHARDS, for example after the number of shards changed
+    """
+    t = ShardDirectory.__table__
+    users = db.engine.execute(select([t.c.user_id, t.c.shard])).fetchall()
+    moving = [(user_id, shard) for user_id, shard in users if shard != target(user_id)]
+    click.echo("%d of %d users need to move" % (len(moving), len(users)))
+    if(dry_run):
+        return
+    rows = 0
+    # shards that are no longer configured still need an engine to read from
+    binds = app.config['SQLALCHEMY_BINDS']
+    for user_id, shard in moving:
+        if(bind_key(shard) not in binds):
+            binds[bind_key(shard)] = shard_binds(app.config['SQLALCHEMY_DATABASE_URI'], shard + 1)[bind_key(shard)]
+        rows += move_user(user_id, target(user_id))
+    click.echo("Moved %d rows" % rows)
+
+
+@shards_command.command('import-main')
+def import_main_command():
+    """
+    Copies every user's data out of the main database (where it was before sharding was turned on) to their shard,
+    then deletes it from the main database. What is already on the shards is kept.
+    """
+    rows = 0
+    for (user_id,) in db.session.query(User.id).all():
+        copied = copy_user(db.engine, engine(shard_of(user_id)), user_id, replace = False)
+        if(copied):
+            with db.engine.begin() as conn:
+                delete_user(conn, user_id)
+        rows += copied
+    click.echo("Copied %d rows" % rows)
+
+
+if(count()):
+    create_tables()
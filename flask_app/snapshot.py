@@ -0,0 +1,273 @@
+"""
+snapshot.py
+Read snapshot for the analytics pages of the MyHealth Web App. With MYHEALTH_SNAPSHOT=1, the pages in SNAPSHOT_ENDPOINTS
+(personal stats, all runs, all exercises) read from a copy of the database instead of the database itself, so their big
+reads don't hold up writes. The copy (site.snapshot.db, and site.shardN.snapshot.db for each shard) is made with SQLite's
+online backup API every SNAPSHOT_REFRESH seconds, in the background, the first time a page needs it. The copies are in WAL
+mode, so pages keep reading the previous copy while a new one is being written.
+
+A page never reads a copy older than SNAPSHOT_MAX_AGE seconds: if the copy is too old (or not made yet) the page reads
+the database itself. A user who saved something in the last SNAPSHOT_MAX_AGE seconds also reads the database itself, so
+they always see what they saved; after that long any copy that is new enough has it.
+
+MYHEALTH_SNAPSHOT_URI points the pages at another database instead (a replica kept up to date by something else). That
+database is trusted to be within SNAPSHOT_MAX_AGE and is not refreshed from here.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app, db, shards
+from flask_app.shard_session import ShardedSession, select_readers
+from flask import request, session, g, has_request_context
+from flask_login import current_user
+from sqlalchemy import create_engine, event
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_path(path):
+    """
+    Where the copy of a SQLite database file goes (site.db -> site.snapshot.db)
+
+    Args:
+        - path: path of the database file
+
+    Returns:
+        - Path of the copy
+    """
+    base = path[:-3] if path.endswith('.db') else path
+    return base + '.snapshot.db'
+
+
+def read_only(dbapi_connection, connection_record):
+    """
+    Makes a connection to a copy refuse writes, so a page that tries to save something fails instead of losing it
+
+    Args:
+        - dbapi_connection: the new database connection
+        - connection_record: unused
+
+    Returns:
+        - None
+    """
+    dbapi_connection.execute("PRAGMA query_only=1")
+
+
+class Snapshot:
+    """
+    The copies of the databases and their engines. When the copies were last made is kept as the modification time of a
+    marker file next to the main copy, so every worker process goes by the same copy.
+    """
+    def __init__(self, config):
+        self.uri = config.get('SNAPSHOT_URI')
+        self.max_age = config.get('SNAPSHOT_MAX_AGE', 60)
+        self.refresh_every = config.get('SNAPSHOT_REFRESH') or self.max_age / 2
+        self.engines = None
+        self.thread = None
+        self.lock = threading.Lock()
+        if(self.uri and config.get('SHARDS')):
+            raise ValueError("SNAPSHOT_URI can't be used with sharding, leave it unset to copy each shard")
+
+    def pairs(self):
+        """
+        Gives every database engine with the engine of its copy, making the copy engines the first time
+
+        Args:
+            - None
+
+        Returns:
+            - Dictionary of engine -> engine of its copy
+        """
+        with self.lock:
+            if(self.engines is None):
+                if(self.uri):
+                    self.engines = {db.engine: create_engine(self.uri)}
+                else:
+                    self.engines = {}
+                    for engine in shards.engines():
+                        copy = create_engine('sqlite:///' + snapshot_path(engine.url.database))
+                        event.listen(copy, 'connect', read_only)
+                        self.engines[engine] = copy
+            return self.engines
+
+    def marker(self):
+        """
+        Path of the file whose modification time is when the copies were made
+
+        Args:
+            - None
+
+        Returns:
+            - The path
+        """
+        return snapshot_path(db.engine.url.database) + '.taken'
+
+    def age(self):
+        """
+        How old the copies are
+
+        Args:
+            - None
+
+        Returns:
+            - Age in seconds (0 for SNAPSHOT_URI, infinity if no copy has been made)
+        """
+        if(self.uri):
+            return 0
+        try:
+            return time.time() - os.stat(self.marker()).st_mtime
+        except OSError:
+            return float('inf')
+
+    def refresh(self):
+        """
+        Copies every database into its copy with the backup API, then marks the copies with the time the copying started
+        (so their age is never understated). Each copy is one transaction on the copy, which readers don't wait for.
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        if(self.uri):
+            return
+        started = time.time()
+        for engine, copy in self.pairs().items():
+            source = engine.raw_connection()
+            try:
+                destination = copy.raw_connection()
+                try:
+                    destination.connection.execute("PRAGMA query_only=0")
+                    destination.connection.execute("PRAGMA journal_mode=WAL")
+                    source.connection.backup(destination.connection)
+                finally:
+                    destination.connection.execute("PRAGMA query_only=1")
+                    destination.close()
+            finally:
+                source.close()
+        marker = self.marker()
+        with open(marker, 'a'):
+            pass
+        os.utime(marker, (started, started))
+
+    def _refresh_in_background(self):
+        """
+        Helper method that refreshes the copies (runs on the refresh thread)
+
+        Args:
+            - None
+
+        Returns:
+            - None
+        """
+        try:
+            # another worker may have just done it
+            if(self.age() > self.refresh_every):
+                self.refresh()
+        except Exception:
+            logger.exception("Could not refresh the read snapshot")
+        finally:
+            self.thread = None
+
+    def readers(self):
+        """
+        Gives the copies to read from if they are new enough, and starts making new ones in the background when they
+        are due
+
+        Args:
+            - None
+
+        Returns:
+            - Dictionary of engine -> engine of its copy, or None to read the databases themselves
+        """
+        age = self.age()
+        if(age > self.refresh_every and self.thread is None):
+            with self.lock:
+                if(self.thread is None):
+                    self.thread = threading.Thread(target = self._refresh_in_background, name = 'snapshot-refresh', daemon = True)
+                    self.thread.start()
+        return self.pairs() if age <= self.max_age else None
+
+
+snapshot = Snapshot(app.config)
+
+
+def wrote_recently():
+    """
+    Checks whether the user saved something in the last SNAPSHOT_MAX_AGE seconds (newer than any copy is sure to have)
+
+    Args:
+        - None
+
+    Returns:
+        - True or False
+    """
+    return time.time() - session.get('_wrote_at', 0) < snapshot.max_age
+
+
+@app.before_request
+def route_reads():
+    """
+    Sends the session of an analytics page to the copies when they are new enough and the user hasn't just saved
+    something
+
+    Args:
+        - None
+
+    Returns:
+        - None
+    """
+    if(app.config.get('SNAPSHOT_ENABLED') and request.endpoint in app.config['SNAPSHOT_ENDPOINTS']
+            and current_user.is_authenticated and not wrote_recently()):
+        select_readers(snapshot.readers())
+
+
+@app.after_request
+def remember_write(response):
+    """
+    Notes in the user's session when a request saved something
+
+    Args:
+        - response: the response
+
+    Returns:
+        - The response
+    """
+    if(app.config.get('SNAPSHOT_ENABLED') and g.get('wrote') and current_user.is_authenticated):
+        session['_wrote_at'] = time.time()
+    return response
+
+
+@app.teardown_request
+def clear_readers(error = None):
+    """
+    Sends the thread's session back to the databases themselves after a request
+
+    Args:
+        - error: unused
+
+    Returns:
+        - None
+    """
+    select_readers(None)
+
+
+@event.listens_for(ShardedSession, 'after_flush')
+def flushed(db_session, flush_context):
+    """
+    Marks the request as having saved something when the session writes to the database (batch ingest marks its
+    requests itself, since it writes on another thread)
+
+    Args:
+        - db_session: unused
+        - flush_context: unused
+
+    Returns:
+        - None
+    """
+    if(has_request_context()):
+        g.wrote = True
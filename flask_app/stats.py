@@ -0,0 +1,170 @@
+"""
+stats.py
+The numbers on the personal statistics page: personal bests in running, the most active day and the most water, and the
+averages of distance, pace, active time, water and heart rate. personal_stats works on rows that were already loaded (or
+anything with the same attributes), so the same math can be checked against rows from anywhere; load gets them from the
+database, including the days rolled up by retention.
+
+When records tie, the earliest day wins, so the result doesn't depend on the order the rows come back in.
+
+Last Modified: 10/19/2026
+"""
+from flask_app import db
+from flask_app.models import Runs, Workout, Water, HeartRate, DailySummary
+from datetime import date, time, datetime, timedelta
+
+
+def seconds_to_time(seconds):
+    """
+    Helper method that take a total amount of seconds and converts it into minutes and seconds
+
+    Args:
+        -seconds: total number of seconds
+
+    Returns:
+        - Minutes and seconds in format M' S"
+    """
+    minutes = int(seconds//60)
+    seconds = int(round(seconds % 60,0))
+    return str(minutes)+"'" +str(seconds).zfill(2) + '"'
+
+
+def add_times(t1, t2):
+    """
+    Helper method that adds two time objects together to add hours and minures
+
+    Args:
+        - t1: the first time object
+        - t2: the second time object
+
+    Returns:
+        - The result of adding the hours and minutes of both times
+    """
+    a = timedelta(hours = t1.hour, minutes=t1.minute, seconds= t1.second)
+    b = timedelta(hours = t2.hour, minutes=t2.minute, seconds=t2.second)
+    return (datetime.min + a + b).time()
+
+
+def personal_stats(runs, exercises, waters, heart_rates, rolled_up = (), today = None):
+    """
+    Works out the personal statistics of a user
+
+    Args:
+        - runs: the user's runs (with their track, or None)
+        - exercises: the user's workouts
+        - waters: the user's water entries
+        - heart_rates: the user's heart rate entries
+        - rolled_up: the user's water and heart rate DailySummary rows
+        - today: the current date (defaults to today)
+
+    Returns:
+        - Dictionary of the values the personal statistics page shows
+    """
+    today = today or date.today()
+    longest_run = [0,today]
+    fastest_run = [100000,"format",today]
+    fastest_5k = None
+    most_water = {}
+    activity = {}
+    most_activity = []
+    paces = []
+    distances = []
+    min_date = today
+    max_date = today
+    min_date2 = today
+    avg_water = 0
+    avg_activity = 0
+    avg_distance = 0
+    avg_pace = seconds_to_time(0)
+    avg_heartrate = 0
+    m = 0
+    d = today
+    for i in runs:
+        distances.append(i.distance)
+        if(i.distance > longest_run[0] or (i.distance == longest_run[0] and i.date < longest_run[1])):
+            longest_run[0] = i.distance
+            longest_run[1] = i.date
+        total_seconds = int(i.time.strftime("%H"))*3600 + int(i.time.strftime("%M"))*60 + int(i.time.strftime("%S"))
+        pace = round(total_seconds/i.distance,2)
+        paces.append(pace)
+        # a run with a GPS track uses its fastest mile instead of its average pace
+        best = round(i.track.best_mile,2) if (i.track and i.track.best_mile) else pace
+        if(best<fastest_run[0] or (best == fastest_run[0] and i.date < fastest_run[2])):
+            fastest_run[0] = best
+            fastest_run[1] = seconds_to_time(best)
+            fastest_run[2] = i.date
+        if(i.track and i.track.best_5k and (fastest_5k is None or i.track.best_5k < fastest_5k[0]
+                                            or (i.track.best_5k == fastest_5k[0] and i.date < fastest_5k[2]))):
+            fastest_5k = [i.track.best_5k, seconds_to_time(i.track.best_5k), i.date]
+        if(i.date not in activity):
+            activity[i.date] = i.time
+        else:
+            activity[i.date] = add_times(activity[i.date], i.time)
+    if(distances):
+        avg_distance = sum(distances)/len(distances)
+    if(paces):
+        avg_pace = seconds_to_time(sum(paces)/len(paces))
+    for i in waters:
+        if(min_date > i.date):
+            min_date = i.date
+        if(i.date not in most_water):
+            most_water[i.date]= i.num_cups
+        else:
+            most_water[i.date] = most_water[i.date] + i.num_cups
+    for i in rolled_up:
+        if(i.kind == 'water'):
+            min_date = min(min_date, i.day)
+            most_water[i.day] = most_water.get(i.day, 0) + int(i.total)
+    if(most_water.values()):
+        m = max(most_water.values())
+        d = min(i for i in most_water if most_water[i] == m)
+        avg_water = round(sum(most_water.values())/((max_date-min_date).days + 1),2)
+    for i in exercises:
+        if(i.date not in activity):
+            activity[i.date] = i.time
+        else:
+            activity[i.date] = add_times(activity[i.date], i.time)
+    if(activity):
+        m1 = max(activity.values())
+        total_activity = 0
+        for i in sorted(activity):
+            if(i < min_date2):
+                min_date2 = i
+            total_activity += int(activity[i].strftime("%H"))*3600 + int(activity[i].strftime("%M"))*60 + int(activity[i].strftime("%S"))
+            if(activity[i] == m1):
+                most_activity.append(m1)
+                most_activity.append(i)
+        avg_activity = total_activity/((max_date-min_date2).days +1)
+    avg_time = time(int(avg_activity//3600), int((avg_activity//60)%60), int(avg_activity%60))
+    num_heartrates = len(heart_rates)
+    for i in heart_rates:
+        avg_heartrate += i.heartrate
+    for i in rolled_up:
+        if(i.kind == 'heart_rate'):
+            avg_heartrate += i.total
+            num_heartrates += i.count
+    if(num_heartrates):
+        avg_heartrate/= num_heartrates
+    return {'longest_run': longest_run, 'fastest_run': fastest_run, 'most_water': m, 'water_date': d, 'most_activity': most_activity,
+            'avg_distance': avg_distance, 'avg_pace': avg_pace, 'avg_water': avg_water, 'avg_time': avg_time,
+            'avg_heartrate': avg_heartrate, 'fastest_5k': fastest_5k}
+
+
+def load(user_id, today = None):
+    """
+    Loads a user's rows from the database and works out their personal statistics
+
+    Args:
+        - user_id: id of the user
+        - today: the current date (defaults to today)
+
+    Returns:
+        - Dictionary of the values the personal statistics page shows
+    """
+    runs = Runs.query.filter_by(user_id = user_id).options(db.joinedload(Runs.track).load_only('best_mile', 'best_5k')).all()
+    exercises = Workout.query.filter_by(user_id = user_id).all()
+    waters = Water.query.filter_by(user_id = user_id).all()
+    heart_rates = HeartRate.query.filter_by(user_id = user_id).all()
+    # days whose raw water and heart rate rows were archived (see retention.py)
+    rolled_up = DailySummary.query.filter(DailySummary.user_id == user_id, DailySummary.kind.in_(['water', 'heart_rate'])).all()
+    return personal_stats(runs, exercises, waters, heart_rates, rolled_up, today)
@@ -0,0 +1,188 @@
+"""
+summaries.py
+Numbers for the dashboard cards: this week's runs, workouts, water, sleep and heart rate for a user. Each domain is its
+own small query on its own database connection, so the five can run at the same time, either on a thread pool
+(collect_concurrently, used by the normal Flask route) or awaited from the event loop (gather, used by asgi.py).
+
+Last Modified: 10/19/2026
+"""
+from flask_app import app, shards
+from flask_app.models import Runs, Workout, Water, Sleep, HeartRate, HeartRateChunk
+from sqlalchemy import select, func, and_
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import asyncio
+
+WEEK = 7
+
+pool = ThreadPoolExecutor(max_workers = app.config.get('SUMMARY_WORKERS', 8), thread_name_prefix = "summary")
+
+
+def runs(conn, user_id, day):
+    """
+    Number of runs and miles run in the last week
+
+    Args:
+        - conn: database connection
+        - user_id: id of the user
+        - day: the last day of the week
+
+    Returns:
+        - Dictionary with count and miles
+    """
+    t = Runs.__table__
+    count, miles = conn.execute(select([func.count(t.c.id), func.coalesce(func.sum(t.c.distance), 0)])
+                                .where(and_(t.c.user_id == user_id, t.c.date > day - timedelta(days = WEEK), t.c.date <= day))).first()
+    return {'count': count, 'miles': round(miles, 2)}
+
+
+def workouts(conn, user_id, day):
+    """
+    Number of workouts in the last week and how many of them were today
+
+    Args:
+        - conn: database connection
+        - user_id: id of the user
+        - day: the last day of the week
+
+    Returns:
+        - Dictionary with count and today
+    """
+    t = Workout.__table__
+    rows = conn.execute(select([t.c.date, func.count(t.c.id)])
+                        .where(and_(t.c.user_id == user_id, t.c.date > day - timedelta(days = WEEK), t.c.date <= day))
+                        .group_by(t.c.date)).fetchall()
+    return {'count': sum(n for d, n in rows), 'today': sum(n for d, n in rows if d == day)}
+
+
+def water(conn, user_id, day):
+    """
+    Cups of water today and the average per day over the last week
+
+    Args:
+        - conn: database connection
+        - user_id: id of the user
+        - day: the last day of the week
+
+    Returns:
+        - Dictionary with today and daily_average
+    """
+    t = Water.__table__
+    rows = conn.execute(select([t.c.date, func.sum(t.c.num_cups)])
+                        .where(and_(t.c.user_id == user_id, t.c.date > day - timedelta(days = WEEK), t.c.date <= day))
+                        .group_by(t.c.date)).fetchall()
+    return {'today': sum(n for d, n in rows if d == day), 'daily_average': round(sum(n for d, n in rows) / WEEK, 1)}
+
+
+def sleep(conn, user_id, day):
+    """
+    Hours slept last night and the average over the nights of the last week that have data
+
+    Args:
+        - conn: database connection
+        - user_id: id of the user
+        - day: the last day of the week
+
+    Returns:
+        - Dictionary with last_night and average (hours, None when there is no data)
+    """
+    t = Sleep.__table__
+    end = datetime.combine(day + timedelta(days = 1), datetime.min.time())
+    rows = conn.execute(select([t.c.start_time, t.c.end_time])
+                        .where(and_(t.c.user_id == user_id, t.c.end_time > end - timedelta(days = WEEK), t.c.end_time < end))
+                        .order_by(t.c.end_time)).fetchall()
+    hours = [(e - s).total_seconds() / 3600 for s, e in rows]
+    last_night = round(hours[-1], 1) if(rows and rows[-1][1].date() == day) else None
+    return {'last_night': last_night, 'average': round(sum(hours) / len(hours), 1) if hours else None}
+
+
+def heart_rate(conn, user_id, day):
+    """
+    Most recent heart rate reading and the average over the last week, including samples stored in day chunks
+
+    Args:
+        - conn: database connection
+        - user_id: id of the user
+        - day: the last day of the week
+
+    Returns:
+        - Dictionary with latest and average (None when there is no data)
+    """
+    t = HeartRate.__table__
+    c = HeartRateChunk.__table__
+    since = day - timedelta(days = WEEK)
+    latest = conn.execute(select([t.c.heartrate]).where(t.c.user_id == user_id).order_by(t.c.id.desc()).limit(1)).scalar()
+    n, total = conn.execute(select([func.count(t.c.id), func.coalesce(func.sum(t.c.heartrate), 0)])
+                            .where(and_(t.c.user_id == user_id, t.c.date > since, t.c.date <= day))).first()
+    dense_n, dense_total = conn.execute(select([func.coalesce(func.sum(c.c.count), 0), func.coalesce(func.sum(c.c.total), 0)])
+                                        .where(and_(c.c.user_id == user_id, c.c.day > since, c.c.day <= day))).first()
+    n += dense_n
+    return {'latest': latest, 'average': round((total + dense_total) / n) if n else None}
+
+
+DOMAINS = {'runs': runs, 'workouts': workouts, 'water': water, 'sleep': sleep, 'heart_rate': heart_rate}
+
+
+def _run(name, user_id, day):
+    """
+    Helper method that runs one domain query on its own connection
+
+    Args:
+        - name: key in DOMAINS
+        - user_id: id of the user
+        - day: the last day of the week
+
+    Returns:
+        - The domain's summary
+    """
+    with shards.engine_for(user_id).connect() as conn:
+        return DOMAINS[name](conn, user_id, day)
+
+
+def collect(user_id, day = None):
+    """
+    Runs the domain queries one after another on one connection
+
+    Args:
+        - user_id: id of the user
+        - day: the last day of the week (defaults to today)
+
+    Returns:
+        - Dictionary of domain -> summary
+    """
+    day = day or date.today()
+    with shards.engine_for(user_id).connect() as conn:
+        return {name: fn(conn, user_id, day) for name, fn in DOMAINS.items()}
+
+
+def collect_concurrently(user_id, day = None):
+    """
+    Runs the domain queries at the same time on the summary thread pool
+
+    Args:
+        - user_id: id of the user
+        - day: the last day of the week (defaults to today)
+
+    Returns:
+        - Dictionary of domain -> summary
+    """
+    day = day or date.today()
+    futures = {name: pool.submit(_run, name, user_id, day) for name in DOMAINS}
+    return {name: f.result() for name, f in futures.items()}
+
+
+async def gather(user_id, day = None):
+    """
+    Runs the domain queries at the same time without blocking the event loop
+
+    Args:
+        - user_id: id of the user
+        - day: the last day of the week (defaults to today)
+
+    Returns:
+        - Dictionary of domain -> summary
+    """
+    day = day or date.today()
+    loop = asyncio.get_event_loop()
+    results = await asyncio.gather(*[loop.run_in_executor(pool, _run, name, user_id, day) for name in DOMAINS])
+    return dict(zip(DOMAINS, results))
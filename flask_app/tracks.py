@@ -0,0 +1,319 @@
+"""
+tracks.py
+GPS tracks for runs. Reads GPX files (and FIT files when the fitparse package is installed), stores the points compactly
+on a RunTrack, and computes mile splits, moving time, elevation gain and best efforts (fastest mile and 5k inside a run)
+with NumPy. The results are computed once when the track is imported and saved with it.
+
+Last Modified: 10/19/2026
+"""
+from flask_app.models import Runs, RunTrack
+from datetime import datetime, time, timezone
+import xml.etree.ElementTree as ET
+import numpy as np
+import zlib
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_5K = 3.10686
+# slower than this (miles per second, about 1 mph) counts as stopped
+MOVING_SPEED = 1 / 3600
+# elevation changes smaller than this (meters) are treated as GPS noise
+ELEVATION_NOISE = 1.0
+
+
+class TrackError(ValueError):
+    """
+    Raised when a file cannot be read as a GPS track
+    """
+    pass
+
+
+def _parse_time(text):
+    """
+    Helper method that reads a GPX timestamp (ISO 8601, usually ending in Z)
+
+    Args:
+        - text: the timestamp
+
+    Returns:
+        - A timezone aware datetime
+    """
+    when = datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    if(when.tzinfo is None):
+        when = when.replace(tzinfo = timezone.utc)
+    return when
+
+
+def parse_gpx(data):
+    """
+    Reads the track points of a GPX file. Points without a time are skipped.
+
+    Args:
+        - data: the contents of the file (bytes)
+
+    Returns:
+        - List of (time, latitude, longitude, elevation) tuples (elevation None when the point has none)
+    """
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError as e:
+        raise TrackError("Not a valid GPX file") from e
+    points = []
+    for el in root.iter():
+        if(not el.tag.endswith('trkpt')):
+            continue
+        when = None
+        ele = None
+        try:
+            for child in el:
+                if(child.tag.endswith('time') and child.text):
+                    when = _parse_time(child.text)
+                elif(child.tag.endswith('ele') and child.text):
+                    ele = float(child.text)
+            if(when is not None):
+                points.append((when, float(el.get('lat')), float(el.get('lon')), ele))
+        except (TypeError, ValueError) as e:
+            raise TrackError("A track point has a missing or bad position, time or elevation") from e
+    return points
+
+
+def parse_fit(data):
+    """
+    Reads the records of a FIT file. Needs the optional fitparse package.
+
+    Args:
+        - data: the contents of the file (bytes)
+
+    Returns:
+        - List of (time, latitude, longitude, elevation) tuples (elevation None when the record has none)
+    """
+    try:
+        import fitparse
+    except ImportError:
+        raise TrackError("FIT files need the fitparse package, upload a GPX file instead")
+    points = []
+    semicircle = 180 / 2**31
+    try:
+        for record in fitparse.FitFile(data).get_messages('record'):
+            values = record.get_values()
+            if(values.get('position_lat') is None or values.get('timestamp') is None):
+                continue
+            when = values['timestamp'].replace(tzinfo = timezone.utc)
+            ele = values.get('enhanced_altitude', values.get('altitude'))
+            points.append((when, values['position_lat'] * semicircle, values['position_long'] * semicircle, None if ele is None else float(ele)))
+    except (fitparse.FitParseError, TypeError, ValueError) as e:
+        raise TrackError("Not a valid FIT file") from e
+    return points
+
+
+def parse(filename, data):
+    """
+    Reads a GPX or FIT file depending on its extension. Points without an elevation take the last known one (the first
+    known one before that), so gaps don't show up as climbs; a track without any elevation is flat.
+
+    Args:
+        - filename: name of the uploaded file
+        - data: the contents of the file (bytes)
+
+    Returns:
+        - List of (time, latitude, longitude, elevation) tuples sorted by time
+    """
+    if(filename.lower().endswith('.fit')):
+        points = parse_fit(data)
+    else:
+        points = parse_gpx(data)
+    if(len(points) < 2):
+        raise TrackError("The track needs at least two points with times")
+    points.sort(key = lambda p: p[0])
+    last = next((p[3] for p in points if p[3] is not None), 0.0)
+    filled = []
+    for when, lat, lon, ele in points:
+        last = last if ele is None else ele
+        filled.append((when, lat, lon, last))
+    return filled
+
+
+def haversine(lats, lons):
+    """
+    Distance between each pair of consecutive points, computed for the whole track at once
+
+    Args:
+        - lats: array of latitudes in degrees
+        - lons: array of longitudes in degrees
+
+    Returns:
+        - Array of distances in miles (one shorter than the inputs)
+    """
+    lat = np.radians(lats)
+    lon = np.radians(lons)
+    dlat = np.diff(lat)
+    dlon = np.diff(lon)
+    a = np.sin(dlat / 2)**2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2)**2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def best_effort(cum, secs, distance):
+    """
+    Fastest time to cover a distance anywhere inside a run. For every point, the time when the runner was distance further
+    along is interpolated, and the shortest difference is taken.
+
+    Args:
+        - cum: array of distance covered at each point (miles)
+        - secs: array of seconds since the start at each point
+        - distance: the distance of the effort (miles)
+
+    Returns:
+        - The fastest time in seconds, or None if the run is shorter than the distance
+    """
+    if(cum[-1] < distance):
+        return None
+    starts = cum[cum + distance <= cum[-1]]
+    start_secs = secs[:len(starts)]
+    end_secs = np.interp(starts + distance, cum, secs)
+    return float(np.min(end_secs - start_secs))
+
+
+def splits(cum, secs):
+    """
+    Time taken for each full mile of a run (plus the last partial mile)
+
+    Args:
+        - cum: array of distance covered at each point (miles)
+        - secs: array of seconds since the start at each point
+
+    Returns:
+        - List of (miles, seconds) for each split
+    """
+    marks = np.arange(1, int(cum[-1]) + 1, dtype = float)
+    times = np.concatenate(([0.0], np.interp(marks, cum, secs)))
+    out = [(1.0, float(t)) for t in np.diff(times)]
+    rest = cum[-1] - (marks[-1] if len(marks) else 0)
+    if(rest > 0.01):
+        out.append((round(float(rest), 2), float(secs[-1] - times[-1])))
+    return out
+
+
+def elevation_gain(eles):
+    """
+    Total climbing of a run. A climb only counts once the elevation has moved more than ELEVATION_NOISE away from the
+    last level it settled at, so GPS jitter is not added up.
+
+    Args:
+        - eles: array of elevations (meters)
+
+    Returns:
+        - The elevation gain in meters
+    """
+    gain = 0.0
+    level = eles[0]
+    for e in eles[1:]:
+        if(e - level > ELEVATION_NOISE):
+            gain += e - level
+            level = e
+        elif(level - e > ELEVATION_NOISE):
+            level = e
+    return float(gain)
+
+
+def analyze(secs, lats, lons, eles):
+    """
+    Computes everything shown for a run with a track
+
+    Args:
+        - secs: array of seconds since the start
+        - lats: array of latitudes
+        - lons: array of longitudes
+        - eles: array of elevations (meters)
+
+    Returns:
+        - Dictionary with distance (miles), elapsed and moving time (seconds), elevation gain (meters), splits,
+          and the best mile and 5k times (seconds)
+    """
+    seg = haversine(lats, lons)
+    cum = np.concatenate(([0.0], np.cumsum(seg)))
+    dt = np.diff(secs)
+    moving = seg > MOVING_SPEED * np.maximum(dt, 1)
+    return {
+        'distance': float(cum[-1]),
+        'elapsed': float(secs[-1] - secs[0]),
+        'moving_time': float(np.sum(dt[moving])),
+        'elevation_gain': elevation_gain(eles),
+        'splits': splits(cum, secs),
+        'best_mile': best_effort(cum, secs, 1.0),
+        'best_5k': best_effort(cum, secs, MILES_PER_5K),
+    }
+
+
+def _pack(a):
+    """
+    Helper method that compresses a NumPy array (stored little endian)
+
+    Args:
+        - a: the array
+
+    Returns:
+        - The compressed bytes
+    """
+    return zlib.compress(a.astype(a.dtype.newbyteorder('<')).tobytes(), 6)
+
+
+def _unpack(blob, dtype):
+    """
+    Helper method that reads an array compressed by _pack
+
+    Args:
+        - blob: the compressed bytes
+        - dtype: the little endian NumPy dtype of the array
+
+    Returns:
+        - The array
+    """
+    return np.frombuffer(zlib.decompress(blob), dtype = dtype)
+
+
+def load(track):
+    """
+    Decodes the points of a stored track
+
+    Args:
+        - track: the RunTrack
+
+    Returns:
+        - (secs, lats, lons, eles) arrays
+    """
+    lats = np.cumsum(_unpack(track.lats, '<i4').astype(np.int64)) / 1e7
+    lons = np.cumsum(_unpack(track.lons, '<i4').astype(np.int64)) / 1e7
+    return (_unpack(track.secs, '<u4').astype(float), lats, lons, _unpack(track.eles, '<f4').astype(float))
+
+
+def build_run(points, user_id):
+    """
+    Creates a run (with its track and computed results) from the points of a GPS file. The distance and time of the run
+    come from the track. Does not add it to the session.
+
+    Args:
+        - points: list of (time, latitude, longitude, elevation) tuples sorted by time
+        - user_id: id of the user
+
+    Returns:
+        - The new Runs object
+    """
+    start = points[0][0]
+    secs = np.array([(p[0] - start).total_seconds() for p in points])
+    lat_e7 = np.round(np.array([p[1] for p in points]) * 1e7).astype(np.int64)
+    lon_e7 = np.round(np.array([p[2] for p in points]) * 1e7).astype(np.int64)
+    eles = np.array([p[3] for p in points], dtype = np.float32)
+    result = analyze(secs, lat_e7 / 1e7, lon_e7 / 1e7, eles.astype(float))
+    if(result['distance'] <= 0):
+        raise TrackError("The track does not cover any distance")
+    if(result['elapsed'] >= 24*3600):
+        raise TrackError("Runs longer than a day are not supported")
+    track = RunTrack(points = len(points),
+                     lats = _pack(np.diff(lat_e7, prepend = 0).astype(np.int32)),
+                     lons = _pack(np.diff(lon_e7, prepend = 0).astype(np.int32)),
+                     eles = _pack(eles), secs = _pack(secs.astype(np.uint32)),
+                     moving_time = result['moving_time'], elevation_gain = result['elevation_gain'],
+                     best_mile = result['best_mile'], best_5k = result['best_5k'], splits = result['splits'])
+    elapsed = int(round(result['elapsed']))
+    local_start = start.astimezone() if start.tzinfo else start
+    return Runs(date = local_start.date(), time = time(elapsed // 3600, (elapsed // 60) % 60, elapsed % 60),
+                distance = round(result['distance'], 2), user_id = user_id, track = track)
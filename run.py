@@ -1,3 +1,15 @@
-from flask_app import app
+import os
+from flask_app import app, reminders
 if __name__ == '__main__':
-    app.run(debug = True)
\ No newline at end of file
+    if(os.environ.get('MYHEALTH_SERVER') == 'asgi'):
+        from flask_app.asgi import serve
+        serve()
+    elif(os.environ.get('MYHEALTH_SERVER') == 'production'):
+        from flask_app.production import serve
+        serve()
+    else:
+        # the reloader runs this file again in a child process (with WERKZEUG_RUN_MAIN set) that serves the app, while
+        # this one only watches for changes, so only the child sends reminders
+        if(os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+            reminders.start_scheduler()
+        app.run(debug = True)
\ No newline at end of file